@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+#
+#
+#   Copyright (c) 2007 Jesse Guardiani <jesse@guardiani.us>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License as
+#   published by the Free Software Foundation; either version 2 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+#   02111-1307, USA.
+#
+
+''' The album/artist cover atlas file. Tiles sit on a grid COLS tiles
+wide that grows downward a page (PAGE_ROWS rows of tiles) at a time. A
+tile's x,y in album_art/artist_art is its pixel position on that grid,
+so page n covers y from n*page_height to (n+1)*page_height. Pages are
+raw RGB rows after a fixed size header. The scanner writes single tiles
+in place, and the player maps the file and only turns the pages it
+draws from into surfaces. '''
+
+import os, struct
+try:
+  import mmap
+except ImportError:
+  mmap = None
+import pygame
+
+MAGIC       = 'KAGUATL1'
+HEADER      = '<8sHHHHI4s'  # magic, tile w, tile h, cols, page rows, pages, pixel format
+HEADER_SIZE = 64
+COLS        = 8
+PAGE_ROWS   = 4
+FORMAT      = 'RGB'
+BYTES_PER_PIXEL = 3
+
+
+class AtlasFile():
+  ''' header and raw page access for an atlas file '''
+  f = None
+
+  def __init__(self, fn, mode='rb'):
+    self.fn = fn
+    self.f  = open(fn, mode)
+    header = self.f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+      raise ValueError("%s: not an atlas file" % fn)
+    (magic, self.tile_w, self.tile_h, self.cols, self.page_rows, self.pages, fmt) = \
+      struct.unpack_from(HEADER, header)
+    if magic != MAGIC or fmt.rstrip('\0') != FORMAT:
+      raise ValueError("%s: not an atlas file" % fn)
+    self._calc()
+
+  def _calc(self):
+    self.width       = self.tile_w * self.cols
+    self.page_height = self.tile_h * self.page_rows
+    self.stride      = self.width * BYTES_PER_PIXEL
+    self.page_size   = self.stride * self.page_height
+    self.rows        = self.pages * self.page_rows
+
+  def _write_header(self):
+    self.f.seek(0)
+    self.f.write(_header(self.tile_w, self.tile_h, self.cols, self.page_rows, self.pages))
+
+  def page_offset(self, n):
+    return HEADER_SIZE + n * self.page_size
+
+  def read_page(self, n):
+    self.f.seek(self.page_offset(n))
+    return self.f.read(self.page_size)
+
+  def add_pages(self, n):
+    ''' grow the grid by n pages of black tiles '''
+    self.f.seek(self.page_offset(self.pages))
+    for i in range(n):
+      self.f.write('\0' * self.page_size)
+    self.pages = self.pages + n
+    self._calc()
+    self._write_header()
+
+  def write_tile(self, x, y, surface):
+    ''' copy a tile_w x tile_h surface to pixel position x,y '''
+    data = pygame.image.tostring(surface, FORMAT)
+    (page, py) = divmod(y, self.page_height)
+    offset = self.page_offset(page) + py * self.stride + x * BYTES_PER_PIXEL
+    row = self.tile_w * BYTES_PER_PIXEL
+    for r in range(self.tile_h):
+      self.f.seek(offset + r * self.stride)
+      self.f.write(data[r*row:(r+1)*row])
+
+  def close(self):
+    if self.f is not None:
+      self.f.close()
+      self.f = None
+
+
+def _header(tile_w, tile_h, cols, page_rows, pages):
+  header = struct.pack(HEADER, MAGIC, tile_w, tile_h, cols, page_rows, pages, FORMAT)
+  return header + '\0' * (HEADER_SIZE - len(header))
+
+def create(fn, tile_w, tile_h, cols=COLS, page_rows=PAGE_ROWS):
+  ''' a new, empty atlas file open for writing '''
+  f = open(fn, 'wb')
+  f.write(_header(tile_w, tile_h, cols, page_rows, 0))
+  f.close()
+  return AtlasFile(fn, 'r+b')
+
+
+class AtlasCache():
+  ''' The player's view of an atlas file: pages become surfaces the first
+  time a tile on them is drawn, and the least recently used ones are
+  dropped again once the surfaces take more than budget bytes. The
+  scanner adds pages and replaces the file while the player runs, so the
+  file is looked at again before a page is read in. '''
+  def __init__(self, fn, budget):
+    self.fn     = fn
+    self.budget = budget
+    self.atlas  = None
+    self.map    = None
+    self.pages  = {} # page number -> surface
+    self.lru    = [] # page numbers, most recently used last
+    self.used   = 0
+    self.stamp  = None # (inode, size) of the file when it was mapped
+    self.open()
+
+  def open(self):
+    self.close()
+    try:
+      self.atlas = AtlasFile(self.fn)
+    except (IOError, ValueError), message:
+      print "can't open cover art:", message
+      self.atlas = None
+      return
+    st = os.fstat(self.atlas.f.fileno())
+    self.stamp = (st.st_ino, st.st_size)
+    if mmap is not None and self.atlas.pages:
+      try:
+        self.map = mmap.mmap(self.atlas.f.fileno(), 0, access=mmap.ACCESS_READ)
+      except (EnvironmentError, ValueError):
+        self.map = None
+
+  def close(self):
+    self.pages = {}
+    self.lru   = []
+    self.used  = 0
+    if self.map is not None:
+      self.map.close()
+      self.map = None
+    if self.atlas is not None:
+      self.atlas.close()
+      self.atlas = None
+    self.stamp = None
+
+  def changed(self):
+    ''' has the file been replaced, grown or been given pages since it
+    was opened? '''
+    try:
+      st = os.stat(self.fn)
+    except OSError:
+      return False
+    if self.atlas is None or (st.st_ino, st.st_size) != self.stamp:
+      return True
+    # add_pages() writes the pages before the header, so the size can
+    # change a moment before the page count does
+    self.atlas.f.seek(0)
+    header = self.atlas.f.read(HEADER_SIZE)
+    return len(header) == HEADER_SIZE and struct.unpack_from(HEADER, header)[5] != self.atlas.pages
+
+  def _load_page(self, n):
+    a = self.atlas
+    size = (a.width, a.page_height)
+    if self.map is not None:
+      # a view of the mapping, no copy; the kernel pages it in as needed
+      page = pygame.image.frombuffer(buffer(self.map, a.page_offset(n), a.page_size), size, FORMAT)
+    else:
+      page = pygame.image.fromstring(a.read_page(n), size, FORMAT)
+    try:
+      page = page.convert() # display format, blits are cheaper and the map is let go of
+    except pygame.error:
+      if self.map is not None:
+        page = page.copy() # the map goes away on the next open() or close()
+    return page
+
+  def page(self, n):
+    if n in self.pages:
+      self.lru.remove(n)
+      self.lru.append(n)
+      return self.pages[n]
+    if self.changed():
+      self.open() # drops the pages read from the old file too
+    if self.atlas is None or n >= self.atlas.pages:
+      return None
+    page = self._load_page(n)
+    self.pages[n] = page
+    self.lru.append(n)
+    self.used = self.used + page.get_pitch() * page.get_height()
+    while self.used > self.budget and len(self.lru) > 1:
+      old = self.pages.pop(self.lru.pop(0))
+      self.used = self.used - old.get_pitch() * old.get_height()
+    return page
+
+  def blit_tile(self, dest, pos, rect):
+    ''' blit the part of the atlas at rect (atlas coordinates, within one
+    tile) onto dest at pos '''
+    if self.atlas is None:
+      return
+    (n, y) = divmod(rect[1], self.atlas.page_height)
+    page = self.page(n)
+    if page is not None:
+      dest.blit(page, pos, pygame.Rect(rect[0], y, rect[2], rect[3]))
@@ -21,6 +21,7 @@
 
 
 from manager import manager as manager
+from db      import db      as db
 import time, os, globals
 
 
@@ -36,6 +37,8 @@ class BasePlayer:
     self.percent   = 0
     self.seconds   = 0.0
     self.length    = 0.0
+    self.exact_length = 0.0 # from the scanner, trumps what the backend says
+    self.seek_table   = None
     self.powersave = False
     self._extended_init()
     self.set_volume(manager.prefs.getInt("volume"),show_volumeview=False)
@@ -82,7 +85,8 @@ class BasePlayer:
     if not os.path.exists(target):
       globals.infobanner("File not found")
       return
-    self.length  = 0.0
+    (self.exact_length, self.seek_table) = db.song_timing(target)
+    self.length  = self.exact_length
     self.percent = 0
     self.seconds = 0.0
     self.target  = target
@@ -168,5 +172,13 @@ class BasePlayer:
     print "player: seek to %i msec" % (seekmsec,)
     return seekmsec
 
+  def calc_seekpercent(self, seekmsec):
+    ''' where seekmsec is in the file, in percent of the stream, from the
+    seek table. For backends that seek VBR MP3s by byte position. '''
+    pos = min(max(seekmsec / (self.length * 10.0), 0.0), 100.0)
+    table = self.seek_table + [10000]
+    i = min(int(pos), 99)
+    return (table[i] + (table[i+1] - table[i]) * (pos - i)) / 100.0
+
   def close(self):
     ''' close '''
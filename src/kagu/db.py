@@ -28,6 +28,7 @@ class DB():
   path = None
   con = None
   c = None
+  hide_duplicates = False # leave out songs the scanner found to be copies of others
 
   def __init__(self):
     self.db_dir = globals.calc_db_dir()
@@ -104,6 +105,23 @@ class DB():
     ''', (path,))
     return self.c.fetchall()
 
+  def song_timing(self,path):
+    ''' (length, seek table) the scanner measured for a song, or (0.0, None)
+    when it only has an estimate. The seek table is 100 ints: where in the
+    stream, in 1/10000ths, each percent of the length starts. '''
+    try:
+      self.c.execute('''
+        SELECT length, seek_table FROM song
+         WHERE path = ? AND length_estimated = 0
+      ''', (path,))
+      row = self.c.fetchone()
+    except sqlite3.Error:
+      return 0.0, None
+    if not row: return 0.0, None
+    table = None
+    if row['seek_table']: table = [int(x) for x in row['seek_table'].split(',')]
+    return row['length'], table
+
   def songs_of_paths(self,path_list):
     ''' given a list of song paths, return a list of dictionaries containing 
     data for those song paths. If a song doesn't exist in the DB, it simply isn't
@@ -136,19 +154,32 @@ class DB():
            , s.track ASC
            , s.id ASC
       '''
+    where = []
+    args  = ()
     if album_id != None:
-      self.c.execute(header + '''
-       WHERE al.id = ?
-      ''' + footer, (album_id,))
+      where.append('al.id = ?')
+      args = (album_id,)
     elif artist_id != None:
-      self.c.execute(header + '''
-       WHERE ar.id = ?
-      ''' + footer, (artist_id,))
-    else:
-      self.c.execute(header + footer)
+      where.append('ar.id = ?')
+      args = (artist_id,)
+    if self.hide_duplicates:
+      where.append('s.dupe_of IS NULL')
+    self.c.execute(header + self._where(where) + footer, args)
  
     return self.c.fetchall()
 
+  def _where(self,conditions):
+    if not conditions:
+      return ''
+    return '''
+       WHERE ''' + '''
+         AND '''.join(conditions) + '''
+      '''
+
+  def _album_shown(self,alias):
+    ''' condition that leaves out albums made up of duplicates only '''
+    return 'EXISTS (SELECT 1 FROM song s WHERE s.album_id = %s.id AND s.dupe_of IS NULL)' % alias
+
   def get_albums(self,artist_id=None,genre_id=None,sort_by='name'):
     header = '''
       SELECT DISTINCT al.name AS album
@@ -171,16 +202,17 @@ class DB():
              , al.name ASC
         '''
 
+    where = []
+    args  = ()
     if artist_id != None:
-      self.c.execute(header + '''
-       WHERE ar.id = ?
-      ''' + footer, (artist_id,))
+      where.append('ar.id = ?')
+      args = (artist_id,)
     elif genre_id != None:
-      self.c.execute(header + '''
-       WHERE ar.genre_id = ?
-      ''' + footer, (genre_id,))
-    else:
-      self.c.execute(header + footer)
+      where.append('ar.genre_id = ?')
+      args = (genre_id,)
+    if self.hide_duplicates:
+      where.append(self._album_shown('al'))
+    self.c.execute(header + self._where(where) + footer, args)
     return self.c.fetchall()
 
   def get_m3us(self):
@@ -248,12 +280,14 @@ class DB():
     ORDER BY ar.name ASC
     '''
 
+    where = []
+    args  = ()
     if genre_id != None:
-      self.c.execute(header + '''
-       WHERE ar.genre_id = ?
-      ''' + footer, (genre_id,))
-    else:
-      self.c.execute(header + footer)
+      where.append('ar.genre_id = ?')
+      args = (genre_id,)
+    if self.hide_duplicates:
+      where.append(self._album_shown('a'))
+    self.c.execute(header + self._where(where) + footer, args)
     return self.c.fetchall()
 
   def get_album_art(self,album_id):
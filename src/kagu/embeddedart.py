@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+#
+#
+#   Copyright (c) 2007 Jesse Guardiani <jesse@guardiani.us>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License as
+#   published by the Free Software Foundation; either version 2 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+#   02111-1307, USA.
+#
+
+''' Cover art stored inside audio files: ID3v2 APIC/PIC frames, FLAC
+PICTURE blocks and MP4 covr atoms. locate() only walks frame and block
+headers to find where the image bytes are, the scan stores that, and
+extract() copies them out later, once per distinct image. Pictures that
+aren't stored as plain bytes (unsynchronised, compressed or encrypted
+ID3 frames, base64 in Vorbis comments) are passed over. '''
+
+import os, struct
+try:
+  from hashlib import md5
+except ImportError:
+  from md5 import new as md5
+
+FRONT_COVER = 3 # ID3/FLAC picture type
+
+def _syncsafe(data):
+  size = 0
+  for ch in data:
+    size = (size << 7) | (ord(ch) & 0x7f)
+  return size
+
+def _skip_string(f, encoding):
+  ''' read past a terminated ID3 string, returns False at end of file '''
+  if encoding in (1, 2): # UTF-16, terminated by an aligned double zero
+    while True:
+      ch = f.read(2)
+      if len(ch) < 2: return False
+      if ch == '\x00\x00': return True
+  while True:
+    ch = f.read(1)
+    if not ch: return False
+    if ch == '\x00': return True
+
+def _id3_picture(f, pos, size, frame_id):
+  ''' (picture type, offset, length) of an APIC or PIC frame's image '''
+  f.seek(pos)
+  encoding = ord(f.read(1))
+  if frame_id == 'PIC':
+    f.read(3) # image format
+  elif not _skip_string(f, 0): # mime type
+    return None
+  kind = ord(f.read(1))
+  if not _skip_string(f, encoding): # description
+    return None
+  start = f.tell()
+  return kind, start, pos + size - start
+
+def _id3(f, start):
+  f.seek(start)
+  header = f.read(10)
+  if len(header) < 10 or header[:3] != 'ID3':
+    return []
+  version = ord(header[3])
+  flags = ord(header[5])
+  end = start + 10 + _syncsafe(header[6:10])
+  if version < 2 or version > 4:
+    return []
+  if version < 4 and flags & 0x80: # the whole tag is unsynchronised
+    return []
+  pos = start + 10
+  if version >= 3 and flags & 0x40: # extended header
+    f.seek(pos)
+    if version == 4: pos = pos + _syncsafe(f.read(4))
+    else: pos = pos + 4 + struct.unpack('>I', f.read(4))[0]
+  pictures = []
+  while pos < end:
+    f.seek(pos)
+    if version == 2:
+      header = f.read(6)
+      if len(header) < 6 or header[0] == '\x00': break
+      (frame_id, size) = (header[:3], struct.unpack('>I', '\x00' + header[3:6])[0])
+      (data, fflags) = (pos + 6, 0)
+    else:
+      header = f.read(10)
+      if len(header) < 10 or header[0] == '\x00': break
+      frame_id = header[:4]
+      if version == 4: size = _syncsafe(header[4:8])
+      else: size = struct.unpack('>I', header[4:8])[0]
+      (data, fflags) = (pos + 10, struct.unpack('>H', header[8:10])[0])
+    pos = data + size
+    if frame_id not in ('APIC', 'PIC') or pos > end:
+      continue
+    length = size
+    if version == 4:
+      if fflags & 0x000e: continue # compressed, encrypted or unsynchronised
+      if fflags & 0x0040: (data, length) = (data + 1, length - 1) # group id
+      if fflags & 0x0001: (data, length) = (data + 4, length - 4) # data length
+    elif version == 3:
+      if fflags & 0x00c0: continue # compressed or encrypted
+      if fflags & 0x0020: (data, length) = (data + 1, length - 1) # group id
+    picture = _id3_picture(f, data, length, frame_id)
+    if picture: pictures.append(picture)
+  return pictures
+
+def _flac(f, start):
+  pictures = []
+  pos = start + 4
+  while True:
+    f.seek(pos)
+    header = f.read(4)
+    if len(header) < 4:
+      break
+    (n,) = struct.unpack('>I', header)
+    size = n & 0xffffff
+    if (n >> 24) & 0x7f == 6: # PICTURE
+      (kind, mime_len) = struct.unpack('>II', f.read(8))
+      f.seek(mime_len, 1)
+      (desc_len,) = struct.unpack('>I', f.read(4))
+      f.seek(desc_len + 16, 1) # description, width, height, depth, colors
+      (length,) = struct.unpack('>I', f.read(4))
+      pictures.append((kind, f.tell(), length))
+    pos = pos + 4 + size
+    if n & 0x80000000: # last metadata block
+      break
+  return pictures
+
+MP4_PATH = ['moov', 'udta', 'meta', 'ilst', 'covr']
+
+def _mp4(f, start, end, depth=0):
+  pos = start
+  while pos + 8 <= end:
+    f.seek(pos)
+    (size, name) = struct.unpack('>I4s', f.read(8))
+    data = pos + 8
+    if size == 1:
+      (size,) = struct.unpack('>Q', f.read(8))
+      data = pos + 16
+    elif size == 0:
+      size = end - pos
+    if size < 8:
+      break
+    if depth == len(MP4_PATH):
+      if name == 'data': # type and locale, then the image
+        return [(FRONT_COVER, data + 8, pos + size - data - 8)]
+    elif name == MP4_PATH[depth]:
+      if name == 'meta': data = data + 4 # version and flags
+      return _mp4(f, data, min(end, pos + size), depth + 1)
+    pos = pos + size
+  return []
+
+def locate(f):
+  ''' (offset, length) of the best picture in an open audio file, the
+  front cover if there is one, None if there is no usable picture '''
+  try:
+    f.seek(0, 2)
+    end = f.tell()
+    f.seek(0)
+    magic = f.read(8)
+    if magic[:4] == 'fLaC':
+      pictures = _flac(f, 0)
+    elif magic[4:8] == 'ftyp':
+      pictures = _mp4(f, 0, end)
+    else:
+      pictures = _id3(f, 0)
+  except (IOError, OSError, struct.error, TypeError):
+    return None
+  pictures = [p for p in pictures if p[2] > 0 and p[1] + p[2] <= end]
+  for (kind, offset, length) in pictures:
+    if kind == FRONT_COVER:
+      return offset, length
+  if pictures:
+    return pictures[0][1:]
+  return None
+
+def image_type(data):
+  ''' file extension for image data, None if it isn't an image pygame
+  reads '''
+  if data[:3] == '\xff\xd8\xff': return '.jpg'
+  if data[:8] == '\x89PNG\r\n\x1a\n': return '.png'
+  if data[:6] in ('GIF87a', 'GIF89a'): return '.gif'
+  if data[:2] == 'BM': return '.bmp'
+  return None
+
+def extract(path, offset, length, dir):
+  ''' copy the picture at offset in path into dir, named after the md5 of
+  the image so identical covers are only stored once. Returns the file
+  name, None if there is no image there. '''
+  try:
+    f = open(path, 'rb')
+    try:
+      f.seek(offset)
+      data = f.read(length)
+    finally:
+      f.close()
+  except (IOError, OSError):
+    return None
+  ext = image_type(data)
+  if len(data) < length or not ext:
+    return None
+  fn = os.path.join(dir, 'embedded-' + md5(data).hexdigest() + ext)
+  if not os.path.exists(fn):
+    tmp = fn + '.tmp'
+    f = open(tmp, 'wb')
+    try:
+      f.write(data)
+    finally:
+      f.close()
+    os.rename(tmp, fn)
+  return fn
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+#
+#
+#   Copyright (c) 2007 Jesse Guardiani <jesse@guardiani.us>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License as
+#   published by the Free Software Foundation; either version 2 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+#   02111-1307, USA.
+#
+
+''' Content fingerprints for spotting the same track stored twice. Only
+the audio payload counts: ID3v2 at the start, ID3v1 and APE tags at the
+end, FLAC metadata blocks, Ogg header pages, the ASF header object and
+everything in an MP4 but the mdat atom are left out, so two copies
+tagged differently still match. quick() reads a few sampled blocks and
+is meant to be taken of every file; full() reads the whole payload and
+is only worth it once two files share a quick() key. '''
+
+import os, struct
+try:
+  from hashlib import md5
+except ImportError:
+  from md5 import new as md5
+
+BLOCK   = 16384
+SAMPLES = 4
+
+
+def _id3v2_end(f, start):
+  ''' offset after an ID3v2 tag at start, start if there is none '''
+  f.seek(start)
+  header = f.read(10)
+  if len(header) < 10 or header[:3] != 'ID3':
+    return start
+  size = 0
+  for ch in header[6:10]:
+    size = (size << 7) | (ord(ch) & 0x7f)
+  if ord(header[5]) & 0x10: size = size + 10 # footer
+  return start + 10 + size
+
+def _trailer_start(f, end):
+  ''' offset where ID3v1 and APE tags at the end of the file begin '''
+  if end >= 128:
+    f.seek(end - 128)
+    if f.read(3) == 'TAG': end = end - 128
+  if end >= 32:
+    f.seek(end - 32)
+    footer = f.read(32)
+    if footer[:8] == 'APETAGEX':
+      (size, flags) = struct.unpack('<I4xI', footer[12:24])
+      if flags & 0x80000000: size = size + 32 # has a header too
+      end = max(0, end - size)
+  return end
+
+def _flac_payload(f, start, end):
+  pos = start + 4
+  while pos < end:
+    f.seek(pos)
+    header = f.read(4)
+    if len(header) < 4:
+      break
+    (n,) = struct.unpack('>I', header)
+    pos = pos + 4 + (n & 0xffffff)
+    if n & 0x80000000: # last metadata block
+      break
+  return pos, end
+
+def _ogg_payload(f, start, end):
+  ''' header pages carry granule position 0, audio starts with the first
+  page that doesn't '''
+  pos = start
+  while pos < end:
+    f.seek(pos)
+    header = f.read(27)
+    if len(header) < 27 or header[:4] != 'OggS':
+      break
+    (granule,) = struct.unpack('<q', header[6:14])
+    if granule != 0:
+      return pos, end
+    segments = f.read(ord(header[26]))
+    pos = pos + 27 + len(segments) + sum([ord(s) for s in segments])
+  return start, end
+
+def _mp4_payload(f, start, end):
+  ''' the biggest mdat atom; tags live in moov '''
+  pos = start
+  best = None
+  while pos + 8 <= end:
+    f.seek(pos)
+    (size, name) = struct.unpack('>I4s', f.read(8))
+    data = pos + 8
+    if size == 1:
+      (size,) = struct.unpack('>Q', f.read(8))
+      data = pos + 16
+    elif size == 0:
+      size = end - pos
+    if size < 8:
+      break
+    if name == 'mdat' and (best is None or size > best[1] - best[0]):
+      best = (data, min(end, pos + size))
+    pos = pos + size
+  return best or (start, end)
+
+ASF_HEADER = '\x30\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9\x00\xaa\x00\x62\xce\x6c'
+
+def _asf_payload(f, start, end):
+  ''' whatever follows the header object, which holds the tags '''
+  f.seek(start + 16)
+  (size,) = struct.unpack('<Q', f.read(8))
+  return min(end, start + size), end
+
+def payload(f):
+  ''' (start, end) of the audio in an open file '''
+  f.seek(0, 2)
+  end = f.tell()
+  start = _id3v2_end(f, 0)
+  f.seek(start)
+  magic = f.read(16)
+  if magic == ASF_HEADER:
+    return _asf_payload(f, start, end)
+  if magic[:4] == 'fLaC':
+    return _flac_payload(f, start, end)
+  if magic[:4] == 'OggS':
+    return _ogg_payload(f, start, end)
+  if magic[4:8] == 'ftyp':
+    return _mp4_payload(f, start, end)
+  return start, _trailer_start(f, end)
+
+def quick(path, fileobj=None):
+  ''' "payload size:md5 of SAMPLES blocks spread over it", None if the
+  file can't be read. Reads through fileobj if given, leaving it open. '''
+  try:
+    f = fileobj or open(path, 'rb')
+    try:
+      (start, end) = payload(f)
+      length = max(0, end - start)
+      h = md5()
+      if length <= BLOCK * SAMPLES:
+        f.seek(start)
+        h.update(f.read(length))
+      else:
+        step = (length - BLOCK) / (SAMPLES - 1)
+        for i in range(SAMPLES):
+          f.seek(start + i * step)
+          h.update(f.read(BLOCK))
+      return '%d:%s' % (length, h.hexdigest())
+    finally:
+      if fileobj is None: f.close()
+  except (IOError, OSError, struct.error):
+    return None
+
+def full(path):
+  ''' md5 of the whole payload, None if the file can't be read '''
+  try:
+    f = open(path, 'rb')
+    try:
+      (start, end) = payload(f)
+      f.seek(start)
+      h = md5()
+      left = max(0, end - start)
+      while left > 0:
+        data = f.read(min(left, 65536))
+        if not data:
+          break
+        h.update(data)
+        left = left - len(data)
+      return h.hexdigest()
+    finally:
+      f.close()
+  except (IOError, OSError, struct.error):
+    return None
@@ -19,7 +19,11 @@
 #   02111-1307, USA.
 #
 
-import pygame,os,gc,fcntl,time,gtk
+import pygame,os,gc,fcntl,time
+try:
+  import gtk
+except (ImportError, RuntimeError):
+  gtk = None # kagu-scanner --headless runs without it
 from pygame.locals import *
 
 
@@ -33,7 +37,7 @@ osso_c          = None
 font_o_cache    = {}
 theme_tester    = False
 UNKNOWNIMAGE    = "data/UNKNOWN_UNKNOWN.jpg"
-DBVERSION       = 3
+DBVERSION       = 12
 timer_time      = 0
 
 
@@ -88,6 +92,11 @@ def get_no_path_list():
 def calc_db_dir():
   return os.path.expanduser("~/.kagu/")
 
+# kagu-scanner --watch touches this after every change it commits to the
+# db, the player watches its mtime
+def library_stamp():
+  return os.path.join(calc_db_dir(), 'library.changed')
+
 def format_time(seconds):
   secs=int(seconds)
   if secs>=3600:
@@ -139,9 +148,10 @@ def infobanner(text):
 #
 #  Confirm action
 #
-def confirm_dlg(text, button=gtk.STOCK_OK):
+def confirm_dlg(text, button=None):
     print "showing confirmation dialog"
     import gtk
+    if button is None: button = gtk.STOCK_OK
     dialog = gtk.Dialog("Confirmation", None, gtk.DIALOG_MODAL, (button, gtk.RESPONSE_ACCEPT, gtk.STOCK_CANCEL, gtk.RESPONSE_REJECT))
     dialog.set_default_response(gtk.RESPONSE_REJECT)
     label = gtk.Label("    "+text+"    ")
@@ -92,6 +92,7 @@ class GSTPlayer(baseplayer.BasePlayer):
     self.player.set_state(gst.STATE_PLAYING)
 
   def get_length(self):
+    if self.exact_length: return False
     value,position = 0,0
     try: position, format = self.player.query_duration(gst.FORMAT_TIME)
     except: position = gst.CLOCK_TIME_NONE
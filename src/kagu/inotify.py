@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+#
+#
+#   Copyright (c) 2007 Jesse Guardiani <jesse@guardiani.us>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License as
+#   published by the Free Software Foundation; either version 2 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+#   02111-1307, USA.
+#
+
+''' Minimal inotify(7) binding on top of ctypes, just enough for the
+scanner's --watch mode. No compiled extension needed, so it works with
+the stock python on the device. '''
+
+import os, struct, select, errno
+try:
+  import ctypes, ctypes.util
+except ImportError:
+  ctypes = None
+
+IN_MODIFY      = 0x00000002
+IN_ATTRIB      = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_UNMOUNT     = 0x00002000
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ONLYDIR     = 0x01000000
+IN_ISDIR       = 0x40000000
+
+EVENT_HEADER = 'iIII' # struct inotify_event: wd, mask, cookie, len
+EVENT_HEADER_SIZE = struct.calcsize(EVENT_HEADER)
+
+_libc = None
+
+def _get_libc():
+  global _libc
+  if _libc is None:
+    if ctypes is None:
+      raise OSError(errno.ENOSYS, "inotify needs ctypes")
+    name = ctypes.util.find_library('c') or 'libc.so.6'
+    try:
+      libc = ctypes.CDLL(name, use_errno=True)
+    except TypeError: # python2.5, no errno from ctypes calls
+      libc = ctypes.CDLL(name)
+    if not hasattr(libc, 'inotify_init'):
+      raise OSError(errno.ENOSYS, "libc has no inotify support")
+    _libc = libc
+  return _libc
+
+def _errno():
+  if hasattr(ctypes, 'get_errno'):
+    return ctypes.get_errno()
+  return errno.EIO
+
+def available():
+  try:
+    _get_libc()
+  except OSError:
+    return False
+  return True
+
+
+class Inotify():
+  fd = None
+
+  def __init__(self):
+    self.libc = _get_libc()
+    self.fd = self.libc.inotify_init()
+    if self.fd < 0:
+      e = _errno()
+      raise OSError(e, os.strerror(e))
+
+  def add_watch(self, path, mask):
+    ''' returns the watch descriptor, the same one again for a path that
+    is already watched '''
+    wd = self.libc.inotify_add_watch(self.fd, path, mask)
+    if wd < 0:
+      e = _errno()
+      raise OSError(e, os.strerror(e), path)
+    return wd
+
+  def rm_watch(self, wd):
+    self.libc.inotify_rm_watch(self.fd, wd)
+
+  def read(self, timeout=None):
+    ''' wait up to timeout seconds for events, returns a list of
+    (wd, mask, cookie, name) tuples. Empty list on timeout. '''
+    try:
+      (r, w, x) = select.select([self.fd], [], [], timeout)
+    except select.error, e:
+      if e[0] == errno.EINTR: return []
+      raise
+    if not r:
+      return []
+    buf = os.read(self.fd, 64 * 1024)
+    events = []
+    pos = 0
+    while pos + EVENT_HEADER_SIZE <= len(buf):
+      (wd, mask, cookie, length) = struct.unpack_from(EVENT_HEADER, buf, pos)
+      pos = pos + EVENT_HEADER_SIZE
+      name = buf[pos:pos+length].rstrip('\0')
+      pos = pos + length
+      events.append((wd, mask, cookie, name))
+    return events
+
+  def close(self):
+    if self.fd is not None:
+      os.close(self.fd)
+      self.fd = None
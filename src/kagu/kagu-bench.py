@@ -0,0 +1,755 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+#
+#   Copyright (c) 2007 Jesse Guardiani <jesse@guardiani.us>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License as
+#   published by the Free Software Foundation; either version 2 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+#   02111-1307, USA.
+#
+
+''' kagu-bench: time the scanner against a synthetic music library.
+
+Generates a tree of tiny but valid MP3, Ogg Vorbis, FLAC and M4A (and,
+if asked for, WMA) files
+(a few KB each, with real stream headers and tags, and a few hundred
+seconds of claimed length) and runs NewSongProcessor's scan phases over
+it: a cold run into an empty db, a warm run with nothing changed, and an
+incremental run after some files were re-tagged, deleted and added.
+Every run goes through all of a scan's phases, the artist and album art
+ones with downloads turned off. Reports wall time, files/sec and peak
+RSS for every phase. Given several
+job counts (-j 1,2,4) it does the runs once per count and ends with the
+files phase rate of each. Needs no network, display or GTK. '''
+
+import os, sys, time, struct, random, getopt, shutil, tempfile, imp, unicodedata
+try:
+  import resource
+except ImportError:
+  resource = None
+
+KAGU_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, KAGU_DIR)
+
+from mutagen.ogg import OggPage
+
+
+# -- file encoders -------------------------------------------------------
+
+def _syncsafe(n):
+  return struct.pack('>4B', (n >> 21) & 0x7f, (n >> 14) & 0x7f, (n >> 7) & 0x7f, n & 0x7f)
+
+ID3_FRAMES = [('title','TIT2'), ('artist','TPE1'), ('album','TALB'), ('albumartist','TPE2'),
+              ('tracknumber','TRCK'), ('genre','TCON'), ('date','TDRC')]
+
+# uid goes into the "audio" of every encoder below, so only files written
+# with the same uid have the same payload
+
+def mp3_data(tags, seconds, uid):
+  ''' ID3v2.4 tag, a Xing frame with the frame count for the length, and
+  two silent 128kbit/44.1kHz frames '''
+  frames = []
+  for (key, frame_id) in ID3_FRAMES:
+    if key in tags:
+      text = '\x03' + tags[key].encode('utf-8') # utf-8
+      frames.append(frame_id + _syncsafe(len(text)) + '\x00\x00' + text)
+  body = ''.join(frames)
+  header = 'ID3\x04\x00\x00' + _syncsafe(len(body))
+  nframes = int(seconds * 44100 / 1152)
+  xing = '\xff\xfb\x90\x64' + '\x00' * 32 + 'Xing' + struct.pack('>III', 3, nframes, nframes * 417)
+  silent = '\xff\xfb\x90\x64' + struct.pack('>I', uid) + '\x00' * 409
+  return header + body + xing + '\x00' * (417 - len(xing)) + silent * 2
+
+VORBIS_KEYS = [('title','TITLE'), ('artist','ARTIST'), ('album','ALBUM'), ('albumartist','ALBUMARTIST'),
+               ('tracknumber','TRACKNUMBER'), ('genre','GENRE'), ('date','DATE')]
+
+def _vorbis_comment(tags):
+  vendor = 'kagu-bench'
+  comments = []
+  for (key, name) in VORBIS_KEYS:
+    if key in tags:
+      comments.append(name + '=' + tags[key].encode('utf-8'))
+  data = [struct.pack('<I', len(vendor)), vendor, struct.pack('<I', len(comments))]
+  for c in comments:
+    data.append(struct.pack('<I', len(c)))
+    data.append(c)
+  return ''.join(data)
+
+def ogg_data(tags, seconds, uid):
+  ''' identification, comment and (dummy) setup header, then a last page
+  whose granule position gives the length '''
+  rate = 44100
+  ident = '\x01vorbis' + struct.pack('<IBIiiiBB', 0, 2, rate, 0, 128000, 0, 0xb8, 1)
+  comment = '\x03vorbis' + _vorbis_comment(tags) + '\x01'
+  setup = '\x05vorbis' + '\x00' * 32
+  pages = []
+  for (seq, packets, position) in [(0, [ident], 0), (1, [comment, setup], 0),
+                                   (2, [struct.pack('<I', uid) + '\x00' * 60], int(seconds * rate))]:
+    page = OggPage()
+    page.serial = uid
+    page.sequence = seq
+    page.packets = packets
+    page.position = position
+    page.first = seq == 0
+    page.last  = seq == 2
+    pages.append(page.write())
+  return ''.join(pages)
+
+def flac_data(tags, seconds, uid):
+  ''' STREAMINFO and VORBIS_COMMENT blocks, then a few bytes of "audio" '''
+  rate, channels, bps = 44100, 2, 16
+  samples = int(seconds * rate)
+  info = struct.pack('>HH', 4096, 4096) + '\x00' * 6 # block sizes, unknown frame sizes
+  packed = (rate << 44) | ((channels - 1) << 41) | ((bps - 1) << 36) | samples
+  info = info + struct.pack('>Q', packed) + '\x00' * 16 # md5 unknown
+  comment = _vorbis_comment(tags)
+  def block(type, data, last=False):
+    return struct.pack('>I', (int(last) << 31) | (type << 24) | len(data)) + data
+  return 'fLaC' + block(0, info) + block(4, comment, True) + '\xff\xf8' + struct.pack('>I', uid) + '\x00' * 26
+
+MP4_KEYS = [('title','\xa9nam'), ('artist','\xa9ART'), ('album','\xa9alb'), ('albumartist','aART'),
+            ('genre','\xa9gen'), ('date','\xa9day')]
+
+def _atom(name, data):
+  return struct.pack('>I', len(data) + 8) + name + data
+
+def m4a_data(tags, seconds, uid):
+  ''' ftyp, a moov with one sound track and iTunes-style tags, a tiny mdat '''
+  items = []
+  for (key, name) in MP4_KEYS:
+    if key in tags:
+      items.append(_atom(name, _atom('data', struct.pack('>II', 1, 0) + tags[key].encode('utf-8'))))
+  if 'tracknumber' in tags:
+    (track, total) = (tags['tracknumber'].split('/') + ['0'])[:2]
+    items.append(_atom('trkn', _atom('data', struct.pack('>II', 0, 0) + struct.pack('>4H', 0, int(track), int(total), 0))))
+  mdhd = _atom('mdhd', struct.pack('>B3xIIIIHH', 0, 0, 0, 44100, int(seconds * 44100), 0x55c4, 0))
+  hdlr = _atom('hdlr', struct.pack('>I4s4s12x', 0, '\0\0\0\0', 'soun') + '\0')
+  trak = _atom('trak', _atom('mdia', mdhd + hdlr))
+  meta = _atom('meta', '\0\0\0\0' + _atom('hdlr', struct.pack('>I4s4s12x', 0, '\0\0\0\0', 'mdir') + '\0') +
+                       _atom('ilst', ''.join(items)))
+  moov = _atom('moov', trak + _atom('udta', meta))
+  return _atom('ftyp', 'M4A \0\0\0\0M4A mp42isom') + moov + _atom('mdat', struct.pack('>I', uid) + '\0' * 60)
+
+ASF_HEADER     = '\x30\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9\x00\xaa\x00\x62\xce\x6c'
+ASF_DATA       = '\x36\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9\x00\xaa\x00\x62\xce\x6c'
+ASF_CONTENT    = '\x33\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9\x00\xaa\x00\x62\xce\x6c'
+ASF_EXTENDED   = '\x40\xa4\xd0\xd2\x07\xe3\xd2\x11\x97\xf0\x00\xa0\xc9\x5e\xa8\x50'
+ASF_PROPERTIES = '\xa1\xdc\xab\x8c\x47\xa9\xcf\x11\x8e\xe4\x00\xc0\x0c\x20\x53\x65'
+ASF_KEYS = [('album','WM/AlbumTitle'), ('albumartist','WM/AlbumArtist'), ('genre','WM/Genre'),
+            ('date','WM/Year'), ('tracknumber','WM/TrackNumber')]
+
+def _asf_object(guid, data):
+  return guid + struct.pack('<Q', len(data) + 24) + data
+
+def _utf16(s):
+  return s.encode('utf-16-le') + '\0\0'
+
+def wma_data(tags, seconds, uid):
+  ''' file properties with the length, title/author in the content
+  description and the rest as WM/ attributes, then a data object '''
+  props = '\0' * 40 + struct.pack('<QQQIIII', int(seconds * 10000000), 0, 0, 2, 0, 0, 0)
+  texts = [_utf16(tags.get('title', u'')), _utf16(tags.get('artist', u'')), '', '', '']
+  content = struct.pack('<5H', *[len(t) for t in texts]) + ''.join(texts)
+  attrs = []
+  for (key, name) in ASF_KEYS:
+    if key in tags:
+      value = _utf16(tags[key])
+      attrs.append(struct.pack('<H', len(_utf16(name))) + _utf16(name) + struct.pack('<HH', 0, len(value)) + value)
+  extended = struct.pack('<H', len(attrs)) + ''.join(attrs)
+  objects = _asf_object(ASF_PROPERTIES, props) + _asf_object(ASF_CONTENT, content) + _asf_object(ASF_EXTENDED, extended)
+  header = ASF_HEADER + struct.pack('<QIBB', 30 + len(objects), 3, 1, 2) + objects
+  return header + _asf_object(ASF_DATA, '\0' * 16 + struct.pack('<QH', 1, 0x101) + struct.pack('<I', uid) + '\0' * 60)
+
+def encode(ext, tags, seconds, uid):
+  if ext == 'mp3':  return mp3_data(tags, seconds, uid)
+  if ext == 'ogg':  return ogg_data(tags, seconds, uid)
+  if ext == 'flac': return flac_data(tags, seconds, uid)
+  if ext == 'wma':  return wma_data(tags, seconds, uid)
+  return m4a_data(tags, seconds, uid)
+
+
+# -- the library -----------------------------------------------------------
+
+SYLLABLES = ['ka','gu','ro','mi','tan','el','vor','sha','lin','dra','po','quee','ze','bel','nor',
+             'ith','ca','lum','fen','ash','ory','tes','bru','on','yal','ve','sol','mar','ki','dus']
+ACCENTED  = [u'ö', u'é', u'ñ', u'å', u'ü', u'ç']
+GENRES    = [('Rock',30), ('Pop',18), ('Electronic',10), ('Hip-Hop',8), ('Jazz',6), ('Classical',6),
+             ('Metal',5), ('Folk',4), ('Blues',3), ('Reggae',2), ('Country',2), ('Soundtrack',2),
+             ('General Alternative',2), ('Other',1), ('Punk',1)]
+FORMAT_WEIGHTS = {'mp3':70, 'm4a':12, 'ogg':10, 'flac':8, 'wma':5}
+LAYOUTS   = [('artist/album',60), ('genre/artist/album',15), ('artist/album/disc',5),
+             ('artist',10), ('incoming',5), ('deep',5)]
+
+_cover = None
+
+def cover_image():
+  ''' a 500x500 JPEG for the art phases to decode and scale, a BMP if
+  this pygame can't write JPEGs '''
+  global _cover
+  if _cover is None:
+    import pygame
+    surface = pygame.Surface((500, 500), 0, 24)
+    for i in range(0, 500, 20):
+      pygame.draw.line(surface, (i % 256, 80, 255 - i % 256), (0, i), (499, 499 - i), 9)
+    fd, fn = tempfile.mkstemp('.jpg')
+    os.close(fd)
+    try:
+      try:
+        pygame.image.save(surface, fn)
+      except pygame.error:
+        os.rename(fn, fn + '.bmp')
+        fn = fn + '.bmp'
+        pygame.image.save(surface, fn)
+      f = open(fn, 'rb')
+      _cover = f.read()
+      f.close()
+    finally:
+      os.unlink(fn)
+  return _cover
+
+def _weighted(rnd, choices):
+  total = 0
+  for (value, weight) in choices: total = total + weight
+  pick = rnd.uniform(0, total)
+  for (value, weight) in choices:
+    pick = pick - weight
+    if pick <= 0: return value
+  return choices[-1][0]
+
+def _fs_name(s):
+  ''' tag text as a file name; accents are dropped, the scanner stores
+  paths as they come and sqlite3 only takes ascii strs '''
+  s = unicodedata.normalize('NFKD', unicode(s)).encode('ascii', 'ignore')
+  for ch in '/\\:?*"<>|':
+    s = s.replace(ch, ' ')
+  return s.strip() or '_'
+
+
+class LibraryGenerator():
+  ''' A made up collection that looks like a real one to the scanner:
+  popular artists with many albums and a long tail with one, 6-16
+  tracks an album, some compilations and multi-disc sets, messy tags
+  (missing years and genres, "The" and case variants of the same
+  artist, accented names, a few untagged files) and a mix of directory
+  layouts and depths, with cover images, playlists and other clutter
+  in between. Same count, formats and seed give the same tree. '''
+
+  def __init__(self, root, count, formats, seed=1):
+    self.root    = root
+    self.count   = count
+    self.formats = [(f, FORMAT_WEIGHTS[f]) for f in formats]
+    self.seed    = seed
+    self.rnd     = random.Random(seed)
+    self.written = 0
+    self.files   = []
+    self.made    = [] # (ext, seconds, uid) of the files written
+
+  def manifest(self):
+    return 'count=%d formats=%s seed=%d covers=2\n' % (self.count, ','.join([f for (f, w) in self.formats]), self.seed)
+
+  def matches(self):
+    try:
+      f = open(os.path.join(self.root, '.kagu-bench'))
+      try:
+        return f.read() == self.manifest()
+      finally:
+        f.close()
+    except IOError:
+      return False
+
+  def name(self, words=2):
+    rnd = self.rnd
+    out = []
+    for i in range(rnd.randint(1, words)):
+      word = ''.join([rnd.choice(SYLLABLES) for j in range(rnd.randint(1, 3))])
+      if rnd.random() < 0.05:
+        k = rnd.randint(0, len(word) - 1)
+        word = word[:k] + rnd.choice(ACCENTED) + word[k+1:]
+      out.append(word.capitalize())
+    return u' '.join(out)
+
+  def artists(self):
+    ''' (name, albums) with a heavy-tailed number of albums each '''
+    rnd = self.rnd
+    artists = []
+    albums = 0
+    while albums * 11 < self.count:
+      name = self.name()
+      if rnd.random() < 0.2: name = u'The ' + name
+      n = min(40, int(rnd.paretovariate(1.3)))
+      artists.append((name, n))
+      albums = albums + n
+    return artists
+
+  def variant(self, artist):
+    ''' how a sloppily tagged track spells the artist '''
+    r = self.rnd.random()
+    if r < 0.02: return artist.lower()
+    if r < 0.03 and artist.startswith(u'The '): return artist[4:]
+    if r < 0.04: return artist.upper()
+    return artist
+
+  def album_dir(self, artist, album, genre, year, disc):
+    layout = _weighted(self.rnd, LAYOUTS)
+    a, b = _fs_name(artist), _fs_name(album)
+    if layout == 'artist/album':
+      return os.path.join(a, b)
+    if layout == 'genre/artist/album':
+      return os.path.join(_fs_name(genre), a, b)
+    if layout == 'artist/album/disc':
+      return os.path.join(a, b, 'CD %d' % disc)
+    if layout == 'artist':
+      return a
+    if layout == 'incoming':
+      return os.path.join('incoming', '%d-%02d' % (year, self.rnd.randint(1, 12)))
+    depth = self.rnd.randint(3, 7)
+    parts = ['d%d' % self.rnd.randint(0, 3) for i in range(depth)]
+    return os.path.join(*(parts + ['%s - %s' % (a, b)]))
+
+  def write(self, rel_dir, fn, tags, seconds, uid=None):
+    ext = os.path.splitext(fn)[1][1:]
+    if uid is None: uid = self.written + 1
+    data = encode(ext, tags, seconds, uid)
+    d = os.path.join(self.root, rel_dir)
+    if not os.path.isdir(d): os.makedirs(d)
+    path = os.path.join(d, fn)
+    f = open(path, 'wb')
+    f.write(data)
+    f.close()
+    self.files.append(path)
+    self.made.append((ext, seconds, uid))
+    self.written = self.written + 1
+    if self.written % 10000 == 0:
+      print >>sys.stderr, "generated %d files" % self.written
+
+  def clutter(self, rel_dir):
+    d = os.path.join(self.root, rel_dir)
+    r = self.rnd.random()
+    if r < 0.3:
+      f = open(os.path.join(d, self.rnd.choice(['folder.jpg', 'cover.jpg'])), 'wb')
+      f.write(cover_image())
+      f.close()
+    if r > 0.8:
+      f = open(os.path.join(d, self.rnd.choice(['info.txt', 'album.cue', 'rip.log'])), 'w')
+      f.write('x' * 500)
+      f.close()
+
+  def tags(self, title, artist, album, albumartist, track, total, genre, year):
+    rnd = self.rnd
+    if rnd.random() < 0.02:
+      return {} # untagged
+    tags = {'title': title, 'artist': artist, 'album': album,
+            'tracknumber': u'%d/%d' % (track, total)}
+    if albumartist: tags['albumartist'] = albumartist
+    if rnd.random() > 0.05: tags['genre'] = genre
+    if rnd.random() > 0.08: tags['date'] = unicode(year)
+    return tags
+
+  def album(self, artist, album, genre, year, compilation=False):
+    rnd = self.rnd
+    ext = _weighted(rnd, self.formats)
+    discs = 1
+    if rnd.random() < 0.05: discs = rnd.randint(2, 3)
+    for disc in range(1, discs + 1):
+      rel_dir = self.album_dir(artist, album, genre, year, disc)
+      total = rnd.randint(6, 16)
+      for track in range(1, total + 1):
+        if self.written >= self.count: return
+        title = self.name(4)
+        if compilation:
+          track_artist = self.name()
+          albumartist = u'Various Artists'
+        else:
+          track_artist = self.variant(artist)
+          albumartist = None
+        fn = '%02d - %s.%s' % (track, _fs_name(title), ext)
+        tags = self.tags(title, track_artist, album, albumartist, track, total, genre, year)
+        self.write(rel_dir, fn, tags, rnd.uniform(90, 420))
+      self.clutter(rel_dir)
+
+  def copies(self, n):
+    ''' n tracks a second time, tagged differently, where downloads and
+    old backups end up '''
+    rnd = self.rnd
+    for i in rnd.sample(range(len(self.made)), min(n, len(self.made))):
+      (ext, seconds, uid) = self.made[i]
+      title = self.name(4)
+      tags = self.tags(title, self.name(), u'Unknown Album', None, 1, 1, 'Other', 2000)
+      self.write(os.path.join('incoming', 'copies'), '%03d %s.%s' % (i % 1000, _fs_name(title), ext), tags, seconds, uid)
+
+  def generate(self):
+    ''' about 1% of the files end up as copies of others '''
+    if os.path.exists(self.root): shutil.rmtree(self.root)
+    os.makedirs(self.root)
+    rnd = self.rnd
+    dupes = self.count / 100
+    count = self.count
+    self.count = count - dupes
+    for (artist, albums) in self.artists():
+      genre = _weighted(rnd, GENRES)
+      year = rnd.randint(1960, 2010)
+      for i in range(albums):
+        if self.written >= self.count: break
+        if rnd.random() < 0.04:
+          self.album(u'Various Artists', self.name(3), genre, year, True)
+        else:
+          self.album(artist, self.name(3), genre, min(2010, year + i))
+    while self.written < self.count: # the last artists ran out before count did
+      self.album(self.name(), self.name(3), _weighted(rnd, GENRES), rnd.randint(1960, 2010))
+    self.count = count
+    self.copies(count - self.written)
+    for i in range(3):
+      f = open(os.path.join(self.root, 'playlist%d.m3u' % i), 'w')
+      for path in rnd.sample(self.files, min(50, len(self.files))):
+        f.write(path + '\n')
+      f.close()
+    f = open(os.path.join(self.root, '.kagu-bench'), 'w')
+    f.write(self.manifest())
+    f.close()
+
+  def load_files(self):
+    ''' the audio files of an existing tree '''
+    self.files = []
+    for (dirpath, dirnames, filenames) in os.walk(self.root):
+      for fn in filenames:
+        if os.path.splitext(fn)[1][1:] in FORMAT_WEIGHTS:
+          self.files.append(os.path.join(dirpath, fn))
+    self.files.sort()
+
+  def mutate(self, percent):
+    ''' Re-tag, delete and add about percent% of the files, half, a
+    quarter and a quarter of that. Returns (changed, deleted, added). '''
+    rnd = random.Random(self.seed + 1)
+    n = max(1, len(self.files) * percent / 100)
+    picks = rnd.sample(self.files, min(len(self.files), n))
+    changed = picks[:len(picks) / 2]
+    deleted = picks[len(picks) / 2:len(picks) * 3 / 4]
+    for path in changed:
+      ext = os.path.splitext(path)[1][1:]
+      tags = {'title': u'Retagged %d' % rnd.randint(0, 1 << 30), 'artist': u'Retagged Artist',
+              'album': u'Retagged Album', 'tracknumber': u'1/1'}
+      data = encode(ext, tags, 200, rnd.randint(1 << 24, 1 << 30))
+      f = open(path, 'wb')
+      f.write(data)
+      f.close()
+      t = time.time() + 2 # make sure the mtime moves
+      os.utime(path, (t, t))
+    for path in deleted:
+      os.unlink(path)
+      self.files.remove(path)
+    self.rnd = rnd
+    added = len(picks) - len(changed) - len(deleted)
+    before = self.written
+    self.count = self.written + added
+    self.album(u'Added Artist', u'Added Album %d' % rnd.randint(0, 1 << 30), 'Rock', 2010)
+    while self.written < self.count:
+      self.album(u'Added Artist', u'Added Album %d' % rnd.randint(0, 1 << 30), 'Rock', 2010)
+    try:
+      os.unlink(os.path.join(self.root, '.kagu-bench')) # no longer the tree the manifest describes
+    except OSError:
+      pass
+    return len(changed), len(deleted), self.written - before
+
+
+# -- measuring ---------------------------------------------------------------
+
+def _reset_peak_rss():
+  ''' start a new VmHWM (Linux >= 4.0), False where that isn't possible '''
+  try:
+    f = open('/proc/self/clear_refs', 'w')
+    f.write('5')
+    f.close()
+    return True
+  except (IOError, OSError):
+    return False
+
+def _peak_rss_kb():
+  try:
+    f = open('/proc/self/status')
+    try:
+      for line in f:
+        if line.startswith('VmHWM:'):
+          return int(line.split()[1])
+    finally:
+      f.close()
+  except (IOError, OSError, ValueError):
+    pass
+  if resource is not None:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return 0
+
+def _children_peak_rss_kb():
+  ''' largest parser process so far (ru_maxrss of the reaped children) '''
+  if resource is None:
+    return 0
+  return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+def drop_caches():
+  ''' empty the page cache for a cold-cache run, needs root '''
+  try:
+    os.system('sync')
+    f = open('/proc/sys/vm/drop_caches', 'w')
+    f.write('3\n')
+    f.close()
+    return True
+  except (IOError, OSError):
+    return False
+
+
+class Bench():
+  def __init__(self, ks, work_dir, library, jobs, out, progress=None):
+    self.ks       = ks
+    self.work_dir = work_dir
+    self.library  = library
+    self.jobs     = jobs
+    self.out      = out
+    self.progress = progress
+    self.db_path  = os.path.join(work_dir, 'bench.db')
+    self.rows     = []
+    self.prefs    = None
+
+  def setup_art(self):
+    ''' the art phases need the theme (from the player's db) and prefs
+    with downloads off, so they time only what happens on the device '''
+    if self.prefs is not None:
+      return
+    import globals, prefs
+    ks = self.ks
+    player_db = os.path.join(globals.calc_db_dir(), 'kagu.db')
+    if os.path.exists(player_db): os.unlink(player_db)
+    mydb = ks.DB(player_db)
+    mydb.con.commit()
+    mydb.con.close()
+    ks.db.reconnect()
+    ks.init_pygame(display=False)
+    ks.theme.set_theme('default', False)
+    self.prefs = prefs.Prefs()
+    self.prefs.set('download_covers', 'False')
+
+  def clear_art(self):
+    for fn in ('album_cache.atlas', 'artist_cache.atlas'):
+      if os.path.exists(os.path.join(self.work_dir, fn)): os.unlink(os.path.join(self.work_dir, fn))
+    for d in ('thumbs', 'covers'):
+      shutil.rmtree(os.path.join(self.work_dir, d), True)
+
+  def phase(self, run, name, func, files=None):
+    per_phase = _reset_peak_rss()
+    cpu = time.clock()
+    start = time.time()
+    result = func()
+    wall = time.time() - start
+    cpu = time.clock() - cpu
+    row = {'run': run, 'phase': name, 'jobs': self.jobs, 'wall': round(wall, 3), 'cpu': round(cpu, 3),
+           'peak_rss_kb': _peak_rss_kb(), 'peak_rss_per_phase': per_phase,
+           'children_peak_rss_kb': _children_peak_rss_kb()}
+    if files is not None:
+      row['files'] = files()
+      row['files_per_sec'] = wall and round(row['files'] / wall, 1)
+    self.rows.append(row)
+    return row, result
+
+  def run(self, name, fresh=False):
+    ks = self.ks
+    self.setup_art()
+    if fresh:
+      if os.path.exists(self.db_path): os.unlink(self.db_path)
+      self.clear_art()
+    mydb = ks.DB(self.db_path)
+    sp = ks.NewSongProcessor(mydb, self.work_dir, None, None, self.prefs, self.jobs)
+    rows = []
+    rows.append(self.phase(name, 'stamps', sp.begin_scan)[0])
+    rows.append(self.phase(name, 'files', lambda: sp.scan(self.library), lambda: sp.stats.counts['files'])[0])
+    rows.append(self.phase(name, 'sweep', sp.end_scan)[0])
+    rows.append(self.phase(name, 'artists', lambda: sp.get_artist_images(os.path.join(self.work_dir, 'artist_cache.atlas')))[0])
+    rows.append(self.phase(name, 'albums', lambda: sp.get_album_covers(os.path.join(self.work_dir, 'album_cache.atlas')))[0])
+    rows.append(self.phase(name, 'lengths', sp.measure_lengths)[0])
+    mydb.con.commit()
+    summary = sp.stats.summary()
+    mydb.con.close()
+    for row in rows:
+      self.report(row)
+    total = {'run': name, 'phase': 'total', 'jobs': self.jobs}
+    for k in ('wall', 'cpu'):
+      total[k] = round(sum([row[k] for row in rows]), 3)
+    total['peak_rss_kb'] = max([row['peak_rss_kb'] for row in rows])
+    total['files_per_sec'] = total['wall'] and round(summary['files'] / total['wall'], 1)
+    for k in ('files', 'new', 'changed', 'unchanged', 'deleted', 'failed', 'duplicates', 'bytes_parsed',
+              'walk_time', 'parse_time', 'db_time'):
+      total[k] = summary[k]
+    self.rows.append(total)
+    self.report(total)
+
+  def report(self, row):
+    if self.progress:
+      self.progress.emit('bench', **row)
+      return
+    line = "%-12s %-7s %8.2fs %8.2fs cpu" % (row['run'], row['phase'], row['wall'], row['cpu'])
+    if row.get('files_per_sec') is not None:
+      line = line + " %9.1f files/s" % row['files_per_sec']
+    else:
+      line = line + " " * 17
+    line = line + " %8.1f MB peak" % (row['peak_rss_kb'] / 1024.0)
+    if row['phase'] == 'total':
+      line = line + "\n%-12s new %d, changed %d, unchanged %d, deleted %d, failed %d, %d copies, %.1f MB parsed; walk %.2fs, parse %.2fs, db %.2fs" % (
+        '', row['new'], row['changed'], row['unchanged'], row['deleted'], row['failed'], row['duplicates'],
+        row['bytes_parsed'] / 1048576.0, row['walk_time'], row['parse_time'], row['db_time'])
+    print >>self.out, line
+    self.out.flush()
+
+  def report_jobs(self, benches):
+    ''' the files phase rate of each run at each job count '''
+    for bench in benches:
+      parsers = self.ks.parser_jobs(bench.jobs)
+      for row in bench.rows:
+        if row['phase'] != 'files': continue
+        if self.progress:
+          self.progress.emit('bench_jobs', run=row['run'], jobs=bench.jobs, parsers=parsers,
+                             files_per_sec=row['files_per_sec'])
+          continue
+        line = "%-12s -j %-4d %9.1f files/s" % (row['run'], bench.jobs, row['files_per_sec'])
+        if parsers != bench.jobs:
+          line = line + " (parsed in-process, one CPU)"
+        print >>self.out, line
+    self.out.flush()
+
+
+def load_scanner(home):
+  ''' import kagu-scanner.py with ~ pointed at the bench's work dir, so
+  the real ~/.kagu is never touched, and with no display needed '''
+  os.environ['HOME'] = home
+  os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+  os.chdir(KAGU_DIR)
+  return imp.load_source('kaguscanner', os.path.join(KAGU_DIR, 'kagu-scanner.py'))
+
+def usage():
+  print "kagu-bench [--files N|-n N] [--formats mp3,ogg,flac,m4a,wma] [--dir DIR] [--keep] [--jobs N[,N...]|-j N[,N...]]"
+  print "           [--seed N] [--change PERCENT] [--runs cold,warm,incremental] [--drop-caches] [--json]"
+
+def main():
+  count = 5000
+  formats = ['mp3', 'ogg', 'flac', 'm4a']
+  lib_dir = None
+  keep = False
+  jobs = [1]
+  seed = 1
+  change = 5
+  runs = ['cold', 'warm', 'incremental']
+  cold_cache = False
+  json_out = False
+
+  try:
+    opts, args = getopt.getopt(sys.argv[1:], "hn:j:",
+      ["help", "files=", "formats=", "dir=", "keep", "jobs=", "seed=", "change=", "runs=", "drop-caches", "json"])
+    for opt, arg in opts:
+      if opt in ("-h", "--help"):
+        usage()
+        return
+      elif opt in ("-n", "--files"):
+        count = max(1, int(arg))
+      elif opt == "--formats":
+        formats = arg.split(',')
+        for f in formats:
+          if f not in FORMAT_WEIGHTS: raise ValueError("unknown format " + f)
+      elif opt == "--dir":
+        lib_dir = os.path.abspath(arg)
+        keep = True
+      elif opt == "--keep":
+        keep = True
+      elif opt in ("-j", "--jobs"):
+        jobs = [max(1, int(j)) for j in arg.split(',')]
+      elif opt == "--seed":
+        seed = int(arg)
+      elif opt == "--change":
+        change = max(1, int(arg))
+      elif opt == "--runs":
+        runs = arg.split(',')
+        for r in runs:
+          if r not in ('cold', 'warm', 'incremental'): raise ValueError("unknown run " + r)
+      elif opt == "--drop-caches":
+        cold_cache = True
+      elif opt == "--json":
+        json_out = True
+  except (getopt.GetoptError, ValueError), message:
+    print message
+    usage()
+    sys.exit(2)
+  if args:
+    usage()
+    sys.exit(2)
+
+  work_dir = tempfile.mkdtemp(prefix='kagu-bench-')
+  if lib_dir is None:
+    lib_dir = os.path.join(work_dir, 'library')
+  home = os.path.join(work_dir, 'home')
+  os.makedirs(os.path.join(home, '.kagu'))
+
+  out = sys.stdout
+  ks = load_scanner(home)
+  progress = None
+  if json_out:
+    import scanstats
+    progress = scanstats.JsonProgress(out)
+  sys.stdout = sys.stderr # the scanner's own chatter
+
+  try:
+    lib = LibraryGenerator(lib_dir, count, formats, seed)
+    if lib.matches():
+      print >>sys.stderr, "reusing library in", lib_dir
+      lib.load_files()
+      lib.written = len(lib.files)
+    else:
+      print >>sys.stderr, "generating %d files in %s" % (count, lib_dir)
+      t = time.time()
+      lib.generate()
+      print >>sys.stderr, "generated in %.1fs" % (time.time() - t)
+
+    benches = []
+    for j in jobs:
+      if benches and 'incremental' in runs:
+        # every job count starts from the same, unmutated tree
+        print >>sys.stderr, "regenerating %d files in %s" % (count, lib_dir)
+        lib = LibraryGenerator(lib_dir, count, formats, seed)
+        lib.generate()
+      bench = Bench(ks, work_dir, lib_dir, j, out, progress)
+      benches.append(bench)
+      if not progress:
+        print >>out, "%d files, %s, %d job(s)" % (len(lib.files), ','.join(formats), j)
+      fresh = True
+      for run in runs:
+        if run == 'incremental':
+          (changed, deleted, added) = lib.mutate(change)
+          print >>sys.stderr, "re-tagged %d, deleted %d, added %d files" % (changed, deleted, added)
+        if cold_cache and not drop_caches():
+          print >>sys.stderr, "can't drop the page cache (not root?), caches stay warm"
+          cold_cache = False
+        bench.run(run, fresh=(run == 'cold' or fresh))
+        fresh = False
+    if len(benches) > 1:
+      if not progress:
+        print >>out, "files phase by job count:"
+      bench.report_jobs(benches)
+  finally:
+    if keep:
+      shutil.rmtree(home, True)
+      if os.path.exists(bench_db(work_dir)): os.unlink(bench_db(work_dir))
+      if not lib_dir.startswith(work_dir): shutil.rmtree(work_dir, True)
+      print >>sys.stderr, "library kept in", lib_dir
+    else:
+      shutil.rmtree(work_dir, True)
+
+def bench_db(work_dir):
+  return os.path.join(work_dir, 'bench.db')
+
+if __name__ == '__main__': main()
@@ -20,10 +20,25 @@
 #   02111-1307, USA.
 #
 
-import sqlite3,os,mutagen,mutagen.easyid3,urllib,string,math,pygame,sys,time
-import pygtk,gtk,gobject
+import sqlite3,os,mutagen,mutagen.mp3,mutagen.ogg,mutagen.batch,urllib,string,math,pygame,sys,time,getopt,re,unicodedata
+try:
+  import pygtk,gtk,gobject
+except (ImportError, RuntimeError):
+  gtk = None # --headless doesn't need it
+try:
+  import multiprocessing
+except ImportError:
+  multiprocessing = None # python2.5: tags get parsed in-process
+try:
+  from os import scandir
+except ImportError:
+  try:
+    from scandir import scandir # d_type aware listdir() for python2
+  except ImportError:
+    scandir = None
 from pygame.locals import *
-import globals,prefs
+from stat import S_ISDIR, S_ISLNK
+import globals,prefs,inotify,netfetch,atlas,scanstats,fingerprint,embeddedart,thumbnail
 if globals.ISMAEMO:
   import osso
 
@@ -32,10 +47,33 @@ from theme   import theme   as theme
 
 SCREENDEPTH = None
 
+_name_drop  = re.compile(u"['\u2019.]", re.UNICODE) # "R.E.M." = "REM", "Guns N' Roses" = "Guns N Roses"
+_name_split = re.compile(r'[^\w]+', re.UNICODE)   # "AC/DC" = "AC-DC" = "AC DC"
+
+def name_key(name):
+  ''' What artist and album names are matched on: case, accents,
+  punctuation, runs of whitespace and a leading "The" don't count, so
+  "The Beatles", "beatles" and "Beatles, The" are one artist. '''
+  if isinstance(name, str): name = name.decode('utf-8','replace')
+  key = unicodedata.normalize('NFKD', name.lower())
+  key = u''.join([ch for ch in key if not u'\u0300' <= ch <= u'\u036f']) # accents, not kana marks
+  key = unicodedata.normalize('NFC', key.replace(u'&', u' and '))
+  words = _name_split.split(_name_drop.sub(u'', key))
+  words = [w for w in words if w]
+  if len(words) > 1 and words[0] == u'the': words = words[1:]
+  elif len(words) > 1 and words[-1] == u'the': words = words[:-1]
+  key = u' '.join(words)
+  return key or name.strip().lower()
+
 class DB():
   path = None
   con = None
   c = None
+  id_caches = None
+  song_chunk = 500 # song rows per executemany() and commit
+  scan_gen = 0
+  artist_refs = [('album','artist_id'), ('song','artist_id'), ('song','album_artist_id')]
+  album_refs  = [('song','album_id')]
 
   def __init__(self,path):
     self.path = path
@@ -45,27 +83,61 @@ class DB():
     self.con = sqlite3.connect(self.path)
     self.con.row_factory = sqlite3.Row
     self.c   = self.con.cursor()
-    self.c.execute('PRAGMA synchronous = OFF;')
+    # scans commit every song_chunk songs; NORMAL keeps a power cut from
+    # corrupting the db without an fsync() per statement
+    self.c.execute('PRAGMA synchronous = NORMAL;')
+    self.song_rows = []
+    self.seen_rows = []
     if do_create:
       self.create_db()
 
+  def _key(self,name):
+    ''' sqlite hands names back as unicode, tags derived from file names
+    are utf-8 strs. Give both the same dict key. '''
+    if isinstance(name, str): return name.decode('utf-8','replace')
+    return name
+
+  def _ids(self,table):
+    ''' name -> id map for genre, name_key -> id for artist and
+    (name_key, path) -> id for album, loaded with one query per table the
+    first time it's needed '''
+    if self.id_caches is None:
+      self.id_caches = {'genre':{}, 'artist':{}, 'album':{}}
+      self.c.execute('SELECT id, name FROM genre')
+      for row in self.c.fetchall():
+        self.id_caches['genre'][row['name']] = row['id']
+      self.c.execute('SELECT id, name_key FROM artist')
+      for row in self.c.fetchall():
+        self.id_caches['artist'][row['name_key']] = row['id']
+      self.c.execute('SELECT id, name_key, path FROM album')
+      for row in self.c.fetchall():
+        self.id_caches['album'][(row['name_key'], row['path'])] = row['id']
+    return self.id_caches[table]
+
+  def forget_ids(self):
+    ''' call after bulk changes to names, the caches reload on demand '''
+    self.id_caches = None
+
   def _get_generic_id(self,table,name):
     valid_table_l = ['artist','album','genre']
     if not table in valid_table_l:
       assert None # paranoia
-    for i in [0,1]: #only two iterations. If the first fails, the second should always succeed!
-      self.c.execute('SELECT id FROM '+table+' WHERE name=?',(name,))
-      for row in self.c:
-        return row['id']
-      # no rows if we made it here, so insert one
-      self.c.execute('INSERT INTO '+table+' (name) VALUES (?)',(name,))
-    assert None # Should never ever make it here, so blow up if we do
+    ids = self._ids(table)
+    key = self._key(name)
+    try:
+      return ids[key]
+    except KeyError:
+      pass
+    self.c.execute('INSERT INTO '+table+' (name) VALUES (?)',(name,))
+    ids[key] = self.c.lastrowid
+    return ids[key]
 
   def create_db(self):
     self.c.execute('''
       CREATE TABLE album (
         id        INTEGER NOT NULL UNIQUE PRIMARY KEY AUTOINCREMENT,
         name      VARCHAR NOT NULL,
+        name_key  VARCHAR NOT NULL,
         art_path  VARCHAR,
         artist_id INTEGER,
         genre_id  INTEGER,
@@ -74,7 +146,7 @@ class DB():
       )
     ''')  
     self.c.execute('''
-      CREATE INDEX album_name_path ON album (name, path)
+      CREATE UNIQUE INDEX album_name_key_path ON album (name_key, path)
     ''')
     self.c.execute('''
       CREATE INDEX album_year ON album (year)
@@ -90,12 +162,13 @@ class DB():
       CREATE TABLE artist (
         id          INTEGER NOT NULL UNIQUE PRIMARY KEY AUTOINCREMENT,
         name        VARCHAR NOT NULL,
+        name_key    VARCHAR NOT NULL,
         art_path    VARCHAR,
         genre_id    INTEGER
       )
     ''')
     self.c.execute('''
-      CREATE INDEX artist_name ON artist (name)
+      CREATE UNIQUE INDEX artist_name_key ON artist (name_key)
     ''')
     self.c.execute('''
       CREATE INDEX artist_genre ON artist (genre_id)
@@ -113,7 +186,18 @@ class DB():
         year      INTEGER,
         genre_id  INTEGER NOT NULL,
         path      VARCHAR NOT NULL,
-        flags     INTEGER NOT NULL
+        flags     INTEGER NOT NULL,
+        size      INTEGER,
+        mtime     INTEGER,
+        inode     INTEGER,
+        scan_gen  INTEGER,
+        fingerprint VARCHAR,
+        full_hash VARCHAR,
+        dupe_of   INTEGER,
+        length_estimated INTEGER,
+        seek_table VARCHAR,
+        art_offset INTEGER,
+        art_length INTEGER
       )
     ''')
     self.c.execute('''
@@ -129,7 +213,10 @@ class DB():
       CREATE INDEX song_album_artist_id ON song (album_artist_id)
     ''')
     self.c.execute('''
-      CREATE INDEX song_path ON song (path)
+      CREATE UNIQUE INDEX song_path ON song (path)
+    ''')
+    self.c.execute('''
+      CREATE INDEX song_fingerprint ON song (fingerprint)
     ''')
     self.c.execute('''
       CREATE TABLE genre (
@@ -151,7 +238,9 @@ class DB():
       CREATE TABLE album_art (
         album_id  INTEGER NOT NULL UNIQUE PRIMARY KEY,
         x         INTEGER NOT NULL,
-        y         INTEGER NOT NULL
+        y         INTEGER NOT NULL,
+        art_path  VARCHAR,
+        art_mtime INTEGER
       )
     ''')
 
@@ -159,7 +248,18 @@ class DB():
       CREATE TABLE artist_art (
         artist_id INTEGER NOT NULL UNIQUE PRIMARY KEY,
         x         INTEGER NOT NULL,
-        y         INTEGER NOT NULL
+        y         INTEGER NOT NULL,
+        art_path  VARCHAR,
+        art_mtime INTEGER
+      )
+    ''')
+
+    self.c.execute('''
+      CREATE TABLE atlas (
+        name      VARCHAR NOT NULL UNIQUE PRIMARY KEY,
+        theme     VARCHAR,
+        cols      INTEGER NOT NULL,
+        rows      INTEGER NOT NULL
       )
     ''')
 
@@ -195,7 +295,8 @@ class DB():
       CREATE TABLE m3u (
         id        INTEGER NOT NULL UNIQUE PRIMARY KEY AUTOINCREMENT,
         name      VARCHAR NOT NULL,
-        path      VARCHAR NOT NULL
+        path      VARCHAR NOT NULL,
+        scan_gen  INTEGER
       )
     ''')
 
@@ -206,6 +307,16 @@ class DB():
     self.c.execute('''
       CREATE INDEX m3u_path ON m3u (path)
     ''')
+
+    self.c.execute('''
+      CREATE TABLE scan_state (
+        scan_gen  INTEGER NOT NULL,
+        phase     VARCHAR NOT NULL,
+        root      VARCHAR,
+        dir       VARCHAR,
+        overwrite INTEGER NOT NULL
+      )
+    ''')
     
     self.update_theme()
 
@@ -266,27 +377,29 @@ class DB():
         ''', (row['name'],row['x'],row['y'],row['w'],row['h']))
 
   def get_album_id(self,name,path,year,genre_id):
-    for i in [0,1]: #only two iterations. If the first fails, the second should always succeed!
-      self.c.execute('SELECT id FROM album WHERE name=? AND path=?',(name,path))
-      for row in self.c:
-        return row['id']
-      # no rows if we made it here, so insert one
-      self.c.execute('INSERT INTO album (name, path, year, genre_id) VALUES (?, ?, ?, ?)',(name,path,year,genre_id))
-    assert None # Should never ever make it here, so blow up if we do
+    ids = self._ids('album')
+    key = (name_key(name), self._key(path))
+    try:
+      return ids[key]
+    except KeyError:
+      pass
+    self.c.execute('INSERT INTO album (name, name_key, path, year, genre_id) VALUES (?, ?, ?, ?, ?)',(name,key[0],path,year,genre_id))
+    ids[key] = self.c.lastrowid
+    return ids[key]
   
   def get_artist_id(self,artist,genre_id="Misc"):
-    for i in [0,1]: #only two iterations. If the first fails, the second should always succeed!
-      self.c.execute('SELECT id FROM artist WHERE name=?',(artist,))
-      for row in self.c:
-        return row['id']
-      # no rows if we made it here, so insert one
-      self.c.execute('INSERT INTO artist (name, art_path, genre_id) VALUES (?,?,?)',(artist,globals.UNKNOWNIMAGE,genre_id))
-    assert None # Should never ever make it here, so blow up if we do
+    ids = self._ids('artist')
+    key = name_key(artist)
+    try:
+      return ids[key]
+    except KeyError:
+      pass
+    self.c.execute('INSERT INTO artist (name, name_key, art_path, genre_id) VALUES (?,?,?,?)',(artist,key,globals.UNKNOWNIMAGE,genre_id))
+    ids[key] = self.c.lastrowid
+    return ids[key]
 #    return self._get_generic_id('artist',artist)
 
-  def insert_song(self,track,title,artist,album,album_artist,length,year,genre,path,flags):
-    #print 'insert_song():\n\ttitle=%s\n\tartist=%s\n\talbum=%s\n\tlength=%s\n\tpath=%s' % \
-    #    (title.encode('ascii','ignore'),artist.encode('ascii','ignore'),album.encode('ascii','ignore'),length,path.encode('ascii','ignore'))
+  def _get_song_ids(self,artist,album,album_artist,year,genre,path):
     genre_id = self._get_generic_id('genre', genre)
     album_id  = self.get_album_id(album, os.path.dirname(path), year, genre_id)
     artist_id = self.get_artist_id(artist,genre_id)
@@ -294,9 +407,249 @@ class DB():
       album_artist_id = artist_id
     else:
       album_artist_id = self.get_artist_id(album_artist,genre_id)
+    return album_id, artist_id, album_artist_id, genre_id
+
+  def insert_song(self,track,title,artist,album,album_artist,length,year,genre,path,flags,stamp=(None,None,None),fingerprint=None,estimated=False,seek_table=None,art=None):
+    #print 'insert_song():\n\ttitle=%s\n\tartist=%s\n\talbum=%s\n\tlength=%s\n\tpath=%s' % \
+    #    (title.encode('ascii','ignore'),artist.encode('ascii','ignore'),album.encode('ascii','ignore'),length,path.encode('ascii','ignore'))
+    ''' queue a new song, rows go to sqlite song_chunk at a time '''
+    (album_id, artist_id, album_artist_id, genre_id) = self._get_song_ids(artist,album,album_artist,year,genre,path)
+    (size, mtime, inode) = stamp
+    (art_offset, art_length) = art or (None, None)
+    self.song_rows.append((track,title,length,album_id,artist_id,album_artist_id,year,genre_id,path,flags,size,mtime,inode,self.scan_gen,fingerprint,int(estimated),seek_table,art_offset,art_length))
+    if len(self.song_rows) >= self.song_chunk:
+      self.flush_songs()
+    return album_id
+
+  def flush_songs(self):
+    ''' write queued songs and seen marks in one executemany() each and
+    commit. A path that is already in the table (say, reached twice
+    through a symlink) is left alone by the UNIQUE index on song.path. '''
+    if self.song_rows:
+      self.c.executemany('''
+        INSERT OR IGNORE INTO song (track,title,length,album_id,artist_id,album_artist_id,year,genre_id,path,flags,size,mtime,inode,scan_gen,fingerprint,length_estimated,seek_table,art_offset,art_length) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+      ''',self.song_rows)
+      self.song_rows = []
+    if self.seen_rows:
+      self.c.executemany('''
+        UPDATE song SET scan_gen=? WHERE id=?
+      ''',self.seen_rows)
+      self.seen_rows = []
+    self.con.commit()
+
+  def begin_scan(self):
+    ''' start a new scan generation. Every song and playlist the scan
+    comes across gets tagged with it, sweep() drops the rest. '''
     self.c.execute('''
-      INSERT INTO song (track,title,length,album_id,artist_id,album_artist_id,year,genre_id,path,flags) VALUES (?,?,?,?,?,?,?,?,?,?)
-    ''',(track,title,length,album_id,artist_id,album_artist_id,year,genre_id,path,flags))
+      SELECT MAX(g) AS g FROM (
+        SELECT MAX(scan_gen) AS g FROM song
+        UNION ALL
+        SELECT MAX(scan_gen) AS g FROM m3u
+      )
+    ''')
+    self.scan_gen = (self.c.fetchone()['g'] or 0) + 1
+    return self.scan_gen
+
+  def resume_scan(self,scan_gen):
+    ''' carry on with an interrupted scan's generation, so what it already
+    marked as seen survives the sweep '''
+    self.scan_gen = scan_gen
+    return self.scan_gen
+
+  def get_checkpoint(self):
+    ''' (scan_gen, phase, root, dir, overwrite) of an unfinished scan, or
+    None. Paths come back as utf-8 strs, to match what the walk sees. '''
+    self.c.execute('SELECT scan_gen, phase, root, dir, overwrite FROM scan_state LIMIT 1')
+    for row in self.c.fetchall():
+      (root, dir) = (row['root'], row['dir'])
+      if isinstance(root, unicode): root = root.encode('utf-8')
+      if isinstance(dir, unicode):  dir  = dir.encode('utf-8')
+      return row['scan_gen'], row['phase'], root, dir, bool(row['overwrite'])
+    return None
+
+  def set_checkpoint(self,phase,root=None,dir=None,overwrite=False):
+    ''' goes out with the next commit, together with the work it records '''
+    self.c.execute('DELETE FROM scan_state')
+    self.c.execute('''
+      INSERT INTO scan_state (scan_gen, phase, root, dir, overwrite) VALUES (?,?,?,?,?)
+    ''',(self.scan_gen, phase, root, dir, int(overwrite)))
+
+  def clear_checkpoint(self):
+    self.c.execute('DELETE FROM scan_state')
+
+  def mark_song_seen(self,song_id):
+    ''' an unchanged song is still there, queued like insert_song() '''
+    self.seen_rows.append((self.scan_gen, song_id))
+    if len(self.seen_rows) >= self.song_chunk:
+      self.flush_songs()
+
+  def mark_m3u_seen(self,m3u_id):
+    self.c.execute('''
+      UPDATE m3u SET scan_gen=? WHERE id=?
+    ''',(self.scan_gen, m3u_id))
+
+  def sweep(self):
+    ''' Delete songs and playlists the current scan didn't see, then the
+    albums that no longer have any songs. Returns (songs, albums, m3us)
+    removed. '''
+    self.flush_songs()
+    self.c.execute('''
+      DELETE FROM song WHERE scan_gen IS NULL OR scan_gen < ?
+    ''',(self.scan_gen,))
+    songs = self.c.rowcount
+    albums = self.remove_empty_albums()
+    self.c.execute('''
+      DELETE FROM m3u WHERE scan_gen IS NULL OR scan_gen < ?
+    ''',(self.scan_gen,))
+    m3us = self.c.rowcount
+    self.con.commit()
+    return songs, albums, m3us
+
+  def remove_empty_albums(self):
+    self.c.execute('''
+      DELETE FROM album WHERE id NOT IN (SELECT DISTINCT album_id FROM song)
+    ''')
+    albums = self.c.rowcount
+    if albums: self.forget_ids()
+    return albums
+
+  def remove_path(self,path):
+    ''' forget the song or playlist at path, returns the number of rows removed '''
+    self.c.execute('''
+      DELETE FROM song WHERE path=?
+    ''',(path,))
+    n = self.c.rowcount
+    self.c.execute('''
+      DELETE FROM m3u WHERE path=?
+    ''',(path,))
+    return n + self.c.rowcount
+
+  def remove_tree(self,path):
+    ''' forget every song and playlist below directory path '''
+    prefix = self._key(os.path.join(path,''))
+    self.c.execute('''
+      DELETE FROM song WHERE substr(path,1,?)=?
+    ''',(len(prefix),prefix))
+    n = self.c.rowcount
+    self.c.execute('''
+      DELETE FROM m3u WHERE substr(path,1,?)=?
+    ''',(len(prefix),prefix))
+    return n + self.c.rowcount
+
+  def update_song(self,song_id,track,title,artist,album,album_artist,length,year,genre,path,flags,stamp,fingerprint=None,estimated=False,seek_table=None,art=None):
+    ''' re-tag a song whose file changed on disk since the last scan. A
+    song_id of None (the song was inserted after the stamps were loaded)
+    finds the row by path instead. '''
+    if song_id is None:
+      self.flush_songs() # it may still be queued
+      self.c.execute('SELECT id FROM song WHERE path=?', (path,))
+      row = self.c.fetchone()
+      if row is None:
+        return self.insert_song(track,title,artist,album,album_artist,length,year,genre,path,flags,stamp,fingerprint,estimated,seek_table,art)
+      song_id = row['id']
+    (album_id, artist_id, album_artist_id, genre_id) = self._get_song_ids(artist,album,album_artist,year,genre,path)
+    (size, mtime, inode) = stamp
+    (art_offset, art_length) = art or (None, None)
+    self.c.execute('''
+      UPDATE song
+         SET track=?, title=?, length=?, album_id=?, artist_id=?, album_artist_id=?
+           , year=?, genre_id=?, flags=?, size=?, mtime=?, inode=?, scan_gen=?
+           , fingerprint=?, full_hash=NULL, dupe_of=NULL
+           , length_estimated=?, seek_table=?, art_offset=?, art_length=?
+       WHERE id=?
+    ''',(track,title,length,album_id,artist_id,album_artist_id,year,genre_id,flags,size,mtime,inode,self.scan_gen,fingerprint,int(estimated),seek_table,art_offset,art_length,song_id))
+    return album_id
+
+  def get_fingerprint_collisions(self):
+    ''' (id, path) of songs that share their quick fingerprint with
+    another song and haven't been fully hashed yet '''
+    self.c.execute('''
+      SELECT id, path
+        FROM song
+       WHERE full_hash IS NULL
+         AND fingerprint IN (SELECT fingerprint
+                               FROM song
+                              WHERE fingerprint IS NOT NULL
+                           GROUP BY fingerprint
+                             HAVING COUNT(*) > 1)
+    ''')
+    rows = []
+    for row in self.c.fetchall():
+      path = row['path']
+      if isinstance(path, unicode): path = path.encode('utf-8')
+      rows.append((row['id'], path))
+    return rows
+
+  def get_album_embedded_art(self,album_id):
+    ''' (path, offset, length) of the pictures embedded in an album's songs,
+    by track '''
+    self.c.execute('''
+      SELECT path, art_offset, art_length
+        FROM song
+       WHERE album_id=? AND art_offset IS NOT NULL
+    ORDER BY track, id
+    ''',(album_id,))
+    rows = []
+    for row in self.c.fetchall():
+      path = row['path']
+      if isinstance(path, unicode): path = path.encode('utf-8')
+      rows.append((path, row['art_offset'], row['art_length']))
+    return rows
+
+  def get_estimated_songs(self):
+    ''' (id, path) of songs whose length mutagen could only estimate '''
+    self.c.execute('''
+      SELECT id, path FROM song WHERE length_estimated=1
+    ''')
+    rows = []
+    for row in self.c.fetchall():
+      path = row['path']
+      if isinstance(path, unicode): path = path.encode('utf-8')
+      rows.append((row['id'], path))
+    return rows
+
+  def set_song_length(self,song_id,length,seek_table):
+    ''' store the length and seek table a frame walk measured. A length of
+    None keeps the estimate, but the song isn't walked again. '''
+    self.c.execute('''
+      UPDATE song SET length=COALESCE(?,length), length_estimated=0, seek_table=? WHERE id=?
+    ''',(length,seek_table,song_id))
+
+  def set_full_hashes(self,rows):
+    ''' rows of (full hash, song id) '''
+    self.c.executemany('UPDATE song SET full_hash=? WHERE id=?', rows)
+
+  def mark_duplicates(self):
+    ''' Point every copy of a track at the one to keep: same quick
+    fingerprint and full hash, preferring a tagged file (flags 0) and
+    then the one that was found first. Returns the number of copies. '''
+    self.c.execute('''
+      UPDATE song
+         SET dupe_of = (SELECT s2.id
+                          FROM song s2
+                         WHERE s2.fingerprint = song.fingerprint
+                           AND s2.full_hash   = song.full_hash
+                      ORDER BY s2.flags, s2.id
+                         LIMIT 1)
+       WHERE full_hash IS NOT NULL
+    ''')
+    self.c.execute('UPDATE song SET dupe_of = NULL WHERE dupe_of = id')
+    self.c.execute('SELECT COUNT(*) AS n FROM song WHERE dupe_of IS NOT NULL')
+    return self.c.fetchone()['n']
+
+  def get_song_stamps(self):
+    ''' map of path -> (song id, album id, size, mtime, inode) for every song.
+    Paths come back from sqlite as unicode; key them by the utf-8 bytes
+    os.listdir() hands the scanner so lookups don't silently miss. '''
+    self.c.execute('''
+      SELECT id, album_id, path, size, mtime, inode FROM song
+    ''')
+    stamps = {}
+    for row in self.c:
+      path = row['path']
+      if isinstance(path, unicode): path = path.encode('utf-8')
+      stamps[path] = (row['id'], row['album_id'], row['size'], row['mtime'], row['inode'])
+    return stamps
 
   def get_album_paths(self):
     self.c.execute('''
@@ -317,33 +670,6 @@ class DB():
     ''')
     return self.c.fetchall()
 
-  def get_song_paths(self):
-    self.c.execute('''
-      SELECT id
-           , path
-           , album_id
-        FROM song
-    ''')
-    return self.c.fetchall()
-
-  def get_m3u_paths(self):
-    self.c.execute('''
-      SELECT id
-           , path
-        FROM m3u
-    ''')
-    return self.c.fetchall()
-
-  def remove_song(self, song_id):
-    self.c.execute('''
-      DELETE FROM song WHERE id=?
-      ''', (song_id,))
-
-  def remove_m3u(self, m3u_id):
-    self.c.execute('''
-      DELETE FROM m3u WHERE id=?
-      ''', (m3u_id,))
-
   def is_empty_album(self, album_id):
     self.c.execute('''
       SELECT s.id AS song_id
@@ -356,6 +682,9 @@ class DB():
     return True
 
   def remove_album(self, album_id):
+    self.c.execute('SELECT name_key, path FROM album WHERE id=?', (album_id,))
+    for row in self.c.fetchall():
+      self._ids('album').pop((row['name_key'], row['path']), None)
     self.c.execute('''
       DELETE FROM album WHERE id=?
       ''', (album_id,))
@@ -372,11 +701,44 @@ class DB():
   def set_artist_art_path(self,artist_id,path):
     self.c.execute('UPDATE artist SET art_path = ? WHERE id = ?',(path,artist_id))
 
+  def _merge_row(self,table,old_id,new_id,refs):
+    ''' point everything at old_id to new_id and drop old_id '''
+    for (ref_table, col) in refs:
+      self.c.execute('UPDATE '+ref_table+' SET '+col+' = ? WHERE '+col+' = ?',(new_id,old_id))
+    (art_table, key) = self._art_table(table)
+    self.c.execute('DELETE FROM '+art_table+' WHERE '+key+' = ?',(old_id,))
+    self.c.execute('DELETE FROM '+table+' WHERE id = ?',(old_id,))
+
   def set_artist_name(self,artist_id,name):
-    self.c.execute('UPDATE artist SET name = ? WHERE id = ?',(name,artist_id))
+    ''' Rename an artist. If the new name matches another artist, this
+    one is folded into it instead. Returns the id the artist ends up with. '''
+    ids = self._ids('artist')
+    key = name_key(name)
+    self.c.execute('SELECT name_key FROM artist WHERE id = ?',(artist_id,))
+    for row in self.c.fetchall():
+      if ids.get(row['name_key']) == artist_id: del ids[row['name_key']]
+    other = ids.get(key)
+    if other is not None and other != artist_id:
+      self._merge_row('artist', artist_id, other, self.artist_refs)
+      return other
+    self.c.execute('UPDATE artist SET name = ?, name_key = ? WHERE id = ?',(name,key,artist_id))
+    ids[key] = artist_id
+    return artist_id
 
   def set_album_name(self,album_id,name):
-    self.c.execute('UPDATE album SET name = ? WHERE id = ?',(name,album_id))
+    ''' like set_artist_name(), within the album's directory '''
+    ids = self._ids('album')
+    self.c.execute('SELECT name_key, path FROM album WHERE id = ?',(album_id,))
+    for row in self.c.fetchall():
+      if ids.get((row['name_key'], row['path'])) == album_id: del ids[(row['name_key'], row['path'])]
+      key = (name_key(name), row['path'])
+      other = ids.get(key)
+      if other is not None and other != album_id:
+        self._merge_row('album', album_id, other, self.album_refs)
+        return other
+      self.c.execute('UPDATE album SET name = ?, name_key = ? WHERE id = ?',(name,key[0],album_id))
+      ids[key] = album_id
+    return album_id
 
   def set_song_flag(self,song_id,flag,remove=False):
     if not remove:
@@ -391,21 +753,63 @@ class DB():
     self.c.execute('''
       DELETE FROM artist_art
     ''')
+    self.c.execute('''
+      DELETE FROM atlas
+    ''')
+
+  def _art_table(self,kind):
+    valid_kind_l = ['album','artist']
+    if not kind in valid_kind_l:
+      assert None # paranoia
+    return kind+'_art', kind+'_id'
+
+  def get_art_tiles(self,kind):
+    ''' id -> (x, y, art_path, art_mtime) of every tile in an atlas, after
+    dropping the ones whose album/artist is gone '''
+    (table, key) = self._art_table(kind)
+    self.c.execute('DELETE FROM '+table+' WHERE '+key+' NOT IN (SELECT id FROM '+kind+')')
+    self.c.execute('SELECT '+key+' AS id, x, y, art_path, art_mtime FROM '+table)
+    tiles = {}
+    for row in self.c:
+      tiles[row['id']] = (row['x'], row['y'], row['art_path'], row['art_mtime'])
+    return tiles
+
+  def clear_art(self,kind):
+    (table, key) = self._art_table(kind)
+    self.c.execute('DELETE FROM '+table)
+    self.c.execute('DELETE FROM atlas WHERE name=?',(kind,))
+
+  def get_atlas(self,kind):
+    self.c.execute('SELECT theme, cols, rows FROM atlas WHERE name=?',(kind,))
+    for row in self.c:
+      return row['theme'], row['cols'], row['rows']
+    return None
+
+  def set_atlas(self,kind,theme,cols,rows):
+    self.c.execute('''
+      REPLACE INTO atlas (name,theme,cols,rows) VALUES (?,?,?,?)
+    ''',(kind,theme,cols,rows))
+
+  def insert_album_art(self,album_id,x,y,art_path=None,art_mtime=None):
+    self.c.execute('''
+      REPLACE INTO album_art (album_id,x,y,art_path,art_mtime) VALUES (?,?,?,?,?)
+    ''',(album_id,x,y,art_path,art_mtime))
 
-  def insert_album_art(self,album_id,x,y):
+  def insert_artist_art(self,artist_id,x,y,art_path=None,art_mtime=None):
     self.c.execute('''
-      REPLACE INTO album_art (album_id,x,y) VALUES (?,?,?)
-    ''',(album_id,x,y))
+      REPLACE INTO artist_art (artist_id,x,y,art_path,art_mtime) VALUES (?,?,?,?,?)
+    ''',(artist_id,x,y,art_path,art_mtime))
 
-  def insert_artist_art(self,artist_id,x,y):
+  def ensure_artist_art(self,artist_id):
+    ''' point an artist at the unknown image unless it already has a tile '''
     self.c.execute('''
-      REPLACE INTO artist_art (artist_id,x,y) VALUES (?,?,?)
-    ''',(artist_id,x,y))
+      INSERT OR IGNORE INTO artist_art (artist_id,x,y) VALUES (?,0,0)
+    ''',(artist_id,))
 
   def insert_m3u(self,name,path):
     self.c.execute('''
-      INSERT INTO m3u (name,path) VALUES (?,?)
-    ''',(name,path))
+      INSERT INTO m3u (name,path,scan_gen) VALUES (?,?,?)
+    ''',(name,path,self.scan_gen))
 
   def is_compilation(self,album_id):
     ''' Does this album have more than one artist? '''
@@ -434,14 +838,6 @@ class DB():
       return 0
     return 0
 
-  def song_of_path(self, path):
-    self.c.execute('''
-    SELECT id FROM song WHERE path = ? LIMIT 1
-    ''', (path,))
-    for row in self.c:
-      return int(row['id'])
-    return 0
-
   def m3u_of_path(self, path):
     self.c.execute('''
     SELECT id FROM m3u WHERE path = ? LIMIT 1
@@ -469,84 +865,6 @@ class DB():
       artist_a.append(row)
     return artist_a
 
-  def consolidate_artist_names(self, cb_func=None):
-    ''' fix dupe artists we created with set_artist_name '''
-    self.c.execute('''
-      SELECT id, name FROM artist
-    ''')
-    list = self.c.fetchall()
-    removed = {}
-    for row in list:
-      artist_id     = row['id']
-      artist_name   = row['name']
-      
-      try:
-        if (removed[artist_id]==True):
-#          print "DUPE, skipping artist #"+str(artist_id)
-          continue
-      except:
-#        print "artist #"+str(artist_id)
-        if cb_func:
-          cb_func()
-
-
-      self.c.execute('''
-        SELECT id FROM artist WHERE id != ? AND name = ?
-        ''', (artist_id, artist_name,))
-      list2 = self.c.fetchall()
-      for dupe in list2:
-        print "replacing "+str(dupe['id'])+" with "+str(artist_id)+" ("+str(artist_name)+")"
-
-        self.c.execute('''
-          UPDATE album SET artist_id = ? WHERE artist_id = ?
-          ''', (artist_id, dupe['id'],))
-        self.c.execute('''
-          UPDATE song SET artist_id = ? WHERE artist_id = ?
-          ''', (artist_id, dupe['id'],))
-        self.c.execute('''
-          UPDATE song SET album_artist_id = ? WHERE album_artist_id = ?
-          ''', (artist_id, dupe['id'],))
-        self.c.execute('''
-          DELETE FROM artist WHERE id = ?
-          ''', (dupe['id'],))
-        removed[dupe['id']]=True
-
-  def consolidate_album_names(self, cb_func=None):
-    ''' fix dupe albums we created with set_album_name '''
-    self.c.execute('''
-      SELECT id, name, path FROM album
-    ''')
-    list = self.c.fetchall()
-    removed = {}
-    for row in list:
-      album_id     = row['id']
-      album_name   = row['name']
-      album_path   = row['path']
-      
-      try:
-        if (removed[album_id]==True):
-#          print "DUPE, skipping album #"+str(album_id)
-          continue
-      except:
-#        print "album #"+str(album_id)
-        if cb_func:
-          cb_func()
-
-      self.c.execute('''
-        SELECT id FROM album WHERE id != ? AND name = ? AND path = ?
-        ''', (album_id, album_name, album_path))
-      list2 = self.c.fetchall()
-      for dupe in list2:
-        print "replacing "+str(dupe['id'])+" with "+str(album_id)+" ("+str(album_name)+")"
-
-        self.c.execute('''
-          UPDATE song SET album_id = ? WHERE album_id = ?
-          ''', (album_id, dupe['id'],))
-        self.c.execute('''
-          DELETE FROM album WHERE id = ?
-          ''', (dupe['id'],))
-        removed[dupe['id']]=True
-
 
 class Art():
   def __init__(self,name,width,height,art_path):
@@ -574,75 +892,257 @@ class Art():
     self.rect  = self.image.get_rect()
 
 
+class ArtAtlas():
+  ''' album_cache.atlas / artist_cache.atlas (see atlas.py): 125x128
+  tiles, the unknown image at (0,0). album_art/artist_art remember each
+  tile's position and the image (path and mtime) it was drawn from, so a
+  rescan only draws what is new or changed, straight into the file.
+  Tiles of removed albums/artists are reused, and when the grid is full
+  it gets another page at the bottom, leaving existing tiles where they
+  are. Tiles are drawn when the atlas is saved, from the 'tile' size of a
+  thumbnail.Thumbnailer if there is one, which scales all the new images
+  at once over its process pool. '''
+  width, height = 125, 128
+
+  def __init__(self,DB,kind,fn,theme_name,count,rebuild=False,thumbs=None):
+    self.DB    = DB
+    self.thumbs = thumbs
+    self.todo  = [] # (x, y, name, art_path) of the tiles save() draws
+    self.kind  = kind
+    self.fn    = fn
+    self.theme_name = theme_name
+    self.changed = False
+    self.free  = None
+    self.file  = None
+    self.new_fn = None
+
+    info = DB.get_atlas(kind)
+    if not rebuild and info and info[0] == theme_name and os.path.exists(fn):
+      try:
+        self.file = atlas.AtlasFile(fn, 'r+b')
+        if (self.file.cols, self.file.rows) != tuple(info[1:3]) or \
+           (self.file.tile_w, self.file.tile_h) != (self.width, self.height):
+          self.file.close()
+          self.file = None
+      except (IOError, ValueError), message:
+        print "can't open "+fn+", redrawing all art:", message
+        self.file = None
+
+    if self.file is None:
+      # drawn next to the old one, which the player may still have open
+      DB.clear_art(kind)
+      self.tiles = {}
+      self.new_fn = fn + '.new'
+      self.file = atlas.create(self.new_fn, self.width, self.height)
+      self.grow(count+1)
+      unknown = Art("",self.width,self.height,globals.UNKNOWNIMAGE)
+      self.file.write_tile(0, 0, unknown.image)
+    else:
+      self.tiles = DB.get_art_tiles(kind)
+
+  def grow(self,count):
+    ''' make room for count tiles, keeping the current ones in place '''
+    f = self.file
+    rows = f.rows
+    per_page = f.cols * f.page_rows
+    f.add_pages(max(1, (count - f.cols * f.rows + per_page - 1) / per_page))
+    if self.free is not None:
+      for y in range(f.rows-1, rows-1, -1): # pop() hands them out row by row
+        for x in range(f.cols-1, -1, -1):
+          self.free.append((x * self.width, y * self.height))
+    self.changed = True
+
+  def alloc(self):
+    if self.free is None:
+      used = {(0,0): True}
+      for (x, y, art_path, art_mtime) in self.tiles.values():
+        used[(x, y)] = True
+      self.free = []
+      for y in range(self.file.rows-1, -1, -1):
+        for x in range(self.file.cols-1, -1, -1):
+          if (x * self.width, y * self.height) not in used:
+            self.free.append((x * self.width, y * self.height))
+    if not self.free:
+      self.grow(len(self.tiles) + len(self.tiles) / 4 + 2)
+    return self.free.pop()
+
+  def _store(self,id,x,y,art_path,art_mtime):
+    if self.kind == 'album': self.DB.insert_album_art(id,x,y,art_path,art_mtime)
+    else:                    self.DB.insert_artist_art(id,x,y,art_path,art_mtime)
+    old = self.tiles.get(id)
+    self.tiles[id] = (x, y, art_path, art_mtime)
+    if old and old[0:2] != (0,0) and old[0:2] != (x,y) and self.free is not None:
+      self.free.append(old[0:2])
+
+  def drop(self,id):
+    ''' id was merged into another album/artist, free its tile '''
+    old = self.tiles.pop(id, None)
+    if old and old[0:2] != (0,0) and self.free is not None:
+      self.free.append(old[0:2])
+
+  def place(self,id,name,art_path):
+    ''' give id the tile for art_path (None: the unknown image), drawing
+    it only if it isn't in the atlas already '''
+    if not art_path:
+      self._store(id, 0, 0, None, None)
+      return
+    try:
+      art_mtime = int(os.stat(art_path).st_mtime)
+    except OSError:
+      art_mtime = None
+    old = self.tiles.get(id)
+    if old and old[0:2] != (0,0):
+      if old[2:4] == (art_path, art_mtime):
+        return # already there
+      (x, y) = old[0:2]
+    else:
+      (x, y) = self.alloc()
+    self.todo.append((x, y, name, art_path))
+    self.changed = True
+    self._store(id, x, y, art_path, art_mtime)
+
+  def draw(self):
+    ''' draw the tiles place() queued, in the order they were placed '''
+    if self.thumbs:
+      self.thumbs.make_all([art_path for (x, y, name, art_path) in self.todo])
+    for (x, y, name, art_path) in self.todo:
+      src = (self.thumbs and self.thumbs.get(art_path, 'tile')) or art_path
+      art = Art(name,self.width,self.height,src)
+      self.file.write_tile(x, y, art.image)
+    self.todo = []
+
+  def save(self):
+    self.draw()
+    self.file.close()
+    if self.new_fn:
+      os.rename(self.new_fn, self.fn)
+    if self.changed:
+      self.DB.set_atlas(self.kind,self.theme_name,self.file.cols,self.file.rows)
+
+
+def encode_seek_table(table):
+  ''' an MPEGInfo seek table (byte offsets at every percent of the length)
+  as the song.seek_table column: the offsets in 1/10000ths of the stream,
+  comma separated, the last one (always 10000) left out '''
+  if not table or not table[-1]: return None
+  return ','.join([str(offset * 10000 / table[-1]) for offset in table[:-1]])
+
+# the EasyID3 keys read_tags() uses; other ID3 frames aren't decoded
+TAG_KEYS = ['title', 'artist', 'tracknumber', 'album', 'albumartist', 'genre', 'date']
+
+def read_song(path, fields):
+  ''' How the scanner's mutagen.batch Reader reads a file. This is the CPU
+  heavy stage of a scan, so it only touches the file: it runs in a worker
+  process when the scanner has more than one job. The file is opened
+  once: mutagen scores it, and for MP3s reads the ID3 tag (decoding only
+  the frames of the fields asked for) and the stream info, through the
+  same file object the fingerprint and any embedded cover are found
+  through. '''
+  fileobj = open(path, 'rb')
+  try:
+    (tags, info) = mutagen.batch.read_file(path, fields, fileobj)
+    info['fingerprint'] = fingerprint.quick(path, fileobj)
+    info['art'] = embeddedart.locate(fileobj)
+    return tags, info
+  finally:
+    fileobj.close()
+
+def song_tags(path, tags, info, error):
+  ''' Turn what read_song() found into the plain dict normalize_song()
+  takes. Sometimes we'll have a valid tag, but missing information; this
+  is where we decide what goes in its place. '''
+  if error:
+    print "WARNING: invalid or missing id3 header: ", path
+    return {
+      'fingerprint' : fingerprint.quick(path),
+      'length'      : 0,
+      'title'       : 'UNKNOWN',
+      'artist'      : 'UNKNOWN',
+      'tracknumber' : None,
+      'album'       : 'UNKNOWN',
+      'albumartist' : '',
+      'genre'       : 'UNKNOWN',
+      'year'        : None,
+      'failed'      : True,
+      }
+  song = {
+    'fingerprint' : info.get('fingerprint'),
+    'length'      : info.get('length', 0),
+    'estimated'   : info.get('estimated', False),
+    'seek_table'  : encode_seek_table(info.get('seek_table')),
+    'art'         : info.get('art'),
+    'tracknumber' : tags.get('tracknumber'),
+    'albumartist' : tags.get('albumartist', ''),
+    'year'        : tags.get('date'),
+    }
+  for name in ['title', 'artist', 'album', 'genre']:
+    if name in tags:
+      song[name] = tags[name]
+    else:
+      print "WARNING: no %s tag, will use UNKNOWN: %s" % (name,path)
+      song[name] = 'UNKNOWN'
+  return song
+
+def read_tags(path):
+  ''' read_song() and song_tags() for a single file '''
+  return song_tags(*mutagen.batch.read_path(path, TAG_KEYS, read_song))
+
+
 class NewSongProcessor:
   ignore_dir_l = ['.','..','maps']
   ext_l = ['.mp3','.ogg','.wma','.aac','.m4p','.m4a','.mp4','.m3u','.flac']
+  cover_l = ['folder.jpg','cover.jpg']
   m3u_to_ignore = [ '/home/user/.mediaplayer-engine/radiochannels.m3u' ]
   data_dir = None
   update_func = None
   tick_func = None
-  last_audioscrobbler_query = 0
+  checkpoint_func = None
+  net = None
+  artist_jobs = None
+  album_jobs = None
+  thumbs = None
   
-  def __init__(self,DB,data_dir,update_func,tick_func,prefs):
+  jobs_queue = 32 # most files handed to a parser process at a time
+  reader = None
+  
+  def __init__(self,DB,data_dir,update_func,tick_func,prefs,jobs=1):
     self.DB = DB
+    self.jobs = jobs
     self.data_dir = data_dir
     self.update_func = update_func
     self.tick_func = tick_func
     self.tot_filecount = 0
     self.filecount = 0
     self.myprefs   = prefs
+    self.stamps    = None
+    self.covers    = None
+    self.embedded  = {}
+    self.stats     = scanstats.ScanStats()
+
+  def get_net(self):
+    ''' the shared downloader; KAGU_ART_SERVER=http://host:port points it
+    at a local stand-in for the image services '''
+    if self.net is None:
+      self.net = netfetch.Fetcher(os.path.join(self.data_dir,'httpcache'),
+                                  server=os.environ.get('KAGU_ART_SERVER'))
+    return self.net
+
+  def get_thumbnailer(self):
+    ''' scaled cover art for the atlases and the player's cover view, made
+    a parser process per job '''
+    if self.thumbs is None:
+      self.thumbs = thumbnail.Thumbnailer(thumbnail.cache_dir(self.data_dir), self.jobs)
+    return self.thumbs
+
+  def _cover_dir(self):
+    cover_dir = os.path.join(self.data_dir,'covers')
+    if not os.path.exists(cover_dir): os.mkdir(cover_dir)
+    return cover_dir
 
-  def _get_mut_val(self,mut,name):
-    if isinstance(mut, mutagen.mp4.MP4):
-      return self._get_mut_val_mp4(mut, name)
-
-    return self._get_mut_val_easyid3(mut, name)
-
-  def _get_mut_val_easyid3(self,mut,name):
-    ''' Sometimes we'll have a valid ID3 tag, but missing information.
-    This method is responsible for how we handle these cases. '''
-    try:
-      if name == 'tracknumber':
-        # usually track is '3', but sometimes '3/9'. deal with it.
-        return mut[name][0].split("/")[0]
-      else:
-        return mut[name][0]
-    except:
-      if name == 'tracknumber' or name=='date':
-        return None
-      elif name == 'albumartist':
-        return ''
-      else:
-        print "WARNING: no %s tag, will use UNKNOWN: %s" % (name,mut.filename)
-        return 'UNKNOWN'
-
-  def _get_mut_val_mp4(self,mut,name):
-    try:
-      if name == 'tracknumber':
-        return mut['trkn'][0][0]
-      elif name == 'title':
-        return mut['\xa9nam'][0]
-      elif name == 'artist':
-        return mut['\xa9ART'][0]
-      elif name == 'album':
-        return mut['\xa9alb'][0]
-      elif name == 'albumartist':
-        return mut['aART'][0]
-      elif name == 'genre':
-        return mut['\xa9gen'][0]
-      elif name == 'date':
-        return mut['\xa9day'][0]
-      else:
-        return mut[name][0]
-    except:
-      if name == 'tracknumber' or name=='date':
-        return None
-      elif name == 'albumartist':
-        return ''
-      else:
-        print "WARNING: no %s tag, will use UNKNOWN: %s" % (name,mut.filename)
-        return 'UNKNOWN'
-
+  def load_file_stamps(self):
+    ''' Remember what every known file looked like at the last scan, so
+    add_song() only has to re-read tags of new or changed files. '''
+    self.stamps = self.DB.get_song_stamps()
 
   def _fix_net_search_string(self, s):
     s = s.replace("_"," ")
@@ -682,102 +1182,288 @@ class NewSongProcessor:
     s = s.replace("&amp;","&")
     return s
 
-  def deletedeleted(self):
-    ''' Delete the now non-existent files from songs table '''
-    list = self.DB.get_song_paths()
-    listlen = len(list)
-
-    modified_albums = {}
-
+  def begin_scan(self,scan_gen=None):
+    ''' Call before scanning the roots. Files that are seen get marked
+    with this scan's generation; end_scan() removes whatever wasn't.
+    Pass an interrupted scan's generation to resume it. '''
+    if scan_gen: self.DB.resume_scan(scan_gen)
+    else:        self.DB.begin_scan()
+    self.load_file_stamps()
+
+  def end_scan(self):
+    ''' Drop songs, albums and playlists whose files the scan didn't come
+    across, in a few set-based deletes instead of a stat() per row. '''
+    t = time.time()
+    (songs, albums, m3us) = self.DB.sweep()
+    self.stats.add_time('db', time.time() - t)
+    self.stats.count('deleted', songs)
+    if songs or albums or m3us:
+      print "removed %d missing tracks, %d empty albums, %d missing m3us" % (songs, albums, m3us)
+    self.find_duplicates()
+    self.stamps = None
+
+  def find_duplicates(self):
+    ''' Every song carries a quick fingerprint from read_tags(); only the
+    files that collide on it get hashed in full, and the ones that still
+    match are marked as copies of each other. '''
+    t = time.time()
+    rows = []
+    for (song_id, path) in self.DB.get_fingerprint_collisions():
+      rows.append((fingerprint.full(path), song_id))
+    self.stats.add_time('parse', time.time() - t)
+    t = time.time()
+    if rows: self.DB.set_full_hashes(rows)
+    dupes = self.DB.mark_duplicates()
+    self.DB.con.commit()
+    self.stats.add_time('db', time.time() - t)
+    self.stats.count('duplicates', dupes)
+    if dupes:
+      print "%d tracks are copies of other tracks (%d files hashed)" % (dupes, len(rows))
+
+  def measure_lengths(self):
+    ''' Walk every frame of the MP3s read_tags() could only estimate the
+    length of (VBR without a Xing or VBRI header) for the exact length
+    and a seek table, and every page of the Ogg files whose last page
+    wasn't near the end (chained or multiplexed streams). That reads the
+    whole file, so it is the last phase and commits as it goes. '''
+    rows = self.DB.get_estimated_songs()
+    t = time.time()
     c = 0
-    for row in list:
+    for (song_id, path) in rows:
       c = c + 1
-      songid  = row['id']
-      path    = row['path']
-      albumid = row['album_id']
-
       if self.update_func:
         self.update_func(os.path.basename(path))
-        if self.tick_func: self.tick_func(c * 100 / listlen)
-        
-      if not os.path.exists(path):
-        print "removing track, file nonexistent: ",path
-        self.DB.remove_song(songid)
-        modified_albums[albumid]=True
+        if self.tick_func: self.tick_func(c * 100 / len(rows))
+      (length, table) = (None, None)
+      try:
+        f = open(path, 'rb')
+        try:
+          if f.read(4) == 'OggS':
+            audio = mutagen.File(path)
+            if audio is not None: length = mutagen.ogg.measure_length(f, audio.info)
+          else:
+            f.seek(0)
+            info = mutagen.mp3.MPEGInfo(f)
+            if info.estimated:
+              (length, table) = mutagen.mp3.frame_index(f, info)
+        finally:
+          f.close()
+      except (IOError, OSError, mutagen.mp3.error, mutagen.ogg.error):
+        print "WARNING: can't measure length: ", path
+      self.DB.set_song_length(song_id, length, encode_seek_table(table))
+      if c % 20 == 0: self.DB.con.commit()
+    self.DB.con.commit()
+    self.stats.add_time('parse', time.time() - t)
+    self.stats.count('lengths_measured', len(rows))
+
+  def _list_dir(self,path):
+    ''' list path as (name, is_dir, is_link) tuples. With scandir the type
+    comes for free from readdir()'s d_type; otherwise it costs one lstat(),
+    and audio files (by far the most entries) are never stat'ed at all. '''
+    if scandir is not None:
+      entries = []
+      for entry in scandir(path):
+        is_link = entry.is_symlink()
+        if is_link:
+          is_dir = os.path.isdir(entry.path)
+        else:
+          is_dir = entry.is_dir()
+        entries.append((entry.name, is_dir, is_link))
+      return entries
+
+    entries = []
+    for fn in os.listdir(path):
+      (rootfn,ext) = os.path.splitext(fn)
+      if ext.lower() in self.ext_l:
+        entries.append((fn, False, False))
+        continue
+      try:
+        mode = os.lstat(os.path.join(path,fn)).st_mode
+      except OSError:
+        continue
+      if S_ISLNK(mode):
+        entries.append((fn, os.path.isdir(os.path.join(path,fn)), True))
+      else:
+        entries.append((fn, S_ISDIR(mode), False))
+    return entries
+
+  def walk(self,root,dir_func=None,after=None):
+    ''' This is the primary directory tree walking method: a single pass,
+    iterative walk that yields the path of every audio/playlist file as
+    it goes. Directories are listed in sorted order, so the walk always
+    takes the same route; with after, the files of every directory up to
+    and including that one are passed over (a resumed scan has them
+    already). tot_filecount starts out as the number of songs the last
+    scan found under root and grows if this walk finds more. Sidecar
+    cover images seen on the way end up in self.covers. dir_func, if
+    given, is called with each directory just before it is listed. '''
+    self.filecount = 0
+    self.missed_resume = after is not None
+    if self.covers is None: self.covers = {}
+    stack = [(root, 1)]
+    while stack:
+      (path, depth) = stack.pop()
+      if dir_func: dir_func(path)
+      t = time.time()
+      try:
+        entries = self._list_dir(path)
+      except OSError, message:
+        print "OSError:", message
+        continue
+      entries.sort()
+      self.stats.add_time('walk', time.time() - t)
+      skip_files = self.missed_resume
+      if path == after: self.missed_resume = False
+
+      subdirs = []
+      for (fn, is_dir, is_link) in entries:
+        if fn[0]=='.' and path!='/home/user/MyDocs': # ignore hidden dirs/files
+          print 'Skipped file/dir:',fn,'in',path
+          continue
 
-    ak = modified_albums.keys()
+        if fn.lower() in self.ignore_dir_l: # ignore these dirs
+          continue
 
-    # check for each album to have at least one song assigned, if not remove the album    
-    
-    for albumid in ak:
-      print "modified albumid: "+str(albumid)
-      if self.DB.is_empty_album(albumid):
-        print "removing album "+str(albumid)
-        self.DB.remove_album(albumid)
+        cur_path = os.path.join(path,fn)
+        #print "cur_path='"+cur_path+"'";
+        (rootfn,ext) = os.path.splitext(fn)
+        if ext.lower() in self.ext_l:
+          self.filecount = self.filecount + 1
+          self.tot_filecount = max(self.tot_filecount, self.filecount)
+          if skip_files: continue
+          self.stats.count('files')
+          if self.update_func: self.update_func(fn)
+          yield cur_path
+          if self.tick_func: self.tick_func(self.filecount * 100 / self.tot_filecount)
+
+        elif is_dir:
+          if depth+1 >= 32:
+            continue
+          if is_link:
+            pointsto = os.path.realpath(cur_path)
+#            print cur_path+" is a link and points to "+pointsto
+            if cur_path.find(pointsto)==0:
+              print cur_path+" points to "+pointsto+", skipped to prevent recursion"
+              continue
+            cur_path = pointsto
 
-    list = self.DB.get_m3u_paths()
-    listlen = len(list)
-    c = 0
-    for row in list:
-      c = c + 1
-      m3uid  = row['id']
-      path    = row['path']
+          if cur_path in globals.get_no_path_list():
+            print "skipped "+cur_path+", in ignore list"
+            continue
 
-      if self.update_func:
-        self.update_func(os.path.basename(path))
-        if self.tick_func: self.tick_func(c * 100 / listlen)
-        
-      if not os.path.exists(path):
-        print "removing m3u, file nonexistent: ",path
-        self.DB.remove_m3u(m3uid)
+          subdirs.append((cur_path, depth+1))
 
+        elif fn.lower() in self.cover_l:
+          # folder.jpg wins over cover.jpg, like get_existing_cover() always did
+          if fn.lower() == self.cover_l[0] or path not in self.covers:
+            self.covers[path] = cur_path
 
-  def recurse(self,path,depth=0,scout=False):
-    ''' This is the primary directory tree walking method.
-    It calls self.add_file() as it descends. '''
-    try:
-      if depth == 0:
-        if scout: self.tot_filecount = 0
-        self.filecount = 0
-      depth+=1
-      if (os.path.exists(path) and depth < 32):
-        for fn in os.listdir(path):
-          if fn[0]=='.' and path!='/home/user/MyDocs': # ignore hidden dirs/files
-            print 'Skipped file/dir:',fn,'in',path
-            continue
-        
-          if fn.lower() in self.ignore_dir_l: # ignore these dirs
-            continue
+      subdirs.reverse() # pop them off the stack in listing order
+      stack.extend(subdirs)
 
-          cur_path = os.path.join(path,fn)
-          #print "cur_path='"+cur_path+"'";
-          (rootfn,ext) = os.path.splitext(fn)
-          if ext.lower() in self.ext_l:
-            self.filecount = self.filecount + 1
-            if self.update_func: self.update_func(fn)
-            if scout:
-              self.tot_filecount = self.tot_filecount + 1
-              if self.tick_func: self.tick_func()
-            else:
-              self.add_file(cur_path)
-              if self.tick_func: self.tick_func(self.filecount * 100 / self.tot_filecount)
-
-          elif os.path.isdir(cur_path):
-            if os.path.islink(cur_path):
-              pointsto = os.path.realpath(cur_path)
-#              print cur_path+" is a link and points to "+pointsto
-              if cur_path.find(pointsto)==0:
-                print cur_path+" points to "+pointsto+", skipped to prevent recursion"
-                continue
-              cur_path = pointsto
+  def scan(self,root,dir_func=None,after=None):
+    ''' Scan one root as a pipeline of generators:
+      walk() -> stat_filter() -> parse_tags() -> normalize_song() -> store_song()
+    Only files that are new or changed reach the tag parser, which fans
+    out over a process pool when jobs > 1. Every stage pulls one item at a
+    time, and parse_tags() keeps a bounded number of files in flight, so
+    memory use doesn't grow with the size of the tree.
 
-            if cur_path in globals.get_no_path_list():
-              print "skipped "+cur_path+", in ignore list"
-              continue
+    The walk is fed through in chunks of whole directories, about
+    song_chunk files each, and every chunk is committed together with a
+    call to checkpoint_func(root, last directory of the chunk). after
+    resumes a scan from such a checkpoint. '''
+    self.tot_filecount = 0
+    if self.stamps:
+      prefix = os.path.join(root, '')
+      for known in self.stamps:
+        if known.startswith(prefix): self.tot_filecount = self.tot_filecount + 1
+    files = []
+    cur_dir = None
+    try:
+      for path in self.walk(root, dir_func, after):
+        dir = os.path.dirname(path)
+        if dir != cur_dir:
+          if len(files) >= self.DB.song_chunk:
+            self.scan_files(root, cur_dir, files)
+            files = []
+          cur_dir = dir
+        files.append(path)
+      self.scan_files(root, cur_dir, files)
+    except:
+      self.close_pool(terminate=True)
+      raise
+    self.close_pool()
+    if self.missed_resume:
+      # the checkpoint's directory is gone, there's no telling what was done
+      print "resume point "+after+" not found, rescanning "+root
+      self.scan(root, dir_func)
+
+  def scan_files(self,root,dir,files):
+    stats = self.stats
+    for (path, stamp, known, tags) in self.parse_tags(self.stat_filter(files)):
+      t = time.time()
+      stats.count('bytes_parsed', stamp[0])
+      if 'failed' in tags: stats.count('failed')
+      self.store_song(known, self.normalize_song(path, tags, stamp))
+      stats.add_time('db', time.time() - t)
+    t = time.time()
+    if self.checkpoint_func and dir: self.checkpoint_func(root, dir)
+    self.DB.flush_songs()
+    stats.add_time('db', time.time() - t)
+
+  def stat_filter(self,paths):
+    ''' Pass through (path, stamp, known) for songs whose tags need reading.
+    Playlists are cheap and get stored on the spot. '''
+    for path in paths:
+      (rootfn,ext) = os.path.splitext(path)
+      if ext.lower() == '.m3u':
+        self.add_m3u(path)
+        continue
 
-            self.recurse(cur_path,depth,scout)
-    except OSError, message:
-      print "OSError:", message
+      t = time.time()
+      try:
+        st = os.stat(path)
+      except OSError, message:
+        print "OSError:", message
+        continue
+      finally:
+        self.stats.add_time('walk', time.time() - t)
+      stamp = (st.st_size, int(st.st_mtime), st.st_ino)
+
+      if self.stamps is None: self.load_file_stamps()
+      known = self.stamps.get(path)
+      if known and known[2:] == stamp:
+#        print "file unchanged since last scan, skipping: ",path
+        self.stats.count('unchanged')
+        if known[0] is not None: self.DB.mark_song_seen(known[0])
+        continue
+      yield path, stamp, known
+
+  def parse_tags(self,files):
+    ''' Run read_song() over the (path, stamp, known) stream through a
+    mutagen.batch Reader with a parser process per job (none on a single
+    CPU, see parser_jobs()), yielding (path, stamp, known, tags) in the
+    order the files came in. '''
+    stats = self.stats
+    if self.reader is None:
+      self.reader = mutagen.batch.Reader(parser_jobs(self.jobs), queue=self.jobs_queue, read=read_song)
+    files = list(files) # stat() them first, so the walk isn't timed as parsing
+    results = self.reader.read([path for (path, stamp, known) in files], TAG_KEYS, ordered=True)
+    for (path, stamp, known) in files:
+      t = time.time()
+      tags = song_tags(*results.next())
+      stats.add_time('parse', time.time() - t)
+      yield path, stamp, known, tags
+
+  def close_pool(self,terminate=False):
+    ''' the parser processes live as long as the scan of a root; a pool
+    per chunk would fork far too often, and Pool.terminate() can hang if
+    it catches a worker taking a job off the queue '''
+    if self.reader is None:
+      return
+    self.reader.close(terminate)
+    self.reader = None
 
   def add_file(self,path):
     (rootfn,ext) = os.path.splitext(path)
@@ -786,8 +1472,10 @@ class NewSongProcessor:
     else: self.add_song(path)
 
   def add_m3u(self,path):
-    if self.DB.m3u_of_path(path)>0:
+    m3u_id = self.DB.m3u_of_path(path)
+    if m3u_id>0:
 #      print "file exists in db, skipping: ",path
+      self.DB.mark_m3u_seen(m3u_id)
       return
     for ig in self.m3u_to_ignore:
       if path.find(ig)>-1:
@@ -798,36 +1486,33 @@ class NewSongProcessor:
     self.DB.insert_m3u(name,path)
 
   def add_song(self,path):
-    ''' This method is responsible for parsing ID3 headers 
-    and sending ID3 info off to the DB class for storage '''
-    
-    if self.DB.song_of_path(path)>0:
-#      print "file exists in db, skipping: ",path
-      return
-    
-    try:
-      mut = mutagen.File(path)
-      length = mut.info.length
-      if isinstance(mut, mutagen.mp3.MP3): # special mutagen case for MP3s
-        mut = mutagen.easyid3.EasyID3(path)
-
-      title       = self._get_mut_val(mut, 'title')
-      artist      = self._get_mut_val(mut, 'artist')
-      tracknumber = self._get_mut_val(mut, 'tracknumber')
-      album       = self._get_mut_val(mut, 'album')
-      albumartist = self._get_mut_val(mut, 'albumartist')
-      genre       = self._get_mut_val(mut, 'genre')
-      year        = self._get_mut_val(mut, 'date')
-    except:
-      print "WARNING: invalid or missing id3 header: ", path
-      length      = 0
-      title       = 'UNKNOWN'
-      artist      = 'UNKNOWN'
-      tracknumber = None
-      album       = 'UNKNOWN'
-      albumartist = ''
-      year        = None
-      genre       = 'UNKNOWN'
+    ''' Push a single file through the same stages scan() uses. '''
+    for (path, stamp, known) in self.stat_filter([path]):
+      self.store_song(known, self.normalize_song(path, read_tags(path), stamp))
+    self.DB.flush_songs()
+
+  def remove_file(self,path):
+    if self.stamps is not None: self.stamps.pop(path, None)
+    return self.DB.remove_path(path)
+
+  def remove_tree(self,path):
+    if self.stamps is not None:
+      prefix = os.path.join(path,'')
+      for known in self.stamps.keys():
+        if known.startswith(prefix): del self.stamps[known]
+    return self.DB.remove_tree(path)
+
+  def normalize_song(self,path,tags,stamp):
+    ''' This method is responsible for cleaning up the ID3 info read_tags()
+    found, returning the row the DB class should store '''
+    length      = tags['length']
+    title       = tags['title']
+    artist      = tags['artist']
+    tracknumber = tags['tracknumber']
+    album       = tags['album']
+    albumartist = tags['albumartist']
+    genre       = tags['genre']
+    year        = tags['year']
 
     try:
       if int(year)<1900 or year=='UNKNOWN':
@@ -905,7 +1590,7 @@ class NewSongProcessor:
 #      print "album="+str(album)+" artist="+str(artist)+" albumartist="+str(albumartist)
 #      print "*****"
                                             
-    self.DB.insert_song(
+    song = (
       tracknumber,
       title.strip(),
       artist.strip().title(),
@@ -915,40 +1600,50 @@ class NewSongProcessor:
       year,
       genre,
       path,
-      flags
-    );
-
-  def get_album_covers(self,album_cache_fn,overwrite=False,skipdownload=False):
-    global SCREENDEPTH
-
+      flags,
+      stamp,
+      tags.get('fingerprint'),
+      tags.get('estimated', False),
+      tags.get('seek_table'),
+      tags.get('art')
+    )
+    return song
+
+  def store_song(self,known,song):
+    ''' The single DB writer stage: insert new songs, re-tag changed ones '''
+    path, stamp = song[8], song[10]
+    if not known:
+      self.stats.count('new')
+      song_id  = None # not known until the DB flushes its queue
+      album_id = self.DB.insert_song(*song)
+    else:
+      self.stats.count('changed')
+      print "re-reading changed file: ",path
+      (song_id, old_album_id) = known[0:2]
+      album_id = self.DB.update_song(song_id, *song)
+      if album_id != old_album_id and self.DB.is_empty_album(old_album_id):
+        print "removing album "+str(old_album_id)
+        self.DB.remove_album(old_album_id)
+    self.stamps[path] = (song_id, album_id) + stamp
+
+  def get_album_covers(self,album_cache_fn,overwrite=False,skipdownload=False,rebuild=False):
     download_covers  = False if self.myprefs.get('download_covers')        == "False" else True
     download_hi_res  = False if self.myprefs.get('download_hi_res_covers') == "0"     else True
     heuristic_covers  = False if self.myprefs.get('heuristic_covers')        == "False" else True
     
     if skipdownload==True: download_covers = False
+    if download_covers: self.start_album_downloads(overwrite)
+    jobs = self.album_jobs or {}
+    self.album_jobs = None
     
-    width,height,x,y = 125,128,0,0
     list = self.DB.get_album_paths()
     num_albums = len(list)+1
-    num_albums_per_side = int(math.ceil(math.sqrt(num_albums)))
-    cache_image = pygame.Surface((width * num_albums_per_side,height * num_albums_per_side))
-
-    album_art = Art("",width,height,globals.UNKNOWNIMAGE)
-    cache_image.blit(album_art.image, (x,y),album_art.rect)
-    x = x + width
+    atlas = ArtAtlas(self.DB,'album',album_cache_fn,self.myprefs.get('theme'),len(list),rebuild or overwrite,self.get_thumbnailer())
 
     c = 1
     for row in list:
       c = c + 1
-      dir   = os.path.dirname(row['path'])
-
-      # ugly hack to prevent the exception in posixpath.py on apt installs -disq
-      try:
-        os.path.exists(dir)
-      except:
-        print "WARNING: exception in os.path.exists - hack in place"
-        dir = dir.encode('ascii', 'ignore')
-      
+      dir   = self._album_dir(row)
       album = row['album']
       album_id = row['album_id']
 
@@ -967,43 +1662,95 @@ class NewSongProcessor:
         vaid = self.DB.get_artist_id(artist)
         self.DB.set_album_artist_id(album_id, vaid)
         self.DB.set_song_album_artist_id(album_id, vaid)
-        self.DB.insert_artist_art(vaid,0,0)
+        self.DB.ensure_artist_art(vaid)
       else:
         compilation_album = False
         artistrow = list_of_artists[0]
         self.DB.set_album_artist_id(album_id, artistrow['id'])
         artist = artistrow['name']
 
-      art_path = self.get_existing_cover(dir)
+      art_path = self.get_existing_cover(dir) or self.get_embedded_cover(album_id)
       newtitle = ""
-      if not art_path: (art_path, newtitle) = self.get_net_album_cover_info(artist,album,dir,download_covers,download_hi_res,compilation_album,overwrite=overwrite,heuristic=heuristic_covers)
+      job = jobs.pop(album_id, None)
+      if art_path: pass
+      elif job: (art_path, newtitle) = job.get()
+      else: (art_path, newtitle) = self.get_net_album_cover_info(artist,album,dir,download_covers,download_hi_res,compilation_album,overwrite=overwrite,heuristic=heuristic_covers)
 #      if not art_path: art_path = globals.UNKNOWNIMAGE
 
-      if newtitle!="": self.DB.set_album_name(album_id, newtitle)
+      if newtitle!="":
+        new_id = self.DB.set_album_name(album_id, newtitle)
+        if new_id != album_id: # same album as one we already have
+          atlas.drop(album_id)
+          continue
 
       if not art_path:
         self.DB.set_album_art_path(album_id, globals.UNKNOWNIMAGE)
-        self.DB.insert_album_art(album_id,0,0)
+        atlas.place(album_id,album,None)
         continue
 
       self.DB.set_album_art_path(album_id,art_path)
-      album_art = Art(album,width,height,art_path)
-      self.DB.insert_album_art(album_id,x,y)
-      cache_image.blit(album_art.image, (x,y),album_art.rect)
-      x = x + width
-      if x > cache_image.get_rect().width - width:
-        x = 0
-        y = y + height
-    cache_image_conv = cache_image.convert(SCREENDEPTH)
-    pygame.image.save(cache_image_conv,album_cache_fn)
+      atlas.place(album_id,album,art_path)
+    atlas.save()
+
+  def _album_dir(self,row):
+    dir = os.path.dirname(row['path'])
+    # ugly hack to prevent the exception in posixpath.py on apt installs -disq
+    try:
+      os.path.exists(dir)
+    except:
+      print "WARNING: exception in os.path.exists - hack in place"
+      dir = dir.encode('ascii', 'ignore')
+    return dir
+
+  def start_album_downloads(self,overwrite=False):
+    ''' Queue the net lookups of every album without a cover in its
+    directory on the downloader's thread pool, where they overlap with
+    each other and with the artist images. get_album_covers() picks the
+    results up by album id. '''
+    if self.album_jobs is not None:
+      return
+    self.album_jobs = {}
+    download_hi_res  = False if self.myprefs.get('download_hi_res_covers') == "0"     else True
+    heuristic_covers = False if self.myprefs.get('heuristic_covers')       == "False" else True
+    self._cover_dir()
+    net = self.get_net()
+    for row in self.DB.get_album_paths():
+      dir = self._album_dir(row)
+      if self.get_existing_cover(dir) or self.get_embedded_cover(row['album_id']):
+        continue
+      list_of_artists = self.DB.artist_of_album(row['album_id'])
+      if len(list_of_artists)>1:
+        (artist, compilation_album) = ("Various Artists", True)
+      else:
+        (artist, compilation_album) = (list_of_artists[0]['name'], False)
+      self.album_jobs[row['album_id']] = net.submit(self.get_net_album_cover_info,
+        artist, row['album'], dir, True, download_hi_res, compilation_album, overwrite, heuristic_covers)
 
   def get_existing_cover(self,dir):
-    for fn in ('folder.jpg','cover.jpg'):
+    if self.covers is not None: # the walk already saw what's there
+      if isinstance(dir, unicode): dir = dir.encode('utf-8')
+      return self.covers.get(dir)
+    for fn in self.cover_l:
       path = os.path.join(dir,fn)
       if os.path.exists(path):
         return path
     return None # nothing found
 
+  def get_embedded_cover(self,album_id):
+    ''' The cover embedded in one of the album's songs, copied into the
+    covers directory (see embeddedart.extract()), or None. Remembered per
+    album, so the downloads and get_album_covers() only extract it once. '''
+    if album_id in self.embedded:
+      return self.embedded[album_id]
+    art_path = None
+    for (path, offset, length) in self.DB.get_album_embedded_art(album_id):
+      art_path = embeddedart.extract(path, offset, length, self._cover_dir())
+      if art_path:
+        self.stats.count('embedded_covers')
+        break
+    self.embedded[album_id] = art_path
+    return art_path
+
   def get_net_album_cover_info(self, artist, album, dir, really_download, download_hi_res, compilation_album=False, overwrite=False, heuristic=False):
     cover_dir = os.path.join(self.data_dir,'covers')
     if not os.path.exists(cover_dir): os.mkdir(cover_dir)
@@ -1068,24 +1815,19 @@ class NewSongProcessor:
     urladdress=urladdress+txdata+"&ei=UTF-8"
     #print "opening" + urladdress
     found=False
-    try:
-        sock = urllib.urlopen(urladdress)
-        htmlSource = sock.read()
-    except:
+    htmlSource = self.get_net().get(urladdress)
+    if htmlSource is None:
         print "unable to get socket"
-        print sys.exc_info()[0]
         return False
     try:
         imagelocationStart=htmlSource.find('Go to fullsize image')+28
         if (imagelocationStart>28):
             imagelocationend=htmlSource.find('"',imagelocationStart)
             imagelocation=htmlSource[imagelocationStart:imagelocationend]
-            urllib.urlretrieve(imagelocation, filename)
-            found=True
+            found = self.get_net().retrieve(imagelocation, filename)
         else:
             print "invalid image..."
 
-        sock.close()
         return found
     except:
         print "Problem saving file:" + filename
@@ -1102,12 +1844,9 @@ class NewSongProcessor:
     urladdress=urladdress+txdata+"&FORM=QBIR"
     #print "opening" + urladdress
     found=False
-    try:
-        sock = urllib.urlopen(urladdress)
-        htmlSource = sock.read()
-    except:
+    htmlSource = self.get_net().get(urladdress)
+    if htmlSource is None:
         print "unable to get socket"
-        print sys.exc_info()[0]
         return False
     try:
         imagelocationStart=htmlSource.find('thumbnail')-52
@@ -1116,12 +1855,10 @@ class NewSongProcessor:
         if (imagelocationStart>28):
             imagelocationend=htmlSource.find('"',imagelocationStart)
             imagelocation=htmlSource[imagelocationStart:imagelocationend]
-            urllib.urlretrieve(imagelocation, filename)
-            found=True
+            found = self.get_net().retrieve(imagelocation, filename)
         else:
             print "invalid image..."
 
-        sock.close()
         return found
     except:
         print "Problem saving file:" + filename
@@ -1136,15 +1873,7 @@ class NewSongProcessor:
     return result
 
   def retrieve_image_from_AudioScrobbler(self, artist, album, filename, download_hi_res):
-    ti = int(time.time())
-
-    # no more than one query per sec
-    if (self.last_audioscrobbler_query>0) and (self.last_audioscrobbler_query>=ti):
-      print "flood protection: skip AS"
-      return False, ""
-
-    self.last_audioscrobbler_query = ti
-
+    # the downloader keeps us from flooding AS, see netfetch.Fetcher.interval
     try:
       print "AS DL: "+filename.encode('ascii','ignore')
       urladdress="http://ws.audioscrobbler.com/1.0/album/"
@@ -1155,12 +1884,9 @@ class NewSongProcessor:
       return False, ""
 
     found=False
-    try:
-        sock = urllib.urlopen(urladdress)
-        htmlSource = sock.read()
-    except:
+    htmlSource = self.get_net().get(urladdress)
+    if htmlSource is None:
         print "unable to get socket"
-        print sys.exc_info()[0]
         return False, ""
     
     newTitle = ""
@@ -1176,7 +1902,8 @@ class NewSongProcessor:
             if imagelocation.find('/noimage/')>0:
               print 'album cover not found in AS'
             else:
-              urllib.urlretrieve(imagelocation, filename)
+              if not self.get_net().retrieve(imagelocation, filename):
+                break
               if os.stat(filename).st_size < 1024 and download_hi_res==True:
                 download_hi_res = False
                 try:
@@ -1201,35 +1928,27 @@ class NewSongProcessor:
           newTitle=self._decode_xml(tag[titleStart+7:titleEnd])
           print "newtitle="+str(newTitle)
 
-      sock.close()
       return found, newTitle
     except:
         print "Problem saving file:" + filename
         print sys.exc_info()[0]
         return False, ""
 
-  def get_artist_images(self,artist_cache_fn,overwrite=False,skipdownload=False):
-    global SCREENDEPTH
-    
+  def get_artist_images(self,artist_cache_fn,overwrite=False,skipdownload=False,rebuild=False):
     download_covers  = False if self.myprefs.get('download_covers')        == "False" else True
-    width,height,x,y = 125,128,0,0
 
     if skipdownload==True: download_covers = False
+    if download_covers: self.start_artist_downloads(overwrite)
+    jobs = self.artist_jobs or {}
+    self.artist_jobs = None
 
     list = self.DB.get_artist_list()
 
-    num_artists = len(list)+1
-    num_artists_per_side = int(math.ceil(math.sqrt(num_artists)))
-    cache_image = pygame.Surface((width * num_artists_per_side,height * num_artists_per_side))
-
-    cover_dir = os.path.join(self.data_dir,'covers')
-    if not os.path.exists(cover_dir): os.mkdir(cover_dir)
+    cover_dir = self._cover_dir()
 
     if overwrite: print "overwriting artist images"
 
-    artist_art = Art("",width,height,globals.UNKNOWNIMAGE)
-    cache_image.blit(artist_art.image, (x,y),artist_art.rect)
-    x = x + width
+    atlas = ArtAtlas(self.DB,'artist',artist_cache_fn,self.myprefs.get('theme'),len(list),rebuild or overwrite,self.get_thumbnailer())
 
     listlen = len(list)
 
@@ -1243,45 +1962,47 @@ class NewSongProcessor:
         self.update_func(artist)
         if self.tick_func: self.tick_func(c * 100 / listlen)
 
-      fn=os.path.join(cover_dir,self._fix_fs_filename(artist.encode('ascii','ignore')+'.jpg'))
+      fn=self._artist_image_fn(cover_dir, artist)
 
       new_artistname = ""
-      if download_covers:
-        if overwrite or not os.path.exists(fn):
-          new_artistname = self.retrieve_artist_from_AudioScrobbler(artist, fn)
+      job = jobs.pop(artist_id, None)
+      if job: new_artistname = job.get()
 
       if new_artistname!="":
         print "new="+str(new_artistname)+" id="+str(artist_id)+" old="+str(artist)
-        self.DB.set_artist_name(artist_id, new_artistname)
+        new_id = self.DB.set_artist_name(artist_id, new_artistname)
+        if new_id != artist_id: # gets its image on its own row
+          atlas.drop(artist_id)
+          continue
 
       if not os.path.exists(fn):
         self.DB.set_artist_art_path(artist_id, globals.UNKNOWNIMAGE)
-        self.DB.insert_artist_art(artist_id,0,0)
+        atlas.place(artist_id,artist,None)
         continue
 
       self.DB.set_artist_art_path(artist_id, fn)
-      artist_art = Art(artist,width,height,fn)
-      self.DB.insert_artist_art(artist_id,x,y)
-      cache_image.blit(artist_art.image, (x,y),artist_art.rect)
-      x = x + width
-      if x > cache_image.get_rect().width - width:
-        x = 0
-        y = y + height
+      atlas.place(artist_id,artist,fn)
 
-    cache_image_conv = cache_image.convert(SCREENDEPTH)
-    pygame.image.save(cache_image_conv,artist_cache_fn)
+    atlas.save()
 
 
-  def retrieve_artist_from_AudioScrobbler(self, artist, filename):
-    ti = int(time.time())
+  def _artist_image_fn(self, cover_dir, artist):
+    return os.path.join(cover_dir,self._fix_fs_filename(artist.encode('ascii','ignore')+'.jpg'))
 
-    # no more than one query per sec
-#    if (self.last_audioscrobbler_query>0) and (self.last_audioscrobbler_query>=ti):
-#      print "flood protection: skip AS2"
-#      return ""
-
-#    self.last_audioscrobbler_query = ti
+  def start_artist_downloads(self,overwrite=False):
+    ''' Queue the AudioScrobbler lookups for artists without an image on
+    the downloader's thread pool; get_artist_images() collects them. '''
+    if self.artist_jobs is not None:
+      return
+    self.artist_jobs = {}
+    cover_dir = self._cover_dir()
+    net = self.get_net()
+    for row in self.DB.get_artist_list():
+      fn = self._artist_image_fn(cover_dir, row['artist'])
+      if overwrite or not os.path.exists(fn):
+        self.artist_jobs[row['artist_id']] = net.submit(self.retrieve_artist_from_AudioScrobbler, row['artist'], fn)
 
+  def retrieve_artist_from_AudioScrobbler(self, artist, filename):
     try:
 #      print "AS2 DL: "+filename.encode('ascii','ignore')
       urladdress="http://ws.audioscrobbler.com/1.0/artist/"
@@ -1292,12 +2013,9 @@ class NewSongProcessor:
       return ""
 
     artistname = ""
-    try:
-        sock = urllib.urlopen(urladdress)
-        htmlSource = sock.read()
-    except:
+    htmlSource = self.get_net().get(urladdress)
+    if htmlSource is None:
         print "unable to get socket"
-        print sys.exc_info()[0]
         return ""
     try:
         tagStart=htmlSource.find('<similarartists')
@@ -1314,7 +2032,7 @@ class NewSongProcessor:
                 print 'artist image not found in AS'
               else:
 #                print "imageloc="+imagelocation
-                urllib.urlretrieve(imagelocation, filename)
+                self.get_net().retrieve(imagelocation, filename)
 
             arStart=tag.find(' artist="')
             if (arStart>=0):
@@ -1324,7 +2042,6 @@ class NewSongProcessor:
         else:
             print "artist not found in AS"
 
-        sock.close()
         return artistname
     except:
         print "Problem saving file:" + filename
@@ -1332,6 +2049,191 @@ class NewSongProcessor:
         return ""
 
 
+class LibraryWatcher():
+  ''' kagu-scanner --watch: keep the library in sync with the music
+  directories as files come and go. One catch-up scan on start (cheap,
+  unchanged files aren't re-read) sets up an inotify watch on every
+  directory; after that only the files inotify reports are touched, in
+  batches once a burst of events (say, an album being copied over) has
+  settled. After each batch the library stamp is touched, which a
+  running player picks up. Album art is left for the next regular
+  scan. '''
+  mask = inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO \
+       | inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_DELETE_SELF \
+       | inotify.IN_MOVE_SELF | inotify.IN_ONLYDIR
+  settle    = 2.0  # seconds without events before a batch is applied
+  max_delay = 10.0 # ...but don't sit on a change longer than this
+  root_poll = 30.0 # how often to look for music dirs that showed up (cards)
+
+  def __init__(self,sp,paths):
+    self.sp    = sp
+    self.DB    = sp.DB
+    self.paths = paths
+    self.ino   = inotify.Inotify()
+    self.wds   = {} # watch descriptor -> directory
+    self.pending = []
+
+  def watch_dir(self,path):
+    try:
+      self.wds[self.ino.add_watch(path, self.mask)] = path
+    except OSError, message:
+      print "can't watch", message
+
+  def unwatch_tree(self,path):
+    prefix = os.path.join(path,'')
+    for (wd, d) in self.wds.items():
+      if d == path or d.startswith(prefix):
+        self.ino.rm_watch(wd)
+        del self.wds[wd]
+
+  def walk(self,root):
+    ''' the audio files under a directory that just showed up, watching
+    each directory before it's listed so files landing in it now aren't
+    missed. Same rules as NewSongProcessor.walk(), but the scan's
+    counters and sidecar covers are left alone. '''
+    sp = self.sp
+    stack = [(root, 1)]
+    while stack:
+      (path, depth) = stack.pop()
+      self.watch_dir(path)
+      try:
+        entries = sp._list_dir(path)
+      except OSError, message:
+        print "OSError:", message
+        continue
+      for (fn, is_dir, is_link) in entries:
+        if fn[0]=='.' and path!='/home/user/MyDocs': continue
+        if fn.lower() in sp.ignore_dir_l: continue
+        cur_path = os.path.join(path,fn)
+        (rootfn,ext) = os.path.splitext(fn)
+        if ext.lower() in sp.ext_l:
+          yield cur_path
+        elif is_dir and depth+1 < 32:
+          if is_link:
+            pointsto = os.path.realpath(cur_path)
+            if cur_path.find(pointsto)==0: continue # would recurse
+            cur_path = pointsto
+          if cur_path not in globals.get_no_path_list():
+            stack.append((cur_path, depth+1))
+
+  def changed(self):
+    ''' tell a running player the library changed, see globals.library_stamp() '''
+    fn = globals.library_stamp()
+    try:
+      open(fn, 'a').close()
+      os.utime(fn, None)
+    except (IOError, OSError), message:
+      print "can't touch", message
+
+  def rescan(self):
+    print "watch: scanning", ", ".join(self.paths)
+    self.sp.begin_scan()
+    for path in self.paths:
+      if os.path.exists(path):
+        self.sp.scan(path, self.watch_dir)
+    self.sp.end_scan()
+    self.DB.con.commit()
+    self.changed()
+
+  def check_roots(self):
+    watched = self.wds.values()
+    for path in self.paths:
+      if path not in watched and os.path.isdir(path):
+        self.pending.append(('rescan', None))
+        return
+
+  def handle(self,event):
+    (wd, mask, cookie, name) = event
+    if mask & inotify.IN_Q_OVERFLOW:
+      print "watch: missed events, rescanning"
+      self.pending.append(('rescan', None))
+      return
+    if mask & inotify.IN_IGNORED:
+      self.wds.pop(wd, None)
+      return
+    d = self.wds.get(wd)
+    if d is None:
+      return
+    if not name:
+      # the parent's watch reports these, except for the music dirs themselves
+      if mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF) and d in self.paths:
+        self.unwatch_tree(d)
+        self.pending.append(('deltree', d))
+      return
+    if name[0]=='.' and d!='/home/user/MyDocs': # same rules as walk()
+      return
+    path = os.path.join(d,name)
+
+    if mask & inotify.IN_ISDIR:
+      if name.lower() in self.sp.ignore_dir_l or path in globals.get_no_path_list():
+        return
+      if mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+        # watch it right away so files landing in it now aren't missed
+        for fn in self.walk(path):
+          self.pending.append(('add', fn))
+      elif mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+        self.unwatch_tree(path)
+        self.pending.append(('deltree', path))
+      return
+
+    (rootfn,ext) = os.path.splitext(name)
+    if ext.lower() not in self.sp.ext_l:
+      return
+    if mask & (inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO):
+      self.pending.append(('add', path))
+    elif mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+      self.pending.append(('del', path))
+
+  def apply(self):
+    pending = self.pending
+    self.pending = []
+    done = {}
+    added = removed = 0
+    for (op, path) in pending:
+      if op == 'add':
+        if path in done or not os.path.exists(path):
+          continue
+        done[path] = True
+        self.sp.add_file(path)
+        added = added + 1
+      elif op == 'del':
+        done.pop(path, None)
+        removed = removed + self.sp.remove_file(path)
+      elif op == 'deltree':
+        removed = removed + self.sp.remove_tree(path)
+      elif op == 'rescan':
+        self.rescan()
+        done = {}
+    self.DB.flush_songs()
+    self.DB.remove_empty_albums()
+    self.sp.find_duplicates()
+    self.DB.con.commit()
+    if added or removed: self.changed()
+    print "watch: %d files added or changed, %d removed" % (added, removed)
+
+  def run(self):
+    self.rescan()
+    first = last = None # when the oldest and the newest pending change came in
+    while True:
+      if self.pending:
+        timeout = max(0, min(last + self.settle, first + self.max_delay) - time.time())
+      else:
+        timeout = self.root_poll
+      events = self.ino.read(timeout)
+      for event in events:
+        self.handle(event)
+      now = time.time()
+      if not events and not self.pending:
+        self.check_roots()
+      if not self.pending:
+        first = last = None
+        continue
+      if first is None: first = last = now
+      if events: last = now
+      if now - last >= self.settle or now - first >= self.max_delay:
+        self.apply()
+        first = last = None
+
 class Scanner():
   global theme
 
@@ -1429,18 +2331,36 @@ class Scanner():
     return dl
     
   def notify(self, text):
-    if self.batch_mode:
+    if self.progress:
+      self.progress.emit('status', text=text)
+    elif self.batch_mode:
       print text
     else:
       self.pbarlabel.set_text(text)
       self.scan_tick()
 
-  def __init__(self, update_theme=False, batch_mode=False):
+  phases = ['files', 'sweep', 'artists', 'albums', 'lengths']
+
+  def checkpoint(self, phase, root=None, dir=None):
+    self.mydb.set_checkpoint(phase, root, dir, self.overwrite)
+
+  def checkpoint_files(self, root, dir):
+    self.checkpoint('files', root, dir)
+
+  def begin_phase(self, phase):
+    self.sp.stats.begin_phase(phase)
+    if self.progress: self.progress.emit('phase', phase=phase)
+
+  def __init__(self, update_theme=False, batch_mode=False, jobs=1, resume=False, progress=None):
+    ''' progress, a scanstats.JsonProgress, makes this a headless scan:
+    no dialogs, no GTK, progress and a summary go to it as JSON. '''
     global theme
 
-    if update_theme==True:
+    if update_theme==True or progress:
       batch_mode=True
     self.batch_mode = batch_mode
+    self.progress   = progress
+    self.last_item  = None
 
     if not self.batch_mode:
       if globals.ISMAEMO:
@@ -1475,20 +2395,29 @@ class Scanner():
 
     self.db_dir = globals.calc_db_dir()
 
-    if not self.batch_mode:
+    self.path_a = globals.get_path_list()
+    self.mydb = DB(os.path.join(self.db_dir, 'kagu.db'))
+    self.mydb.con.commit()
+
+    resume_at = None
+    if resume and not update_theme:
+      resume_at = self.mydb.get_checkpoint()
+      if resume_at: print "Resuming interrupted scan at", resume_at[1]
+      else:         print "No interrupted scan, doing a normal one"
+
+    if not self.batch_mode and not resume_at:
       self.are_you_sure_dialog()
       self.notify("Preparing...")
 
     if not update_theme:
       if self.fullscan:
+        self.mydb.con.close()
         try:
           os.unlink(os.path.join(self.db_dir, 'kagu.db'))
         except:
           print "nothing to unlink"
-
-    self.path_a = globals.get_path_list()
-    self.mydb = DB(os.path.join(self.db_dir, 'kagu.db'))
-    self.mydb.con.commit()
+        self.mydb = DB(os.path.join(self.db_dir, 'kagu.db'))
+        self.mydb.con.commit()
 
     db.reconnect()
 
@@ -1501,55 +2430,103 @@ class Scanner():
       self.mydb.update_theme()
       self.sp=NewSongProcessor(self.mydb, self.db_dir, None, None, self.myprefs)
       print "Updating artist cache"
-      self.sp.get_artist_images(os.path.join(self.db_dir, 'artist_cache.tga'),skipdownload=True)
+      self.sp.get_artist_images(os.path.join(self.db_dir, 'artist_cache.atlas'),skipdownload=True,rebuild=True)
       print "Updating album cache"
-      self.sp.get_album_covers(os.path.join(self.db_dir, 'album_cache.tga'),skipdownload=True)
+      self.sp.get_album_covers(os.path.join(self.db_dir, 'album_cache.atlas'),skipdownload=True,rebuild=True)
       self.mydb.con.commit()
       print "Done"
       self.quit()
     else:
-      self.sp=NewSongProcessor(self.mydb, self.db_dir, self.scan_update, self.scan_tick, self.myprefs)
+      self.sp=NewSongProcessor(self.mydb, self.db_dir, self.scan_update, self.scan_tick, self.myprefs, jobs)
+      self.sp.checkpoint_func = self.checkpoint_files
 
     self.notify("Scanning...")
 
     os.nice(5)
 
-    self.notify("Checking for missing music")
-    self.sp.deletedeleted()
+    # Each phase starts by committing a checkpoint naming it, and the file
+    # phase adds one per chunk of directories, so --resume can pick up
+    # where a crash, a power cut or a cancel left off.
+    todo = self.phases
+    roots = self.path_a
+    after = None
+    if resume_at:
+      (scan_gen, phase, root, after, self.overwrite) = resume_at
+      todo = self.phases[self.phases.index(phase):]
+      if root in roots: roots = roots[roots.index(root):]
+    else:
+      scan_gen = None
 
-    for path in self.path_a: # scan for music
-      if os.path.exists(path):
-        self.notify("Looking for files in " + path)
-        self.sp.recurse(path,0,True)
-        self.notify("Reading ID3 tags from " + path)
-        self.sp.recurse(path)
+    if 'sweep' in todo:
+      self.sp.begin_scan(scan_gen)
+      if not resume_at:
+        self.checkpoint('files')
         self.mydb.con.commit()
 
-    self.mydb.init_art_tables()
+    if 'files' in todo:
+      self.begin_phase('files')
+      for path in roots: # scan for music
+        if os.path.exists(path):
+          self.notify("Reading ID3 tags from " + path)
+          self.sp.scan(path, after=after)
+        after = None
+
+    if 'sweep' in todo:
+      self.begin_phase('sweep')
+      self.checkpoint('sweep')
+      self.mydb.con.commit()
+      self.notify("Removing missing music")
+      self.sp.end_scan()
 
     if self.myprefs.get('download_covers') == "True":
       self.notify("Downloading artist images...")
+      # album covers download in the background while the artists are done
+      if 'artists' in todo: self.sp.start_artist_downloads(overwrite=self.overwrite)
+      if 'albums' in todo:  self.sp.start_album_downloads(overwrite=self.overwrite)
     else:
       self.notify("Reading artist images...")
 
-    self.sp.get_artist_images(os.path.join(self.db_dir, 'artist_cache.tga'),overwrite=self.overwrite)
-
-    self.notify("Consolidating duplicate artists...")
-    self.mydb.consolidate_artist_names(cb_func=self.scan_tick)
-
-    self.notify("Consolidating duplicate albums...")
-    self.mydb.consolidate_album_names(cb_func=self.scan_tick)
-
-    if self.myprefs.get('download_covers') == "True":
-      self.notify("Downloading album covers...")
-    else:
-      self.notify("Reading album covers...")
+    if 'artists' in todo:
+      self.begin_phase('artists')
+      self.checkpoint('artists')
+      self.mydb.con.commit()
+      t = time.time()
+      self.sp.get_artist_images(os.path.join(self.db_dir, 'artist_cache.atlas'),overwrite=self.overwrite)
+      self.sp.stats.add_time('art', time.time() - t)
 
-    self.sp.get_album_covers(os.path.join(self.db_dir, 'album_cache.tga'),overwrite=self.overwrite)
+    if 'albums' in todo:
+      if self.myprefs.get('download_covers') == "True":
+        self.notify("Downloading album covers...")
+      else:
+        self.notify("Reading album covers...")
+      self.begin_phase('albums')
+      self.checkpoint('albums')
+      self.mydb.con.commit()
+      t = time.time()
+      self.sp.get_album_covers(os.path.join(self.db_dir, 'album_cache.atlas'),overwrite=self.overwrite)
+      self.sp.stats.add_time('art', time.time() - t)
+    for fn in ('album_cache.tga', 'artist_cache.tga'): # the old single-image caches
+      if os.path.exists(os.path.join(self.db_dir, fn)):
+        os.unlink(os.path.join(self.db_dir, fn))
+    if os.path.isdir(os.path.join(self.db_dir, 'httpcache')): # downloads are done with
+      pruned = self.sp.get_net().prune()
+      if pruned: print "Pruned %d old downloads from the cache" % pruned
+
+    if 'lengths' in todo and self.myprefs.get('measure_vbr_lengths') == "True":
+      self.begin_phase('lengths')
+      self.checkpoint('lengths')
+      self.mydb.con.commit()
+      self.notify("Measuring VBR track lengths...")
+      os.nice(10) # nothing waits on this, stay out of the player's way
+      self.sp.measure_lengths()
 
     self.scan_update("")
     self.notify("Completed")
+    self.mydb.clear_checkpoint()
     self.mydb.con.commit()
+    self.sp.stats.end_phase()
+    if self.progress:
+      self.progress.emit('summary', **self.sp.stats.summary())
 
     if not self.batch_mode and self.completed_dialog():
       print "will launch kagu"
@@ -1559,6 +2536,8 @@ class Scanner():
 
 
   def scan_update(self, fn):
+    if self.progress:
+      self.last_item = fn
     if self.batch_mode:
       return
     if fn:
@@ -1567,6 +2546,9 @@ class Scanner():
 
 
   def scan_tick(self,percent=None):
+    if self.progress and percent is not None:
+      stats = self.sp.stats
+      self.progress.progress(phase=stats.phase, percent=percent, files=stats.counts['files'], item=self.last_item)
     if self.batch_mode:
       return
     if percent: self.pbar.set_fraction(percent/100.0)
@@ -1574,8 +2556,13 @@ class Scanner():
       gtk.main_iteration()
 
 
-def init_pygame():
+def init_pygame(display=True):
+  ''' without display only the font module is set up: enough to draw
+  the cover art atlases, and no SDL video driver is needed '''
   global SCREENDEPTH
+  if not display:
+    pygame.font.init()
+    return
   SCREENRECT = Rect(0, 0, 800, 480)
   os.environ["SDL_VIDEO_X11_WMCLASS"]="kaguscanner"
   pygame.init()
@@ -1584,24 +2571,94 @@ def init_pygame():
   else:
     SCREENDEPTH = pygame.display.mode_ok(SCREENRECT.size, 0, 16)
 
+def default_jobs():
+  if multiprocessing is None:
+    return 1
+  try:
+    return multiprocessing.cpu_count()
+  except NotImplementedError:
+    return 1
+
+def parser_jobs(jobs):
+  ''' parsing tags is CPU bound, so with one CPU a pool only adds the cost
+  of shipping files and results between processes: parse in-process '''
+  if default_jobs() == 1:
+    return 1
+  return jobs
+
+def usage():
+  print "kagu-scanner [--update-theme] [--delete-db] [--install] [--batch-mode|-y] [--jobs N|-j N] [--resume] [--watch] [--headless]"
+  print "  --headless: no GTK and no display, progress as JSON on stdout. pygame is"
+  print "              still needed, it reads and scales the cover art."
+
+def watch(jobs):
+  if not inotify.available():
+    print "--watch needs a kernel and libc with inotify"
+    sys.exit(1)
+  db_dir = globals.calc_db_dir()
+  mydb = DB(os.path.join(db_dir, 'kagu.db'))
+  sp = NewSongProcessor(mydb, db_dir, None, None, prefs.Prefs(), jobs)
+  os.nice(5)
+  watcher = LibraryWatcher(sp, globals.get_path_list())
+  try:
+    watcher.run()
+  except KeyboardInterrupt:
+    watcher.apply()
+
 def main():
   update_theme = False
   batch_mode = False
-  
-  argc = len(sys.argv)
-  if argc==2 and sys.argv[1]=="--update-theme":
-    print "Theme update mode"
-    update_theme = True
-  elif argc==2 and (sys.argv[1]=="--batch-mode" or sys.argv[1]=="-y"):
-    print "Batch mode"
-    batch_mode = True
-  elif argc==2 and sys.argv[1]=="--delete-db":
-    print "Deleting db"
-    try:
-      os.unlink(os.path.join(globals.calc_db_dir(), 'kagu.db'))
-    except:
-      print "nothing to unlink"
-    sys.exit(0)
+  install = False
+  watch_mode = False
+  resume = False
+  progress = None
+  jobs = default_jobs()
+
+  try:
+    opts, args = getopt.getopt(sys.argv[1:], "hyj:",
+      ["help", "update-theme", "batch-mode", "delete-db", "install", "jobs=", "resume", "watch", "headless"])
+  except getopt.GetoptError, message:
+    print message
+    usage()
+    return
+  if args:
+    usage()
+    return
+
+  for opt, arg in opts:
+    if opt in ("-h", "--help"):
+      usage()
+      return
+    elif opt == "--update-theme":
+      print "Theme update mode"
+      update_theme = True
+    elif opt in ("-y", "--batch-mode"):
+      print "Batch mode"
+      batch_mode = True
+    elif opt == "--install":
+      install = True
+    elif opt == "--watch":
+      watch_mode = True
+    elif opt == "--resume":
+      resume = True
+    elif opt == "--headless":
+      # JSON on stdout, everything else that gets printed goes to stderr
+      progress = scanstats.JsonProgress(sys.stdout)
+      sys.stdout = sys.stderr
+      batch_mode = True
+    elif opt in ("-j", "--jobs"):
+      try:
+        jobs = max(1, int(arg))
+      except ValueError:
+        usage()
+        return
+    elif opt == "--delete-db":
+      print "Deleting db"
+      try:
+        os.unlink(os.path.join(globals.calc_db_dir(), 'kagu.db'))
+      except:
+        print "nothing to unlink"
+      sys.exit(0)
 
   db_dir = globals.calc_db_dir()
   mydb = DB(os.path.join(db_dir, 'kagu.db'))
@@ -1616,23 +2673,32 @@ def main():
     except:
       print "nothing to unlink"
 
-  if argc==2 and sys.argv[1]=="--install":
+  if install:
     print "Install mode"
     if wiped_db == False:
       update_theme = True
     else:
       sys.exit(0)
-  elif update_theme==False and batch_mode==False and (argc>1 or (argc==2 and (sys.argv[1]=="--help" or sys.argv[1]=="-h"))):
-    print "kagu-scanner [--update-theme] [--delete-db] [--install] [--batch-mode|-y]"
+
+  if watch_mode:
+    watch(jobs)
     return
 
-  init_pygame()
+  if gtk is None and not batch_mode and not update_theme:
+    print "no GTK here, use --batch-mode or --headless"
+    sys.exit(1)
+
+  init_pygame(display=progress is None)
 
   # initiate connection
   if update_theme == False and batch_mode == False and globals.ISMAEMO:
     osso_rpc = osso.Rpc(globals.osso_c)
     osso_rpc.rpc_run("com.nokia.icd", "/com/nokia/icd", "com.nokia.icd", "connect", (str(""),int(1),), wait_reply = False)
 
-  Scanner(update_theme, batch_mode)
+  try:
+    Scanner(update_theme, batch_mode, jobs, resume, progress)
+  except Exception, message:
+    if progress: progress.emit('error', message=str(message))
+    raise
 
 if __name__ == '__main__': main()
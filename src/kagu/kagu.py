@@ -87,6 +87,7 @@ def main():
         dummycount=dummycount+1
         if dummycount>20:
           manager.check_sleep_timer()
+          manager.check_library()
           dummycount=0
     if events: manager.wake_up()
     if manager.screen_status == "dimmed":
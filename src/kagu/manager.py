@@ -21,8 +21,11 @@
 
 import math, os, pygame, gc, time, sys
 from pygame.locals import *
-import gtk
-import globals
+try:
+  import gtk
+except (ImportError, RuntimeError):
+  gtk = None # only the player's quit dialog needs it, prefs pulls this in for kagu-scanner --headless
+import globals, atlas
 from db      import db      as db
 from theme   import theme   as theme
 
@@ -75,9 +78,13 @@ class Manager():
     self.nowplayingbuttonimage = ""
     self.headphone_sense = True
     self.sort_albums_by_year = True
+    self.hide_duplicates = False
     self.delayed_info_message = ""
     self.delayed_info_type    = ""
     self.dbusapi = None
+    self.library_mtime   = None # of globals.library_stamp(), when last looked at
+    self.library_checked = 0
+    self.library_stale   = False
 
   def __load_scrobbler(self):
     if globals.ISMAEMO:
@@ -146,15 +153,10 @@ class Manager():
     status_area.draw(self.screen)
     pygame.display.flip()
 
-#    globals.timer_init()
-    globals.albumcache  = pygame.image.load(os.path.join(db.get_db_dir(),"album_cache.tga"))
-#    globals.timer_check("albcacload")
-#    globals.albumcache = globals.albumcache.convert()
-#    globals.timer_check("albcacload-convert")
-    globals.artistcache = pygame.image.load(os.path.join(db.get_db_dir(),"artist_cache.tga"))
-#    globals.timer_check("artcacload")
-#    globals.artistcache = globals.artistcache.convert()
-#    globals.timer_check("artcacload-convert")
+    # pages are only read in when a cover on them is drawn
+    budget = self.prefs.getInt("art_cache_mb") * 1024 * 1024 / 2
+    globals.albumcache  = atlas.AtlasCache(os.path.join(db.get_db_dir(),"album_cache.atlas"), budget)
+    globals.artistcache = atlas.AtlasCache(os.path.join(db.get_db_dir(),"artist_cache.atlas"), budget)
 
 
   #
@@ -223,6 +225,7 @@ class Manager():
       self.nowplayingbuttonimage="album"
     self.headphone_sense = manager.prefs.getBool("headphone_sense")
     self.sort_albums_by_year = manager.prefs.getBool("sort_albums_by_year")
+    self.set_hide_duplicates(manager.prefs.getBool("hide_duplicates"))
 
     globals.MAINFONTCOLOR   = theme.surface.get_at((93,512))
     globals.MAINFONTBGCOLOR = theme.surface.get_at((40,582))
@@ -320,9 +323,47 @@ class Manager():
       self.idle_seconds=time.time()-self.idle_start
     else: self.idle_start = 0
 
+    self.check_library()
     self.view.update()
     self.nowplaying_button.update()
 
+  def _library_mtime(self):
+    try:
+      return os.stat(globals.library_stamp()).st_mtime
+    except OSError:
+      return None
+
+  def check_library(self):
+    ''' kagu-scanner --watch touches the library stamp when it changes the
+    db. A top level list on screen is rebuilt in place once the user stops
+    touching things for a bit; every other list is built from the db each
+    time it's opened anyway. Called from update() and the idle loop. '''
+    now = time.time()
+    if now - self.library_checked < 5: return
+    self.library_checked = now
+    mtime = self._library_mtime()
+    if self.library_mtime is None:
+      self.library_mtime = mtime
+    elif mtime != self.library_mtime:
+      self.library_mtime = mtime
+      self.library_stale = True
+    if not self.library_stale or self.idle_seconds < 5: return
+    import views
+    old_view = self.view
+    if old_view.__class__ not in (views.AlbumView, views.ArtistView, views.AllSongsView, views.GenreView):
+      return # maybe once we're back on one
+    print "library changed, reloading", old_view.caption
+    self.library_stale = False
+    self.view = old_view.__class__() # takes the old one's place in the history
+    if old_view.is_temporary: old_view.close()
+    self.view.back_button._load_image()
+    if self.view.scroll_widget:
+      self.view.scroll_widget.set_scrollbar(self.get_scrollbar_state())
+    if self.screen_status == "on": # the idle loop doesn't redraw
+      self.clear()
+      self.draw()
+      pygame.display.flip()
+
   def draw(self):
     for widget in self.view.get_widgets(): widget.draw(self.screen)
     self.nowplaying_button.draw(self.screen)
@@ -394,6 +435,13 @@ class Manager():
   def get_sort_albums_by_year(self):
     return self.sort_albums_by_year
 
+  def set_hide_duplicates(self, value):
+    self.hide_duplicates = value
+    db.hide_duplicates   = value
+
+  def get_hide_duplicates(self):
+    return self.hide_duplicates
+
   def set_delayed_message(self, type, message):
     self.delayed_info_type=type
     self.delayed_info_message=message
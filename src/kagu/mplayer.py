@@ -115,7 +115,14 @@ class Mplayer(baseplayer.BasePlayer):
   #
   def _seek(self, amount, mode=0):
     print "mplayer: seek: %s" % (str(amount),)
-    self.cmd("seek " + str(amount) + " " + str(mode))
+    if self.seek_table and self.length:
+      # mplayer seeks MP3s by byte position, the seek table knows where
+      # the time is in a VBR file
+      seekmsec = self.calc_seekmsec(amount, mode)
+      if seekmsec == None: return
+      self.cmd("seek %.2f 1" % (self.calc_seekpercent(seekmsec),))
+    else:
+      self.cmd("seek " + str(amount) + " " + str(mode))
     self._query_status()
   
   #
@@ -208,7 +215,7 @@ class Mplayer(baseplayer.BasePlayer):
         length = float(line.replace("ANS_LENGTH=", ""))
 
     if length != -1:
-      self.length = length
+      if not self.exact_length: self.length = length
       return False # terminates the loop. We only need to query length once per song.
     return True
     
@@ -24,6 +24,8 @@ for certain keys, again depending on format.
 version = (1, 11)
 version_string = ".".join(map(str, version))
 
+import os
+import sys
 import warnings
 
 import mutagen._util
@@ -66,6 +68,7 @@ class FileType(mutagen._util.DictMixin):
     tags = None
     filename = None
     _mimes = ["application/octet-stream"]
+    _loads_fileobj = False # load() takes an already open fileobj=
 
     def __init__(self, filename=None, *args, **kwargs):
         if filename is None:
@@ -155,40 +158,82 @@ class FileType(mutagen._util.DictMixin):
 
     mime = property(__get_mime)
 
-def File(filename, options=None):
+FORMATS = [
+    ("mutagen.mp3", "MP3", [".mp3", ".mp2", ".mpg", ".mpeg"]),
+    ("mutagen.oggvorbis", "OggVorbis", [".ogg"]),
+    ("mutagen.flac", "FLAC", [".flac"]),
+    ("mutagen.mp4", "MP4", [".m4a", ".m4b", ".m4p", ".mp4"]),
+    ("mutagen.asf", "ASF", [".wma", ".wmv", ".asf"]),
+    ("mutagen.oggflac", "OggFLAC", [".ogg", ".oga"]),
+    ("mutagen.oggspeex", "OggSpeex", [".ogg", ".spx"]),
+    ("mutagen.oggtheora", "OggTheora", [".ogg", ".ogv"]),
+    ("mutagen.id3", "ID3FileType", []),
+    ]
+"""The types File() knows, as (module, class name, extensions).
+
+A file is first loaded as the types listed for its extension, in this
+order. Modules are only imported once a file needs them.
+"""
+
+def _format(module, name, easy=False):
+    if easy and name == "MP3": name = "EasyMP3"
+    return getattr(__import__(module, {}, {}, [name]), name)
+
+def _load(Kind, filename, fileobj, wanted):
+    if not Kind._loads_fileobj: return Kind(filename)
+    elif wanted is None: return Kind(filename, fileobj=fileobj)
+    else: return Kind(filename, fileobj=fileobj, wanted=wanted)
+
+def File(filename, options=None, easy=False, fileobj=None, wanted=None):
     """Guess the type of the file and try to open it.
 
-    The file type is decided by several things, such as the first 128
+    Without options, the file is loaded as the FORMATS types for its
+    extension first. Failing that, or with options (a list of types),
+    the type is decided by several things, such as the first 128
     bytes (which usually contains a file type identifier), the
     filename extension, and the presence of existing tags.
 
+    If easy is true, MP3s are loaded as EasyMP3, with EasyID3 tags.
+
+    If fileobj is given, it is used instead of opening filename (it is
+    left open). Types that can load from it, MP3 among them, then read
+    the whole file through that single file object.
+
+    If wanted is given, files with ID3 tags only decode those keys
+    (EasyID3 keys if easy, else frame IDs), and their tags can't be
+    saved. FLAC files don't read picture data until it's used.
+
     If no appropriate type could be found, None is returned.
     """
 
+    if fileobj is None:
+        fileobj = file(filename, "rb")
+        try: return File(filename, options, easy, fileobj, wanted)
+        finally: fileobj.close()
+
+    failed = {}
     if options is None:
-        from mutagen.asf import ASF
-        from mutagen.flac import FLAC
-        from mutagen.id3 import ID3FileType
-        from mutagen.mp3 import MP3
-        from mutagen.oggflac import OggFLAC
-        from mutagen.oggspeex import OggSpeex
-        from mutagen.oggtheora import OggTheora
-        from mutagen.oggvorbis import OggVorbis
-        from mutagen.mp4 import MP4
-        options = [MP3, OggTheora, OggSpeex, OggVorbis, OggFLAC,
-                   FLAC, MP4, ID3FileType]
+        ext = os.path.splitext(filename)[1].lower()
+        for module, name, extensions in FORMATS:
+            if ext not in extensions: continue
+            Kind = _format(module, name, easy)
+            try: return _load(Kind, filename, fileobj, wanted)
+            except IOError: failed[Kind] = sys.exc_info()
+        options = [_format(module, name, easy)
+                   for module, name, extensions in FORMATS]
 
     if not options:
         return None
 
-    fileobj = file(filename, "rb")
-    try:
-        header = fileobj.read(128)
-        results = [Kind.score(filename, fileobj, header) for Kind in options]
-    finally:
-        fileobj.close()
+    fileobj.seek(0, 0)
+    header = fileobj.read(128)
+    results = [Kind.score(filename, fileobj, header) for Kind in options]
     results = zip(results, options)
     results.sort()
     score, Kind = results[-1]
-    if score > 0: return Kind(filename)
-    else: return None
+    if score <= 0: return None
+    elif Kind in failed:
+        # it was tried for the extension already
+        exc = failed[Kind]
+        raise exc[0], exc[1], exc[2]
+    else: return _load(Kind, filename, fileobj, wanted)
@@ -527,22 +527,29 @@ class ASF(FileType):
 
     _mimes = ["audio/x-ms-wma", "audio/x-ms-wmv", "video/x-ms-asf",
               "audio/x-wma", "video/x-wmv"]
+    _loads_fileobj = True
 
-    def load(self, filename):
+    def load(self, filename, fileobj=None, wanted=None):
+        """Load file information from a filename.
+
+        The file is read through fileobj if given (it is left open).
+        wanted is accepted for mutagen.File; all tags are read.
+        """
         self.filename = filename
-        fileobj = file(filename, "rb")
-        try:
-            self.size = 0
-            self.size1 = 0
-            self.size2 = 0
-            self.offset1 = 0
-            self.offset2 = 0
-            self.num_objects = 0
-            self.info = ASFInfo()
-            self.tags = ASFTags()
-            self.__read_file(fileobj)
-        finally:
-            fileobj.close()
+        if fileobj is None:
+            fileobj = file(filename, "rb")
+            try: return self.load(filename, fileobj)
+            finally: fileobj.close()
+        fileobj.seek(0)
+        self.size = 0
+        self.size1 = 0
+        self.size2 = 0
+        self.offset1 = 0
+        self.offset2 = 0
+        self.num_objects = 0
+        self.info = ASFInfo()
+        self.tags = ASFTags()
+        self.__read_file(fileobj)
 
     def save(self):
         # Move attributes to the right objects
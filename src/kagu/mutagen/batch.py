@@ -0,0 +1,231 @@
+# Read the tags of many files at once.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of version 2 of the GNU General Public License as
+# published by the Free Software Foundation.
+
+"""Read the tags of many files through one pool of workers.
+
+    import mutagen.batch
+    for path, tags, info, error in mutagen.batch.read_tags(paths, workers=4):
+        ...
+
+Tags come back the same way whatever the format: a dict of the
+requested fields (EasyID3 names) to unicode strings, fields the file
+doesn't have left out. Stream information is a dict too, so results
+can cross process boundaries.
+"""
+
+import time
+import Queue
+
+try: import multiprocessing, multiprocessing.dummy
+except ImportError: multiprocessing = None
+
+import mutagen
+from mutagen.mp4 import MP4
+from mutagen.asf import ASF
+
+__all__ = ['FIELDS', 'read_file', 'read_path', 'read_tags', 'Reader']
+
+FIELDS = ["title", "artist", "album", "albumartist", "tracknumber",
+          "genre", "date"]
+"""The fields read when none are asked for."""
+
+INFO = ["length", "bitrate", "sample_rate", "channels", "estimated",
+        "seek_table"]
+"""Stream information attributes copied, where the format has them."""
+
+# Formats that don't use EasyID3/Vorbis comment names.
+_KEYS = {
+    MP4: {"title": "\xa9nam", "artist": "\xa9ART", "album": "\xa9alb",
+          "albumartist": "aART", "tracknumber": "trkn",
+          "genre": "\xa9gen", "date": "\xa9day"},
+    ASF: {"title": "Title", "artist": "Author", "album": "WM/AlbumTitle",
+          "albumartist": "WM/AlbumArtist", "tracknumber": "WM/TrackNumber",
+          "genre": "WM/Genre", "date": "WM/Year"},
+    }
+
+def _value(audio, keys, field):
+    try: value = audio[keys.get(field, field)][0]
+    except (KeyError, IndexError, ValueError): return None
+    # ASF attributes keep theirs in .value, MP4 track numbers are
+    # (track, total), ID3 and Vorbis ones are strings like "3/9".
+    value = getattr(value, "value", value)
+    if field == "tracknumber":
+        if isinstance(value, tuple): value = value[0]
+        value = unicode(value).split("/")[0]
+    elif not isinstance(value, unicode):
+        value = unicode(value)
+    return value or None
+
+def read_file(path, fields=FIELDS, fileobj=None):
+    """Read one file's tags and stream information.
+
+    Returns (tags, info) dicts, as described in the module
+    documentation. If fileobj is given, the file is read through it.
+    Raises an exception if the file can't be read or its type isn't
+    known.
+    """
+
+    audio = mutagen.File(path, easy=True, fileobj=fileobj, wanted=fields)
+    if audio is None: raise ValueError("unknown file type")
+    keys = {}
+    for Kind, kind_keys in _KEYS.items():
+        if isinstance(audio, Kind): keys = kind_keys
+    tags = {}
+    for field in fields:
+        value = _value(audio, keys, field)
+        if value is not None: tags[field] = value
+    info = {}
+    for name in INFO:
+        if hasattr(audio.info, name): info[name] = getattr(audio.info, name)
+    return tags, info
+
+def read_path(path, fields=FIELDS, read=read_file):
+    """Read one file, returning (path, tags, info, error).
+
+    read is called as read(path, fields) and returns (tags, info). If
+    it raises, tags and info are None and error says what went wrong;
+    otherwise error is None.
+    """
+
+    try: tags, info = read(path, fields)
+    except Exception, err:
+        return path, None, None, "%s: %s" % (type(err).__name__, err)
+    else: return path, tags, info, None
+
+def _read_paths(args):
+    paths, fields, read = args
+    return [read_path(path, fields, read) for path in paths]
+
+def _failed(paths, error):
+    return [(path, None, None, error) for path in paths]
+
+class Reader(object):
+    """A pool of workers reading tags, set up once and reused.
+
+    Workers are only started once there is a file to read, and live
+    until close() is called. With one worker (or no multiprocessing
+    module) files are read in the calling thread.
+
+    Files go to the workers in chunks, one task per chunk, so the cost
+    of handing out work and sending back results is paid per chunk
+    rather than per file.
+
+    Attributes:
+    workers -- how many files are read at a time
+    processes -- use processes rather than threads; tag parsing is
+        mostly CPU bound, so threads only help with slow disks
+    queue -- most files handed to a worker in one chunk
+    timeout -- seconds a chunk may take from being submitted before
+        its files are given up on and reported as errors, None to
+        wait for ever
+    """
+
+    def __init__(self, workers=1, processes=True, queue=8, read=read_file,
+                 timeout=300):
+        """read is the function doing the work, see read_path. With
+        processes it has to be a module level function."""
+        self.workers = workers
+        self.processes = processes
+        self.queue = queue
+        self.timeout = timeout
+        self.__read = read
+        self.__pool = None
+
+    def __chunks(self, paths):
+        # Like Pool.map: about four chunks per worker for a list, so
+        # the last ones don't leave workers idle; queue at most.
+        size = self.queue
+        if hasattr(paths, "__len__"):
+            size = max(1, min(size, len(paths) // (self.workers * 4)))
+        chunk = []
+        for path in paths:
+            chunk.append(path)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk: yield chunk
+
+    def __wait(self, pending, order, done, ordered):
+        """Wait for a chunk to finish, returning its results. A chunk
+        that failed in the pool (rather than in read) or took longer
+        than timeout comes back as an error for each of its files."""
+        while True:
+            now = time.time()
+            if ordered: numbers = order[:1]
+            else: numbers = order
+            for number in numbers:
+                paths, result, started = pending[number]
+                if result.ready():
+                    try: results = result.get()
+                    except Exception, err:
+                        results = _failed(paths, "%s: %s" % (
+                            type(err).__name__, err))
+                elif self.timeout is not None and \
+                         now - started > self.timeout:
+                    results = _failed(paths, "TimeoutError: no result "
+                                      "in %d seconds" % self.timeout)
+                else: continue
+                del pending[number]
+                order.remove(number)
+                return results
+            # Results wake us up through done; failed tasks never call
+            # back, so look again every second.
+            try: done.get(True, 1.0)
+            except Queue.Empty: pass
+
+    def read(self, paths, fields=FIELDS, ordered=False):
+        """Read an iterable of paths, yielding (path, tags, info,
+        error) tuples as read_path does.
+
+        Results come in the order chunks finish, unless ordered is
+        true. paths is consumed in the calling thread, at most two
+        chunks per worker ahead of the results.
+        """
+
+        if self.workers <= 1 or multiprocessing is None:
+            for path in paths:
+                yield read_path(path, fields, self.__read)
+            return
+
+        done = Queue.Queue()
+        pending = {}
+        order = []
+        for number, chunk in enumerate(self.__chunks(paths)):
+            if self.__pool is None:
+                if self.processes: Pool = multiprocessing.Pool
+                else: Pool = multiprocessing.dummy.Pool
+                self.__pool = Pool(self.workers)
+            result = self.__pool.apply_async(
+                _read_paths, ((chunk, fields, self.__read),),
+                callback=done.put)
+            pending[number] = (chunk, result, time.time())
+            order.append(number)
+            if len(pending) >= self.workers * 2:
+                for result in self.__wait(pending, order, done, ordered):
+                    yield result
+        while pending:
+            for result in self.__wait(pending, order, done, ordered):
+                yield result
+
+    def close(self, terminate=False):
+        """Stop the workers, after the files they have (unless
+        terminate is true)."""
+        if self.__pool is None: return
+        if terminate: self.__pool.terminate()
+        else: self.__pool.close()
+        self.__pool.join()
+        self.__pool = None
+
+def read_tags(paths, fields=FIELDS, workers=1, processes=True):
+    """Read an iterable of paths with a Reader of its own, yielding
+    (path, tags, info, error) tuples in the order files finish."""
+
+    reader = Reader(workers, processes)
+    try:
+        for result in reader.read(paths, fields):
+            yield result
+    finally:
+        reader.close()
@@ -48,20 +48,33 @@ class EasyID3(DictMixin, Metadata):
         }
     """Valid keys for EasyID3 instances."""
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, **kwargs):
         self.__id3 = ID3()
-        self.load = self.__id3.load
         self.save = self.__id3.save
         self.delete = self.__id3.delete
         if filename is not None:
-            self.load(filename)
+            self.load(filename, **kwargs)
+
+    def load(self, filename, wanted=None, **kwargs):
+        """Load tags from a filename.
+
+        If wanted is given, only the frames behind those EasyID3 keys
+        are decoded (see ID3.load); the tag can't be saved then.
+        Keys EasyID3 doesn't know are ignored.
+        """
+        if wanted is not None:
+            wanted = [self.valid_keys[key.lower()] for key in wanted
+                      if key.lower() in self.valid_keys]
+        self.__id3.load(filename, wanted=wanted, **kwargs)
 
     filename = property(lambda s: s.__id3.filename,
                         lambda s, fn: setattr(s.__id3, 'filename', fn))
 
-    _size = property(lambda s: s._id3.size,
+    _size = property(lambda s: s.__id3.size,
                      lambda s, fn: setattr(s.__id3, '_size', fn))
 
+    size = property(lambda s: s.__id3.size)
+
     def __TCON_get(self, frame):
         return frame.genres
 
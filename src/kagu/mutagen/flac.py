@@ -417,9 +417,14 @@ class Picture(MetadataBlock):
     colors -- number of colors for indexed palettes (like GIF),
               0 for non-indexed
     data -- picture data
+    length -- size of the picture data
+    offset -- where in the file the picture data is, if it hasn't
+              been read yet (see FLAC.load), else None
     """
 
     code = 6
+    filename = None
+    offset = None
 
     def __init__(self, data=None):
         self.type = 0
@@ -432,6 +437,22 @@ class Picture(MetadataBlock):
         self.data = ''
         super(Picture, self).__init__(data)
 
+    def __get_data(self):
+        if self.offset is not None:
+            f = open(self.filename, 'rb')
+            try:
+                f.seek(self.offset)
+                self.data = f.read(self.length)
+            finally: f.close()
+        return self.__data
+
+    def __set_data(self, data):
+        self.__data = data
+        self.length = len(data)
+        self.offset = None
+
+    data = property(__get_data, __set_data, doc="Picture data")
+
     def __eq__(self, other):
         try: return (self.type == other.type and
                      self.mime == other.mime and
@@ -444,13 +465,27 @@ class Picture(MetadataBlock):
         except (AttributeError, TypeError): return False
 
     def load(self, data):
+        self.data = data.read(self.__load_header(data))
+
+    def load_header(self, fileobj, filename):
+        """Read all but the picture data from fileobj.
+
+        The data is left where it is, in filename, and only read the
+        first time it's used.
+        """
+        self.__data = ''
+        self.length = self.__load_header(fileobj)
+        self.filename = filename
+        self.offset = fileobj.tell()
+
+    def __load_header(self, data):
         self.type, length = struct.unpack('>2I', data.read(8))
         self.mime = data.read(length).decode('UTF-8', 'replace')
         length, = struct.unpack('>I', data.read(4))
         self.desc = data.read(length).decode('UTF-8', 'replace')
         (self.width, self.height, self.depth,
          self.colors, length) = struct.unpack('>5I', data.read(20))
-        self.data = data.read(length)
+        return length
 
     def write(self):
         f = StringIO()
@@ -467,7 +502,7 @@ class Picture(MetadataBlock):
 
     def __repr__(self):
         return "<%s '%s' (%d bytes)>" % (type(self).__name__, self.mime,
-                                         len(self.data))
+                                         self.length)
 
 class Padding(MetadataBlock):
     """Empty padding space for metadata blocks.
@@ -500,6 +535,7 @@ class FLAC(FileType):
     """
 
     _mimes = ["audio/x-flac", "application/x-flac"]
+    _loads_fileobj = True
 
     METADATA_BLOCKS = [StreamInfo, Padding, None, SeekTable, VCFLACDict,
         CueSheet, Picture]
@@ -509,12 +545,24 @@ class FLAC(FileType):
         return header.startswith("fLaC")
     score = staticmethod(score)
 
-    def __read_metadata_block(self, file):
+    def __read_metadata_block(self, file, pictures=True):
         byte = ord(file.read(1))
         size = to_int_be(file.read(3))
+        code = byte & 0x7F
         try:
-            data = file.read(size)
-            block = self.METADATA_BLOCKS[byte & 0x7F](data)
+            if code == Padding.code:
+                # all there is to know is the length
+                block = Padding()
+                block.length = size
+                file.seek(size, 1)
+            elif code == Picture.code and not pictures:
+                start = file.tell()
+                block = Picture()
+                block.load_header(file, self.filename)
+                file.seek(start + size)
+            else:
+                data = file.read(size)
+                block = self.METADATA_BLOCKS[code](data)
         except (IndexError, TypeError):
             block = MetadataBlock(data)
             block.code = byte & 0x7F
@@ -555,20 +603,26 @@ class FLAC(FileType):
 
     vc = property(lambda s: s.tags, doc="Alias for tags; don't use this.")
 
-    def load(self, filename):
-        """Load file information from a filename."""
+    def load(self, filename, fileobj=None, wanted=None):
+        """Load file information from a filename.
+
+        The file is read through fileobj if given (it is left open).
+        If wanted is given only the tags are wanted, and picture data
+        is not read until it's used.
+        """
 
         self.metadata_blocks = []
         self.tags = None
         self.cuesheet = None
         self.seektable = None
         self.filename = filename
-        try:
+        if fileobj is None:
             fileobj = file(filename, "rb")
-            self.__check_header(fileobj)
-            while self.__read_metadata_block(fileobj): pass
-        finally:
-            fileobj.close()
+            try: return self.load(filename, fileobj, wanted)
+            finally: fileobj.close()
+        fileobj.seek(0)
+        self.__check_header(fileobj)
+        while self.__read_metadata_block(fileobj, wanted is None): pass
 
         try: self.metadata_blocks[0].length
         except (AttributeError, IndexError):
@@ -33,6 +33,8 @@ __all__ = ['ID3', 'ID3FileType', 'Frames', 'Open', 'delete']
 import struct; from struct import unpack, pack
 from zlib import error as zlibError
 from warnings import warn
+try: import mmap
+except ImportError: mmap = None
 
 import mutagen
 from mutagen._util import insert_bytes, delete_bytes, DictProxy
@@ -58,13 +60,24 @@ class ID3(DictProxy, mutagen.Metadata):
     version -- ID3 tag version as a tuple
     unknown_frames -- raw frame data of any unknown frames found
     size -- the total size of the ID3 tag, including the header
+    wanted -- the frame IDs loaded, if not all of them were
     """
 
     PEDANTIC = True
     version = (2, 4, 0)
 
+    # Tags at least this big are parsed straight out of a read-only map
+    # of the file instead of being read into a string first; None never
+    # maps.
+    MAP_SIZE = 64 * 1024
+
+    # Old frames update_to_v24 turns into newer ones.
+    V24_SOURCES = {"TDRC": ["TYER", "TDAT", "TIME"], "TDOR": ["TORY"],
+                   "TIPL": ["IPLS"]}
+
     filename = None
     size = 0
+    wanted = None
     __flags = 0
     __readbytes = 0
     __crc = None
@@ -86,7 +99,8 @@ class ID3(DictProxy, mutagen.Metadata):
         self.__readbytes += size
         return data
 
-    def load(self, filename, known_frames=None, translate=True):
+    def load(self, filename, known_frames=None, translate=True, fileobj=None,
+             wanted=None):
         """Load tags from a filename.
 
         Keyword arguments:
@@ -95,6 +109,11 @@ class ID3(DictProxy, mutagen.Metadata):
         translate -- Update all tags to ID3v2.4 internally. Mutagen is
                      only capable of writing ID3v2.4 tags, so if you
                      intend to save, this must be true.
+        fileobj -- read from this open file instead of opening filename;
+                   it is left open
+        wanted -- only decode frames with these IDs (plus the ones
+                  update_to_v24 turns into them); other frames are
+                  skipped over unread and the tag can't be saved
 
         Example of loading a custom frame:
             my_frames = dict(mutagen.id3.Frames)
@@ -106,8 +125,16 @@ class ID3(DictProxy, mutagen.Metadata):
         from os.path import getsize
         self.filename = filename
         self.__known_frames = known_frames
-        self.__fileobj = file(filename, 'rb')
-        self.__filesize = getsize(filename)
+        if wanted is not None: wanted = frozenset(wanted)
+        self.wanted = wanted
+        if fileobj is None:
+            self.__fileobj = file(filename, 'rb')
+            self.__filesize = getsize(filename)
+        else:
+            self.__fileobj = fileobj
+            fileobj.seek(0, 2)
+            self.__filesize = fileobj.tell()
+            fileobj.seek(0, 0)
         try:
             try:
                 self.__load_header()
@@ -132,17 +159,56 @@ class ID3(DictProxy, mutagen.Metadata):
                 if frames is None:
                     if (2,3,0) <= self.version: frames = Frames
                     elif (2,2,0) <= self.version: frames = Frames_2_2
-                data = self.__fullread(self.size - 10)
-                for frame in self.__read_frames(data, frames=frames):
-                    if isinstance(frame, Frame): self.add(frame)
-                    else: self.unknown_frames.append(frame)
+                if wanted is not None: wanted = self.__wanted_ids(frames)
+                data, start, end, fmap = self.__tag_data(self.size - 10)
+                try:
+                    for frame in self.__read_frames(data, start, end,
+                                                    frames, wanted):
+                        if isinstance(frame, Frame): self.add(frame)
+                        else: self.unknown_frames.append(frame)
+                finally:
+                    if fmap is not None: fmap.close()
         finally:
-            self.__fileobj.close()
+            if fileobj is None: self.__fileobj.close()
             del self.__fileobj
             del self.__filesize
             if translate:
                 self.update_to_v24()
 
+    def __tag_data(self, size):
+        """(data, start, end, map) for the next size bytes of the file.
+
+        For big tags data is a read-only mmap of the whole file, also
+        returned as map to be closed after; otherwise it is a string of
+        just those bytes and map is None.
+        """
+        if (mmap is None or self.MAP_SIZE is None or size < self.MAP_SIZE
+            or (self.version < (2,4,0) and self.f_unsynch)):
+            return self.__fullread(size), 0, size, None
+        pos = self.__fileobj.tell()
+        if pos + size > self.__filesize:
+            raise EOFError('Requested %#x of %#x (%s)' % 
+                    (long(size), long(self.__filesize - pos), self.filename))
+        try:
+            fmap = mmap.mmap(self.__fileobj.fileno(), 0,
+                             access=mmap.ACCESS_READ)
+        except (AttributeError, EnvironmentError, ValueError):
+            return self.__fullread(size), 0, size, None
+        self.__fileobj.seek(size, 1)
+        self.__readbytes += size
+        return fmap, pos, pos + size, fmap
+
+    def __wanted_ids(self, frames):
+        """IDs of the frames to decode in a tag read with frames."""
+        ids = set(self.wanted)
+        for new, old in self.V24_SOURCES.items():
+            if new in ids: ids.update(old)
+        for name, kind in frames.items():
+            # ID3v2.2 frames subclass the frame they become
+            if len(name) == 3 and kind.__base__.__name__ in ids:
+                ids.add(name)
+        return ids
+
     def getall(self, key):
         """Return all frames with a given name (the list may be empty).
 
@@ -223,79 +289,87 @@ class ID3(DictProxy, mutagen.Metadata):
             self.__extsize = BitPaddedInt(self.__fullread(4))
             self.__extdata = self.__fullread(self.__extsize - 4)
 
-    def __determine_bpi(self, data, frames):
+    def __determine_bpi(self, data, start, end, frames):
         if self.version < (2,4,0): return int
         # have to special case whether to use bitpaddedints here
         # spec says to use them, but iTunes has it wrong
 
         # count number of tags found as BitPaddedInt and how far past
-        o = 0
+        o = start
         asbpi = 0
-        while o < len(data)-10:
+        while o < end-10:
             name, size, flags = unpack('>4sLH', data[o:o+10])
             size = BitPaddedInt(size)
             o += 10+size
             if name in frames: asbpi += 1
-        bpioff = o - len(data)
+        bpioff = o - end
 
         # count number of tags found as int and how far past
-        o = 0
+        o = start
         asint = 0
-        while o < len(data)-10:
+        while o < end-10:
             name, size, flags = unpack('>4sLH', data[o:o+10])
             o += 10+size
             if name in frames: asint += 1
-        intoff = o - len(data)
+        intoff = o - end
 
         # if more tags as int, or equal and bpi is past and int is not
         if asint > asbpi or (asint == asbpi and (bpioff >= 1 and intoff <= 1)):
             return int
         return BitPaddedInt
 
-    def __read_frames(self, data, frames):
+    def __read_frames(self, data, start, end, frames, wanted=None):
+        # Frames are walked by offset; only the ones kept as raw bytes
+        # are sliced out whole, the rest are parsed in place.
         if self.version < (2,4,0) and self.f_unsynch:
-            try: data = unsynch.decode(data)
+            try: data = unsynch.decode(data[start:end])
             except ValueError: pass
+            else: start, end = 0, len(data)
 
+        pos = start
         if (2,3,0) <= self.version:
-            bpi = self.__determine_bpi(data, frames)
-            while data:
-                header = data[:10]
+            bpi = self.__determine_bpi(data, start, end, frames)
+            while pos < end:
+                header = data[pos:pos+10]
                 try: name, size, flags = unpack('>4sLH', header)
                 except struct.error: return # not enough header
                 if name.strip('\x00') == '': return
                 size = bpi(size)
-                framedata = data[10:10+size]
-                data = data[10+size:]
+                fstart, fend = pos+10, min(pos+10+size, end)
+                pos += 10+size
                 if size == 0: continue # drop empty frames
+                if wanted is not None and name not in wanted: continue
                 try: tag = frames[name]
                 except KeyError: 
-                    if is_valid_frame_id(name): yield header + framedata
+                    if is_valid_frame_id(name):
+                        yield header + data[fstart:fend]
                 else:
-                    try: yield self.__load_framedata(tag, flags, framedata)
-                    except NotImplementedError: yield header + framedata
+                    try: yield self.__load_framedata(tag, flags, data, fstart, fend)
+                    except NotImplementedError: yield header + data[fstart:fend]
                     except ID3JunkFrameError: pass
 
         elif (2,2,0) <= self.version:
-            while data:
-                header = data[0:6]
+            while pos < end:
+                header = data[pos:pos+6]
                 try: name, size = unpack('>3s3s', header)
                 except struct.error: return # not enough header
                 size, = struct.unpack('>L', '\x00'+size)
                 if name.strip('\x00') == '': return
-                framedata = data[6:6+size]
-                data = data[6+size:]
+                fstart, fend = pos+6, min(pos+6+size, end)
+                pos += 6+size
                 if size == 0: continue # drop empty frames
+                if wanted is not None and name not in wanted: continue
                 try: tag = frames[name]
                 except KeyError:
-                    if is_valid_frame_id(name): yield header + framedata
+                    if is_valid_frame_id(name):
+                        yield header + data[fstart:fend]
                 else:
-                    try: yield self.__load_framedata(tag, 0, framedata)
-                    except NotImplementedError: yield header + framedata
+                    try: yield self.__load_framedata(tag, 0, data, fstart, fend)
+                    except NotImplementedError: yield header + data[fstart:fend]
                     except ID3JunkFrameError: pass
 
-    def __load_framedata(self, tag, flags, framedata):
-        return tag.fromData(self, flags, framedata)
+    def __load_framedata(self, tag, flags, data, start, end):
+        return tag.fromData(self, flags, data, start, end)
             
     f_unsynch = property(lambda s: bool(s.__flags & 0x80))
     f_extended = property(lambda s: bool(s.__flags & 0x40))
@@ -317,6 +391,9 @@ class ID3(DictProxy, mutagen.Metadata):
         The lack of a way to update only an ID3v1 tag is intentional.
         """
 
+        if self.wanted is not None:
+            raise error("%s: only some frames were loaded" % self.filename)
+
         framedata = map(self.__save_frame, self.values())
         framedata.extend([data for data in self.unknown_frames
                 if len(data) > 10])
@@ -569,18 +646,44 @@ class unsynch(object):
         return ''.join(output)
     encode = staticmethod(encode)
 
+def _find(data, sub, start, end):
+    """data.find(sub, start, end), also for mmaps that take no end"""
+    try: return data.find(sub, start, end)
+    except TypeError:
+        i = data.find(sub, start)
+        if i + len(sub) > end: return -1
+        return i
+
 class Spec(object):
+    """A frame field.
+
+    read_at(frame, data, pos, end) parses the field at offset pos of
+    data (a str or an mmap), not past end, and returns the value and
+    the offset after it. read(frame, data) does the same on a string of
+    its own and returns the value and the rest of the string.
+    """
     def __init__(self, name): self.name = name
     def __hash__(self): raise TypeError("Spec objects are unhashable")
 
+    def read(self, frame, data):
+        value, pos = self.read_at(frame, data, 0, len(data))
+        return value, data[pos:]
+
+    def read_at(self, frame, data, pos, end):
+        # for specs that only define read()
+        value, rest = self.read(frame, data[pos:end])
+        return value, end - len(rest)
+
 class ByteSpec(Spec):
-    def read(self, frame, data): return ord(data[0]), data[1:]
+    def read_at(self, frame, data, pos, end):
+        if pos >= end: raise IndexError("string index out of range")
+        return ord(data[pos]), pos+1
     def write(self, frame, value): return chr(value)
     def validate(self, frame, value): return value
 
 class IntegerSpec(Spec):
-    def read(self, frame, data):
-        return int(BitPaddedInt(data, bits=8)), ''
+    def read_at(self, frame, data, pos, end):
+        return int(BitPaddedInt(data[pos:end], bits=8)), end
     def write(self, frame, value):
         return BitPaddedInt.to_str(value, bits=8, width=-1)
     def validate(self, frame, value):
@@ -589,18 +692,19 @@ class IntegerSpec(Spec):
 class SizedIntegerSpec(Spec):
     def __init__(self, name, size):
         self.name, self.__sz = name, size
-    def read(self, frame, data):
-        return int(BitPaddedInt(data[:self.__sz], bits=8)), data[self.__sz:]
+    def read_at(self, frame, data, pos, end):
+        stop = min(pos+self.__sz, end)
+        return int(BitPaddedInt(data[pos:stop], bits=8)), stop
     def write(self, frame, value):
         return BitPaddedInt.to_str(value, bits=8, width=self.__sz)
     def validate(self, frame, value):
         return value
 
 class EncodingSpec(ByteSpec):
-    def read(self, frame, data):
-        enc, data = super(EncodingSpec, self).read(frame, data)
-        if enc < 16: return enc, data
-        else: return 0, chr(enc)+data
+    def read_at(self, frame, data, pos, end):
+        enc = super(EncodingSpec, self).read_at(frame, data, pos, end)[0]
+        if enc < 16: return enc, pos+1
+        else: return 0, pos
 
     def validate(self, frame, value):
         if 0 <= value <= 3: return value
@@ -611,7 +715,9 @@ class StringSpec(Spec):
     def __init__(self, name, length):
         super(StringSpec, self).__init__(name)
         self.len = length
-    def read(s, frame, data): return data[:s.len], data[s.len:]
+    def read_at(s, frame, data, pos, end):
+        stop = min(pos+s.len, end)
+        return data[pos:stop], stop
     def write(s, frame, value):
         if value is None: return '\x00' * s.len
         else: return (str(value) + '\x00' * s.len)[:s.len]
@@ -621,7 +727,7 @@ class StringSpec(Spec):
         raise ValueError, 'Invalid StringSpec[%d] data: %r' % (s.len, value)
 
 class BinaryDataSpec(Spec):
-    def read(self, frame, data): return data, ''
+    def read_at(self, frame, data, pos, end): return data[pos:end], end
     def write(self, frame, value): return str(value)
     def validate(self, frame, value): return str(value)
 
@@ -632,23 +738,17 @@ class EncodedTextSpec(Spec):
     _encodings = ( ('latin1', '\x00'), ('utf16', '\x00\x00'),
                    ('utf_16_be', '\x00\x00'), ('utf8', '\x00') )
 
-    def read(self, frame, data):
+    def read_at(self, frame, data, pos, end):
         enc, term = self._encodings[frame.encoding]
-        ret = ''
-        if len(term) == 1:
-            if term in data:
-                data, ret = data.split(term, 1)
-        else:
-            offset = -1
-            try:
-                while True:
-                    offset = data.index(term, offset+1)
-                    if offset & 1: continue
-                    data, ret = data[0:offset], data[offset+2:]; break
-            except ValueError: pass
+        stop = pos-1
+        while True:
+            stop = _find(data, term, stop+1, end)
+            if stop < 0: stop = next = end; break
+            if len(term) == 2 and (stop-pos) & 1: continue
+            next = stop+len(term); break
 
-        if len(data) < len(term): return u'', ret
-        return data.decode(enc), ret
+        if stop-pos < len(term): return u'', next
+        return data[pos:stop].decode(enc), next
 
     def write(self, frame, value):
         enc, term = self._encodings[frame.encoding]
@@ -662,16 +762,16 @@ class MultiSpec(Spec):
         self.specs = specs
         self.sep = kw.get('sep')
 
-    def read(self, frame, data):
+    def read_at(self, frame, data, pos, end):
         values = []
-        while data:
+        while pos < end:
             record = []
             for spec in self.specs:
-                value, data = spec.read(frame, data)
+                value, pos = spec.read_at(frame, data, pos, end)
                 record.append(value)
             if len(self.specs) != 1: values.append(record)
             else: values.append(record[0])
-        return values, data
+        return values, pos
 
     def write(self, frame, value):
         data = []
@@ -701,10 +801,10 @@ class EncodedNumericTextSpec(EncodedTextSpec): pass
 class EncodedNumericPartTextSpec(EncodedTextSpec): pass
 
 class Latin1TextSpec(EncodedTextSpec):
-    def read(self, frame, data):
-        if '\x00' in data: data, ret = data.split('\x00',1)
-        else: ret = ''
-        return data.decode('latin1'), ret
+    def read_at(self, frame, data, pos, end):
+        stop = _find(data, '\x00', pos, end)
+        if stop < 0: return data[pos:end].decode('latin1'), end
+        return data[pos:stop].decode('latin1'), stop+1
 
     def write(self, data, value):
         return value.encode('latin1') + '\x00'
@@ -753,9 +853,9 @@ class ID3TimeStamp(object):
     def encode(self, *args): return self.text.encode(*args)
 
 class TimeStampSpec(EncodedTextSpec):
-    def read(self, frame, data):
-        value, data = super(TimeStampSpec, self).read(frame, data)
-        return self.validate(frame, value), data
+    def read_at(self, frame, data, pos, end):
+        value, pos = super(TimeStampSpec, self).read_at(frame, data, pos, end)
+        return self.validate(frame, value), pos
 
     def write(self, frame, data):
         return super(TimeStampSpec, self).write(frame,
@@ -770,9 +870,9 @@ class ChannelSpec(ByteSpec):
      BACKCENTRE, SUBWOOFER) = range(9)
 
 class VolumeAdjustmentSpec(Spec):
-    def read(self, frame, data):
-        value, = unpack('>h', data[0:2])
-        return value/512.0, data[2:]
+    def read_at(self, frame, data, pos, end):
+        value, = unpack('>h', data[pos:min(pos+2, end)])
+        return value/512.0, pos+2
 
     def write(self, frame, value):
         return pack('>h', int(round(value * 512)))
@@ -799,17 +899,18 @@ class VolumePeakSpec(Spec):
     def validate(self, frame, value): return value
 
 class SynchronizedTextSpec(EncodedTextSpec):
-    def read(self, frame, data):
+    def read_at(self, frame, data, pos, end):
         texts = []
         encoding, term = self._encodings[frame.encoding]
-        while data:
+        while pos < end:
             l = len(term)
-            value_idx = data.index(term)
-            value = data[:value_idx].decode(encoding)
-            time, = struct.unpack(">I", data[value_idx+l:value_idx+l+4])
+            value_idx = _find(data, term, pos, end)
+            if value_idx < 0: raise ValueError("substring not found")
+            value = data[pos:value_idx].decode(encoding)
+            time, = struct.unpack(">I", data[value_idx+l:min(value_idx+l+4, end)])
             texts.append((value, time))
-            data = data[value_idx+l+4:]
-        return texts, ""
+            pos = value_idx+l+4
+        return texts, end
 
     def write(self, frame, value):
         data = []
@@ -939,18 +1040,22 @@ class Frame(object):
             kw.append('%s=%r' % (attr.name, getattr(self, attr.name)))
         return '%s(%s)' % (type(self).__name__, ', '.join(kw))
 
-    def _readData(self, data):
-        odata = data
+    def _readData(self, data, start=0, end=None):
+        if end is None: end = len(data)
+        pos = start
         for reader in self._framespec:
-            if len(data):
-                try: value, data = reader.read(self, data)
+            if pos < end:
+                try: value, pos = reader.read_at(self, data, pos, end)
                 except UnicodeDecodeError:
                     raise ID3JunkFrameError
             else: raise ID3JunkFrameError
             setattr(self, reader.name, value)
-        if data.strip('\x00'):
+        self._leftover(data, start, pos, end)
+
+    def _leftover(self, data, start, pos, end):
+        if pos < end and data[pos:end].strip('\x00'):
             warn('Leftover data: %s: %r (from %r)' % (
-                    type(self).__name__, data, odata),
+                    type(self).__name__, data[pos:end], data[start:end]),
                     ID3Warning)
 
     def _writeData(self):
@@ -966,51 +1071,67 @@ class Frame(object):
     def _pprint(self):
         return "[unrepresentable data]"
 
-    def fromData(cls, id3, tflags, data):
-        """Construct this ID3 frame from raw string data."""
+    def fromData(cls, id3, tflags, data, start=0, end=None):
+        """Construct this ID3 frame from raw string data.
 
+        If start and end are given the frame is data[start:end], and data
+        may be an mmap. Its fields are read in place unless the frame is
+        compressed or unsynchronised.
+        """
+
+        if end is None: end = len(data)
         if (2,4,0) <= id3.version:
-            if tflags & (Frame.FLAG24_COMPRESS | Frame.FLAG24_DATALEN):
-                # The data length int is syncsafe in 2.4 (but not 2.3).
-                # However, we don't actually need the data length int,
-                # except to work around a QL 0.12 bug, and in that case
-                # all we need are the raw bytes.
-                datalen_bytes = data[:4]
-                data = data[4:]
-            if tflags & Frame.FLAG24_UNSYNCH or id3.f_unsynch:
-                try: data = unsynch.decode(data)
-                except ValueError, err:
-                    if id3.PEDANTIC:
-                        raise ID3BadUnsynchData, '%s: %r' % (err, data)
-            if tflags & Frame.FLAG24_ENCRYPT:
-                raise ID3EncryptionUnsupportedError
-            if tflags & Frame.FLAG24_COMPRESS:
-                try: data = data.decode('zlib')
-                except zlibError, err:
-                    # the initial mutagen that went out with QL 0.12 did not
-                    # write the 4 bytes of uncompressed size. Compensate.
-                    data = datalen_bytes + data
+            transformed = id3.f_unsynch or tflags & (Frame.FLAG24_COMPRESS
+                | Frame.FLAG24_DATALEN | Frame.FLAG24_UNSYNCH
+                | Frame.FLAG24_ENCRYPT)
+        else:
+            transformed = tflags & (Frame.FLAG23_COMPRESS
+                | Frame.FLAG23_ENCRYPT)
+
+        if transformed:
+            data = data[start:end]
+            if (2,4,0) <= id3.version:
+                if tflags & (Frame.FLAG24_COMPRESS | Frame.FLAG24_DATALEN):
+                    # The data length int is syncsafe in 2.4 (but not 2.3).
+                    # However, we don't actually need the data length int,
+                    # except to work around a QL 0.12 bug, and in that case
+                    # all we need are the raw bytes.
+                    datalen_bytes = data[:4]
+                    data = data[4:]
+                if tflags & Frame.FLAG24_UNSYNCH or id3.f_unsynch:
+                    try: data = unsynch.decode(data)
+                    except ValueError, err:
+                        if id3.PEDANTIC:
+                            raise ID3BadUnsynchData, '%s: %r' % (err, data)
+                if tflags & Frame.FLAG24_ENCRYPT:
+                    raise ID3EncryptionUnsupportedError
+                if tflags & Frame.FLAG24_COMPRESS:
+                    try: data = data.decode('zlib')
+                    except zlibError, err:
+                        # the initial mutagen that went out with QL 0.12 did not
+                        # write the 4 bytes of uncompressed size. Compensate.
+                        data = datalen_bytes + data
+                        try: data = data.decode('zlib')
+                        except zlibError, err:
+                            if id3.PEDANTIC:
+                                raise ID3BadCompressedData, '%s: %r' % (err, data)
+
+            elif (2,3,0) <= id3.version:
+                if tflags & Frame.FLAG23_COMPRESS:
+                    usize, = unpack('>L', data[:4])
+                    data = data[4:]
+                if tflags & Frame.FLAG23_ENCRYPT:
+                    raise ID3EncryptionUnsupportedError
+                if tflags & Frame.FLAG23_COMPRESS:
                     try: data = data.decode('zlib')
                     except zlibError, err:
                         if id3.PEDANTIC:
                             raise ID3BadCompressedData, '%s: %r' % (err, data)
-
-        elif (2,3,0) <= id3.version:
-            if tflags & Frame.FLAG23_COMPRESS:
-                usize, = unpack('>L', data[:4])
-                data = data[4:]
-            if tflags & Frame.FLAG23_ENCRYPT:
-                raise ID3EncryptionUnsupportedError
-            if tflags & Frame.FLAG23_COMPRESS:
-                try: data = data.decode('zlib')
-                except zlibError, err:
-                    if id3.PEDANTIC:
-                        raise ID3BadCompressedData, '%s: %r' % (err, data)
+            start, end = 0, len(data)
 
         frame = cls()
-        frame._rawdata = data
         frame._flags = tflags
-        frame._readData(data)
+        frame._readData(data, start, end)
         return frame
     fromData = classmethod(fromData)
 
@@ -1033,21 +1154,19 @@ class FrameOpt(Frame):
                 setattr(self, spec.name, validated)
             else: break
 
-    def _readData(self, data):
-        odata = data
+    def _readData(self, data, start=0, end=None):
+        if end is None: end = len(data)
+        pos = start
         for reader in self._framespec:
-            if len(data): value, data = reader.read(self, data)
+            if pos < end: value, pos = reader.read_at(self, data, pos, end)
             else: raise ID3JunkFrameError
             setattr(self, reader.name, value)
-        if data:
+        if pos < end:
             for reader in self._optionalspec:
-                if len(data): value, data = reader.read(self, data)
+                if pos < end: value, pos = reader.read_at(self, data, pos, end)
                 else: break
                 setattr(self, reader.name, value)
-        if data.strip('\x00'):
-            warn('Leftover data: %s: %r (from %r)' % (
-                    type(self).__name__, data, odata),
-                    ID3Warning)
+        self._leftover(data, start, pos, end)
 
     def _writeData(self):
         data = []
@@ -1883,6 +2002,8 @@ def MakeID3v1(id3):
 class ID3FileType(mutagen.FileType):
     """An unknown type of file with ID3 tags."""
 
+    _loads_fileobj = True
+
     class _Info(object):
         length = 0
         def __init__(self, fileobj, offset): pass
@@ -1903,22 +2024,25 @@ class ID3FileType(mutagen.FileType):
         else:
             raise error("an ID3 tag already exists")
 
-    def load(self, filename, ID3=ID3, **kwargs):
+    def load(self, filename, ID3=ID3, fileobj=None, **kwargs):
         """Load stream and tag information from a file.
 
         A custom tag reader may be used in instead of the default
         mutagen.id3.ID3 object, e.g. an EasyID3 reader.
+
+        Tags and stream information are read through one file object,
+        fileobj if given (it is left open).
         """
         self.filename = filename
-        try: self.tags = ID3(filename, **kwargs)
+        if fileobj is None:
+            fileobj = file(filename, "rb")
+            try: return self.load(filename, ID3=ID3, fileobj=fileobj, **kwargs)
+            finally: fileobj.close()
+        try: self.tags = ID3(filename, fileobj=fileobj, **kwargs)
         except error: self.tags = None
         if self.tags is not None:
             try: offset = self.tags.size
             except AttributeError: offset = None
         else: offset = None
-        try:
-            fileobj = file(filename, "rb")
-            self.info = self._Info(fileobj, offset)
-        finally:
-            fileobj.close()
+        self.info = self._Info(fileobj, offset)
 
@@ -9,8 +9,10 @@
 
 import os
 import struct
+from bisect import bisect_right
 
 from mutagen.id3 import ID3FileType, BitPaddedInt, delete
+from mutagen.easyid3 import EasyID3
 
 class error(RuntimeError): pass
 class HeaderNotFoundError(error, IOError): pass
@@ -23,7 +25,7 @@ class MPEGInfo(object):
     """MPEG audio stream information
 
     Parse information about an MPEG audio file. This also reads the
-    Xing VBR header format.
+    Xing/Info, VBRI and LAME headers encoders put in the first frame.
 
     This code was implemented based on the format documentation at
     http://www.dv.co.yu/mpgscript/mpeghdr.htm.
@@ -32,6 +34,11 @@ class MPEGInfo(object):
     length -- audio length, in seconds
     bitrate -- audio bitrate, in bits per second
     sketchy -- if true, the file may not be valid MPEG audio
+    estimated -- if true, there was no header giving the frame count
+        and the stream didn't look CBR, so length is extrapolated from
+        the first frame's bitrate; frame_index() can measure it
+    seek_table -- None, or 101 byte offsets (from offset) of the audio
+        at 0%, 1%, ... 100% of length, from a Xing or VBRI table
 
     Useless attributes:
     version -- MPEG version (1, 2, 2.5)
@@ -40,6 +47,9 @@ class MPEGInfo(object):
     protected -- whether or not the file is "protected"
     padding -- whether or not audio frames are padded
     sample_rate -- audio sample rate, in Hz
+    offset -- where the first frame starts in the file
+    encoder_delay, encoder_padding -- samples the LAME header says
+        the encoder added at the start and end
     """
 
     # Map (version, layer) tuples to bitrates.
@@ -62,6 +72,40 @@ class MPEGInfo(object):
         }
 
     sketchy = False
+    estimated = False
+    seek_table = None
+    encoder_delay = encoder_padding = 0
+
+    def header(klass, frame_data):
+        """Parse a 32 bit frame header.
+
+        Returns (version, layer, bitrate, sample rate, frame length in
+        bytes, samples per frame), or None if it isn't a valid header.
+        """
+        if (frame_data >> 21) & 0x7FF != 0x7FF: return None
+        version = (frame_data >> 19) & 0x3
+        layer = (frame_data >> 17) & 0x3
+        bitrate = (frame_data >> 12) & 0xF
+        sample_rate = (frame_data >> 10) & 0x3
+        padding = (frame_data >> 9) & 0x1
+        if (version == 1 or layer == 0 or sample_rate == 0x3 or
+            bitrate == 0 or bitrate == 0xF):
+            return None
+        version = [2.5, None, 2, 1][version]
+        layer = 4 - layer
+        bitrate = klass.__BITRATE[(version, layer)][bitrate] * 1000
+        sample_rate = klass.__RATES[version][sample_rate]
+        if layer == 1:
+            return (version, layer, bitrate, sample_rate,
+                    (12 * bitrate / sample_rate + padding) * 4, 384)
+        elif layer == 3 and version != 1:
+            # MPEG 2 and 2.5 layer 3 frames carry half as many samples
+            return (version, layer, bitrate, sample_rate,
+                    72 * bitrate / sample_rate + padding, 576)
+        else:
+            return (version, layer, bitrate, sample_rate,
+                    144 * bitrate / sample_rate + padding, 1152)
+    header = classmethod(header)
 
     def __init__(self, fileobj, offset=None):
         """Parse MPEG stream information from a file-like object.
@@ -72,7 +116,7 @@ class MPEGInfo(object):
         loading files significantly faster.
         """
 
-        try: size = os.path.getsize(fileobj.name)
+        try: size = os.fstat(fileobj.fileno()).st_size
         except (IOError, OSError, AttributeError):
             fileobj.seek(0, 2)
             size = fileobj.tell()
@@ -101,6 +145,33 @@ class MPEGInfo(object):
             self.__try(fileobj, offset, size - offset, False)
             self.sketchy = True
 
+        # Without a frame count the length is only right for CBR, so
+        # see whether frames further in have the first one's bitrate.
+        if self.estimated and not self.sketchy:
+            for i in [0.3 * size, 0.6 * size, 0.9 * size]:
+                if not self.__same_bitrate(fileobj, int(i)): break
+            else: self.estimated = False
+
+    def __same_bitrate(self, fileobj, offset):
+        fileobj.seek(offset, 0)
+        data = fileobj.read(8192)
+        # sync to a frame that is followed by another one
+        pos = data.find("\xff")
+        while 0 <= pos <= len(data) - 4:
+            frame = self.header(struct.unpack(">I", data[pos:pos + 4])[0])
+            if frame is not None and pos + frame[4] <= len(data) - 4:
+                next = data[pos + frame[4]:pos + frame[4] + 4]
+                if self.header(struct.unpack(">I", next)[0]): break
+            pos = data.find("\xff", pos + 1)
+        else: return True
+        # then every frame in the read has to have the same bitrate
+        while pos <= len(data) - 4:
+            frame = self.header(struct.unpack(">I", data[pos:pos + 4])[0])
+            if frame is None: break
+            elif frame[2] != self.bitrate: return False
+            pos += frame[4]
+        return True
+
     def __try(self, fileobj, offset, real_size, check_second=True):
         # This is going to be one really long function; bear with it,
         # because there's not really a sane point to cut it up.
@@ -139,21 +210,11 @@ class MPEGInfo(object):
 
         # There is a serious problem here, which is that many flags
         # in an MPEG header are backwards.
-        self.version = [2.5, None, 2, 1][version]
-        self.layer = 4 - layer
         self.protected = not protection
         self.padding = bool(padding)
-
-        self.bitrate = self.__BITRATE[(self.version, self.layer)][bitrate]
-        self.bitrate *= 1000
-        self.sample_rate = self.__RATES[self.version][sample_rate]
-
-        if self.layer == 1:
-            frame_length = (12 * self.bitrate / self.sample_rate + padding) * 4
-            frame_size = 384
-        else:
-            frame_length = 144 * self.bitrate / self.sample_rate + padding
-            frame_size = 1152
+        self.offset = offset + frame_1
+        (self.version, self.layer, self.bitrate, self.sample_rate,
+         frame_length, frame_size) = self.header(frame_data)
 
         if check_second:
             possible = frame_1 + frame_length
@@ -166,33 +227,142 @@ class MPEGInfo(object):
         frame_count = real_size / float(frame_length)
         samples = frame_size * frame_count
         self.length = samples / self.sample_rate
-
-        # Try to find/parse the Xing header, which trumps the above length
-        # and bitrate calculation.
-        fileobj.seek(offset, 0)
-        data = fileobj.read(32768)
-        try:
-            xing = data[:-4].index("Xing")
-        except ValueError: pass
-        else:
-            # If a Xing header was found, this is definitely MPEG audio.
-            self.sketchy = False
-            flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
-            if flags & 0x1:
-                frame_count = struct.unpack('>I', data[xing + 8:xing + 12])[0]
-                samples = frame_size * frame_count
-                self.length = (samples / self.sample_rate) or self.length
-            if flags & 0x2:
-                bytes = struct.unpack('>I', data[xing + 12:xing + 16])[0]
-                self.bitrate = int((bytes * 8) // self.length)
+        self.estimated = True
+
+        # Try to find/parse the Xing/Info or VBRI header, which trumps
+        # the above length and bitrate calculation. It sits in the
+        # first frame, so it is in the data read above.
+        first = data[frame_1:frame_1 + frame_length]
+        xing = max(first.find("Xing"), first.find("Info"))
+        if xing != -1:
+            self.__xing(first, xing, frame_size)
+        elif first[36:40] == "VBRI":
+            self.__vbri(first, frame_size)
+
+    def __xing(self, data, xing, frame_size):
+        # If a Xing header was found, this is definitely MPEG audio.
+        self.sketchy = False
+        flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+        pos = xing + 8
+        frame_count = bytes = toc = None
+        if flags & 0x1:
+            frame_count = struct.unpack('>I', data[pos:pos + 4])[0]
+            pos += 4
+        if flags & 0x2:
+            bytes = struct.unpack('>I', data[pos:pos + 4])[0]
+            pos += 4
+        if flags & 0x4:
+            toc = map(ord, data[pos:pos + 100])
+            pos += 100
+        if flags & 0x8:
+            pos += 4
+        # The LAME header follows; it knows the encoder delay and padding.
+        if data[pos:pos + 4] in ["LAME", "Lavf", "Lavc"] and \
+               len(data) >= pos + 24:
+            delay = struct.unpack('>I', "\x00" + data[pos + 21:pos + 24])[0]
+            self.encoder_delay = delay >> 12
+            self.encoder_padding = delay & 0xFFF
+        if frame_count:
+            samples = frame_size * frame_count
+            samples -= self.encoder_delay + self.encoder_padding
+            self.length = float(max(samples, 0)) / self.sample_rate
+            self.estimated = False
+        if bytes and self.length:
+            self.bitrate = int((bytes * 8) // self.length)
+        if bytes and toc and len(toc) == 100:
+            self.seek_table = [t * bytes // 256 for t in toc] + [bytes]
+
+    def __vbri(self, data, frame_size):
+        if len(data) < 62: return
+        self.sketchy = False
+        (bytes, frame_count, entries, scale, entry_size,
+         frames_per_entry) = struct.unpack('>IIHHHH', data[46:62])
+        if not frame_count: return
+        self.length = float(frame_count * frame_size) / self.sample_rate
+        self.estimated = False
+        if bytes: self.bitrate = int((bytes * 8) // self.length)
+        if entry_size not in [1, 2, 3, 4]: return
+        table = data[62:62 + entries * entry_size]
+        if len(table) < entries * entry_size: return
+        points = [(0, 0)]
+        for i in range(entries):
+            entry = table[i * entry_size:(i + 1) * entry_size]
+            entry = struct.unpack('>I', "\x00" * (4 - entry_size) + entry)[0]
+            points.append((points[-1][0] + frames_per_entry * frame_size,
+                           points[-1][1] + entry * scale))
+        self.seek_table = _seek_table(
+            points, frame_count * frame_size, bytes or points[-1][1])
 
     def pprint(self):
         s = "MPEG %s layer %d, %d bps, %s Hz, %.2f seconds" % (
             self.version, self.layer, self.bitrate, self.sample_rate,
             self.length)
         if self.sketchy: s += " (sketchy)"
+        elif self.estimated: s += " (estimated)"
         return s
 
+def _seek_table(points, samples, size):
+    """Turn (samples, byte offset) points into 101 byte offsets, one
+    at every percent of samples, interpolating between the points."""
+    keys = [p[0] for p in points]
+    table = []
+    for i in range(100):
+        target = samples * i / 100.0
+        j = max(bisect_right(keys, target) - 1, 0)
+        (s1, o1) = points[j]
+        if j + 1 < len(points): (s2, o2) = points[j + 1]
+        else: (s2, o2) = (samples, size)
+        if s2 > s1: o1 += (o2 - o1) * (target - s1) / (s2 - s1)
+        table.append(min(int(o1), size))
+    return table + [size]
+
+def frame_index(fileobj, info, step=38):
+    """Walk every frame of an MPEG stream to measure it exactly.
+
+    info is the file's MPEGInfo. Returns (length in seconds, seek
+    table as in MPEGInfo.seek_table). This reads the whole file, so
+    it's meant for the files MPEGInfo could only estimate.
+    """
+
+    fileobj.seek(0, 2)
+    end = fileobj.tell()
+    if end >= 128:
+        fileobj.seek(end - 128, 0)
+        if fileobj.read(3) == "TAG": end -= 128
+
+    stream = (info.version, info.layer, info.sample_rate)
+    header = MPEGInfo.header
+    unpack = struct.unpack
+    pos = info.offset
+    data, start = "", pos
+    frames = samples = 0
+    last = pos
+    points = []
+    while pos + 4 <= end:
+        if pos + 4 > start + len(data):
+            fileobj.seek(pos, 0)
+            data, start = fileobj.read(min(65536, end - pos)), pos
+            if len(data) < 4: break
+        i = pos - start
+        frame = header(unpack(">I", data[i:i + 4])[0])
+        if frame is None or frame[:2] + frame[3:4] != stream:
+            # lost sync; look for the next frame of this stream
+            i = data.find("\xff", i + 1)
+            if i == -1: pos = max(pos + 1, start + len(data) - 3)
+            else: pos = start + i
+            if pos - last >= 65536: break
+            continue
+        if frames % step == 0: points.append((samples, pos - info.offset))
+        frames += 1
+        samples += frame[5]
+        pos += frame[4]
+        last = pos
+
+    size = min(last, end) - info.offset
+    if not samples: return info.length, None
+    return (float(samples) / info.sample_rate,
+            _seek_table(points, samples, size))
+
 class MP3(ID3FileType):
     """An MPEG audio (usually MPEG-1 Layer 3) file."""
 
@@ -207,4 +377,14 @@ class MP3(ID3FileType):
                 filename.endswith(".mpeg"))
     score = staticmethod(score)
 
+class EasyMP3(MP3):
+    """Like MP3, but uses EasyID3 for its tags.
+
+    The tag is parsed once, while loading, and read through the same
+    file object as the stream information.
+    """
+
+    def load(self, filename, ID3=EasyID3, **kwargs):
+        MP3.load(self, filename, ID3=ID3, **kwargs)
+
 Open = MP3
@@ -20,8 +20,6 @@ import struct
 import sys
 import zlib
 
-from cStringIO import StringIO
-
 from mutagen import FileType
 from mutagen._util import cdata, insert_bytes, delete_bytes
 
@@ -63,6 +61,11 @@ class OggPage(object):
     offset = None
     complete = True
 
+    # find_last reads this much at a time, and no more than
+    # FIND_LAST_LIMIT bytes back from the end of the file.
+    FIND_LAST_CHUNK = 64 * 1024
+    FIND_LAST_LIMIT = 1024 * 1024
+
     def __init__(self, fileobj=None):
         self.packets = []
 
@@ -376,38 +379,25 @@ class OggPage(object):
             klass.renumber(fileobj, serial, sequence)
     replace = classmethod(replace)
 
-    def find_last(klass, fileobj, serial):
+    def find_last(klass, fileobj, serial, limit=None, full=False):
         """Find the last page of the stream 'serial'.
 
-        If the file is not multiplexed this function is fast. If it is,
-        it must read the whole the stream.
+        The file is searched backward from its end, FIND_LAST_CHUNK
+        bytes at a time, for at most limit bytes (FIND_LAST_LIMIT if
+        not given). If no page of the stream is found there, None is
+        returned, unless full is true: then the whole file is read
+        from the start, page by page.
 
         This finds the last page in the actual file object, or the last
         page in the stream (with eos set), whichever comes first.
         """
 
-        # For non-muxed streams, look at the last page.
-        try: fileobj.seek(-256*256, 2)
-        except IOError:
-            # The file is less than 64k in length.
-            fileobj.seek(0)
-        data = fileobj.read()
-        try: index = data.rindex("OggS")
-        except ValueError:
-            raise error("unable to find final Ogg header")
-        stringobj = StringIO(data[index:])
+        if limit is None: limit = klass.FIND_LAST_LIMIT
+        page = klass.__find_last_backward(fileobj, serial, limit)
+        if page is not None or not full: return page
         best_page = None
-        try:
-            page = OggPage(stringobj)
-        except error:
-            pass
-        else:
-            if page.serial == serial:
-                if page.last: return page
-                else: best_page = page
-            else: best_page = None
-
-        # The stream is muxed, so use the slow way.
+
+        # Nothing of the stream near the end, so use the slow way.
         fileobj.seek(0)
         try:
             page = OggPage(fileobj)
@@ -423,6 +413,48 @@ class OggPage(object):
             return best_page
     find_last = classmethod(find_last)
 
+    def __find_last_backward(klass, fileobj, serial, limit):
+        fileobj.seek(0, 2)
+        end = fileobj.tell()
+        stop = max(0, end - limit)
+        wanted = struct.pack("<I", serial)
+        tail = "" # start of the chunk read before, for headers across
+        pos = end
+        while pos > stop:
+            start = max(stop, pos - klass.FIND_LAST_CHUNK)
+            fileobj.seek(start)
+            data = fileobj.read(pos - start) + tail
+            # headers starting in this chunk, from the last one back
+            index = min(len(data), pos - start + 3)
+            while True:
+                index = data.rfind("OggS", 0, index)
+                if index < 0: break
+                if data[index+14:index+18] == wanted:
+                    fileobj.seek(start + index)
+                    try: return klass(fileobj)
+                    except (error, EOFError): pass
+            tail = data[:27]
+            pos = start
+        return None
+    __find_last_backward = classmethod(__find_last_backward)
+
+def _length(page, info):
+    try:
+        denom = info.sample_rate
+    except AttributeError:
+        denom = info.fps
+    return page.position / float(denom)
+
+def measure_length(fileobj, info):
+    """The length in seconds of the stream info describes, reading the
+    whole file if need be; None if no page of it can be found.
+
+    For files whose length loading could only estimate.
+    """
+    page = OggPage.find_last(fileobj, info.serial, full=True)
+    if page is None: return None
+    return _length(page, info)
+
 class OggFileType(FileType):
     """An generic Ogg file."""
 
@@ -447,12 +479,17 @@ class OggFileType(FileType):
                     return
 
                 last_page = OggPage.find_last(fileobj, self.info.serial)
-                samples = last_page.position
-                try:
-                    denom = self.info.sample_rate
-                except AttributeError:
-                    denom = self.info.fps
-                self.info.length = samples / float(denom)
+                if last_page is None:
+                    # Nothing of the stream near the end (chained or
+                    # multiplexed files); guess from the bitrate rather
+                    # than read the whole file, see measure_length.
+                    self.info.estimated = True
+                    bitrate = getattr(self.info, "bitrate", 0)
+                    if bitrate:
+                        fileobj.seek(0, 2)
+                        self.info.length = fileobj.tell() * 8.0 / bitrate
+                    return
+                self.info.length = _length(last_page, self.info)
 
             except error, e:
                 raise self._Error, e, sys.exc_info()[2]
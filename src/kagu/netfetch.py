@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+#
+#
+#   Copyright (c) 2007 Jesse Guardiani <jesse@guardiani.us>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License as
+#   published by the Free Software Foundation; either version 2 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+#   02111-1307, USA.
+#
+
+''' HTTP fetching for the scanner's cover and artist image downloads:
+a small thread pool, keep-alive connections per thread and host, a
+per-host limit on parallel requests and request rate, and an on-disk
+cache that revalidates with ETag/Last-Modified and remembers 404s.
+Images saved with retrieve() aren't copied into the cache, it only keeps
+their validators and where they went. prune() keeps the cache in bounds
+and is meant to be run at the end of a scan. '''
+
+import os, sys, time, socket, httplib, urlparse, threading, Queue
+try:
+  from hashlib import md5
+except ImportError:
+  from md5 import new as md5
+
+USER_AGENT = 'kagu/1.0'
+
+
+class Job():
+  ''' result of Fetcher.submit(), get() blocks until it has run '''
+  def __init__(self, func, args):
+    self.func   = func
+    self.args   = args
+    self.result = None
+    self.error  = None
+    self.done   = threading.Event()
+
+  def run(self):
+    try:
+      self.result = self.func(*self.args)
+    except:
+      self.error = sys.exc_info()
+    self.done.set()
+
+  def get(self):
+    self.done.wait()
+    if self.error:
+      raise self.error[0], self.error[1], self.error[2]
+    return self.result
+
+
+class Fetcher():
+  max_redirects = 5
+  max_age       = 7 * 24 * 3600  # serve cached responses without asking for this long
+  negative_age  = 7 * 24 * 3600  # ...and remember a 404 for this long
+  keep_age      = 60 * 24 * 3600 # prune() drops what wasn't fetched or checked in this long
+  max_size      = 8 * 1024 * 1024 # ...and then the oldest pages until they fit in this
+
+  def __init__(self, cache_dir, workers=4, per_host=2, interval=0.2, timeout=20, server=None):
+    ''' interval is the minimum time between two requests to the same
+    host. server ("http://127.0.0.1:8080") sends every request there
+    instead, path and query unchanged; for testing against a local
+    stand-in of the real services. '''
+    self.cache_dir = cache_dir
+    self.workers   = workers
+    self.per_host  = per_host
+    self.interval  = interval
+    self.timeout   = timeout
+    self.server    = server and urlparse.urlsplit(server)
+    self.lock      = threading.Lock()
+    self.hosts     = {} # host -> [semaphore, time the next request may start]
+    self.local     = threading.local()
+    self.queue     = Queue.Queue()
+    self.threads   = []
+    if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+
+  # thread pool
+
+  def submit(self, func, *args):
+    ''' run func(*args) on one of the worker threads '''
+    if not self.threads:
+      for i in range(self.workers):
+        t = threading.Thread(target=self._worker)
+        t.setDaemon(True) # don't hold up the scanner's exit
+        t.start()
+        self.threads.append(t)
+    job = Job(func, args)
+    self.queue.put(job)
+    return job
+
+  def _worker(self):
+    while True:
+      self.queue.get().run()
+
+  # HTTP
+
+  def _host(self, host):
+    self.lock.acquire()
+    try:
+      if host not in self.hosts:
+        self.hosts[host] = [threading.Semaphore(self.per_host), 0]
+      return self.hosts[host]
+    finally:
+      self.lock.release()
+
+  def _wait_turn(self, host):
+    slot = self._host(host)
+    self.lock.acquire()
+    try:
+      now = time.time()
+      start = max(now, slot[1])
+      slot[1] = start + self.interval
+    finally:
+      self.lock.release()
+    if start > now: time.sleep(start - now)
+
+  def _connection(self, scheme, netloc):
+    conns = getattr(self.local, 'conns', None)
+    if conns is None:
+      conns = self.local.conns = {}
+    key = (scheme, netloc)
+    if key not in conns:
+      if scheme == 'https': cls = httplib.HTTPSConnection
+      else:                 cls = httplib.HTTPConnection
+      try:
+        conns[key] = cls(netloc, timeout=self.timeout)
+      except TypeError: # python2.5
+        conns[key] = cls(netloc)
+    return conns[key]
+
+  def _drop_connection(self, scheme, netloc):
+    conn = self.local.conns.pop((scheme, netloc), None)
+    if conn: conn.close()
+
+  def _request(self, url, headers):
+    ''' one GET on a reused connection, returns (status, headers, body) '''
+    (scheme, netloc, path, query, fragment) = urlparse.urlsplit(url)
+    host = netloc # limits go by the real service, even when redirected to self.server
+    if self.server:
+      (scheme, netloc) = self.server[0:2]
+    if query: path = path + '?' + query
+    headers['User-Agent'] = USER_AGENT
+    sem = self._host(host)[0]
+    sem.acquire()
+    try:
+      self._wait_turn(host)
+      for attempt in (0, 1): # a kept-alive connection may have been closed on us
+        conn = self._connection(scheme, netloc)
+        try:
+          conn.request('GET', path or '/', headers=headers)
+          if conn.sock and self.timeout: conn.sock.settimeout(self.timeout)
+          resp = conn.getresponse()
+          body = resp.read()
+        except (httplib.HTTPException, socket.error):
+          self._drop_connection(scheme, netloc)
+          if attempt: raise
+          continue
+        if resp.getheader('connection', '').lower() == 'close':
+          self._drop_connection(scheme, netloc)
+        return resp.status, dict(resp.getheaders()), body
+    finally:
+      sem.release()
+
+  # cache
+
+  def _cache_fn(self, url):
+    return os.path.join(self.cache_dir, md5(url).hexdigest())
+
+  def _tmp_fn(self, fn):
+    # two workers may be after the same url, don't let them share a temp file
+    return '%s.%s.tmp' % (fn, threading.currentThread().getName())
+
+  def _read_meta(self, fn):
+    meta = {}
+    try:
+      f = open(fn + '.meta')
+      for line in f:
+        (k, v) = line.rstrip('\n').split(' ', 1)
+        meta[k] = v
+      f.close()
+    except (IOError, ValueError):
+      return None
+    return meta
+
+  def _write_meta(self, fn, meta):
+    tmp = self._tmp_fn(fn)
+    f = open(tmp, 'w')
+    for (k, v) in meta.items():
+      f.write('%s %s\n' % (k, v))
+    f.close()
+    os.rename(tmp, fn + '.meta')
+
+  def _read_body(self, fn):
+    try:
+      f = open(fn, 'rb')
+      try:
+        return f.read()
+      finally:
+        f.close()
+    except IOError:
+      return None
+
+  def _write_body(self, fn, data):
+    tmp = self._tmp_fn(fn)
+    f = open(tmp, 'wb')
+    f.write(data)
+    f.close()
+    os.rename(tmp, fn)
+
+  def get(self, url, filename=None):
+    ''' body of url, or None if it isn't there or can't be fetched. With
+    filename the body is kept there rather than in the cache. '''
+    fn = self._cache_fn(url)
+    meta = self._read_meta(fn)
+    headers = {}
+    if meta and 'status' in meta and 'time' in meta:
+      age = time.time() - float(meta['time'])
+      if meta['status'] == '404':
+        if age < self.negative_age: return None
+      else:
+        body = self._read_body(meta.get('file', fn))
+        if body is not None:
+          if age < self.max_age: return body
+          if 'etag' in meta: headers['If-None-Match'] = meta['etag']
+          if 'last-modified' in meta: headers['If-Modified-Since'] = meta['last-modified']
+
+    try:
+      for i in range(self.max_redirects + 1):
+        (status, resp_headers, data) = self._request(url, dict(headers))
+        if status in (301, 302, 303, 307) and 'location' in resp_headers:
+          url = urlparse.urljoin(url, resp_headers['location'])
+          headers = {} # validators belong to the original url
+          continue
+        break
+    except (httplib.HTTPException, socket.error), message:
+      print "fetch failed:", url, message
+      return None
+
+    if status == 304 and headers:
+      meta['time'] = str(time.time())
+      self._write_meta(fn, meta)
+      return body
+    if status in (404, 410):
+      self._write_meta(fn, {'status': '404', 'time': str(time.time())})
+      return None
+    if status != 200:
+      print "fetch failed:", url, status
+      return None
+
+    meta = {'status': '200', 'time': str(time.time())}
+    if filename:
+      self._write_body(filename, data)
+      meta['file'] = filename
+      if os.path.exists(fn): os.unlink(fn) # cached before it was a file of its own
+    else:
+      self._write_body(fn, data)
+    for k in ('etag', 'last-modified'):
+      if k in resp_headers: meta[k] = resp_headers[k]
+    self._write_meta(fn, meta)
+    return data
+
+  def retrieve(self, url, filename):
+    ''' like urllib.urlretrieve(), but only writes filename on success.
+    The cache remembers filename, and the file is only written again if
+    url has changed or a copy is wanted under another name. '''
+    data = self.get(url, filename)
+    if data is None:
+      return False
+    meta = self._read_meta(self._cache_fn(url)) or {}
+    if meta.get('file') != filename or not os.path.exists(filename):
+      self._write_body(filename, data)
+    return True
+
+  def prune(self):
+    ''' drop entries not fetched or revalidated in keep_age, 404s older
+    than negative_age, left over temp files, and then the oldest cached
+    pages until what's left is under max_size. Returns the number of
+    entries dropped. '''
+    now = time.time()
+    entries = []
+    dropped = 0
+    for name in os.listdir(self.cache_dir):
+      path = os.path.join(self.cache_dir, name)
+      if name.endswith('.tmp'):
+        if now - os.path.getmtime(path) > 3600: os.unlink(path) # a crashed worker's
+        continue
+      if not name.endswith('.meta'):
+        continue
+      fn = path[:-5]
+      meta = self._read_meta(fn) or {}
+      try:
+        age = now - float(meta['time'])
+      except (KeyError, ValueError):
+        age = None
+      if age is None or age > self.keep_age or (meta.get('status') == '404' and age > self.negative_age):
+        self._drop(fn)
+        dropped = dropped + 1
+      elif os.path.exists(fn):
+        entries.append((age, os.path.getsize(fn), fn))
+    entries.sort()
+    total = sum([size for (age, size, fn) in entries])
+    while entries and total > self.max_size:
+      (age, size, fn) = entries.pop() # oldest
+      self._drop(fn)
+      total = total - size
+      dropped = dropped + 1
+    return dropped
+
+  def _drop(self, fn):
+    for path in (fn, fn + '.meta'):
+      try:
+        os.unlink(path)
+      except OSError:
+        pass
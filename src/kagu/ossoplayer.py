@@ -146,9 +146,9 @@ class OSSOPlayer(baseplayer.BasePlayer):
     try:
       (cur, tot) = self.bus_obj.get_position(dbus_interface=OSSO_MEDIA_SERVER_MUSIC_IFC)
       self.seconds = cur / 1000
-      self.length = tot / 1000
+      self.length = self.exact_length or tot / 1000
     except:
-      self.length = 0
+      self.length = self.exact_length
       # ogg playback won't return total length
       # FIXME: handle this better, make a seperate code block for application/ogg
       try: 
@@ -18,6 +18,7 @@ class Prefs:
     "autoplay"   : "True",
     "headphone_sense" : "True",
     "sort_albums_by_year" : "False",
+    "hide_duplicates"     : "False",
     "repeat"     : "False",
     "repeat_one" : "False",
     "sort"       : "0",
@@ -26,6 +27,8 @@ class Prefs:
     "download_covers"        : "True",
     "download_hi_res_covers" : "2",
     "heuristic_covers"       : "False",
+    "art_cache_mb"           : "12",
+    "measure_vbr_lengths"    : "True",
     "sleep_timer": "0",
     "player"     : "ossoplayer",
     "scrollbars" : "False",
@@ -77,6 +80,7 @@ class Prefs:
       self.set("autoplay", str(manager.playlist.get_autoplay()))
       self.set("headphone_sense", str(manager.get_headphone_sense()))
       self.set("sort_albums_by_year", str(manager.get_sort_albums_by_year()))
+      self.set("hide_duplicates", str(manager.get_hide_duplicates()))
       self.set("repeat", str(manager.playlist.repeat))
       self.set("repeat_one", str(manager.playlist.repeat_one))
       self.set("volume", str(manager.player.volume))
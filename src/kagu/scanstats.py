@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+#
+#
+#   Copyright (c) 2007 Jesse Guardiani <jesse@guardiani.us>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License as
+#   published by the Free Software Foundation; either version 2 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+#   02111-1307, USA.
+#
+
+''' Counters and timers the scanner keeps while it runs, and the
+newline-delimited JSON progress stream kagu-scanner --headless writes
+them to. '''
+
+import sys, time
+try:
+  import json
+except ImportError:
+  try:
+    import simplejson as json
+  except ImportError:
+    json = None # python2.5 without simplejson, see _dumps()
+
+
+def _dumps(value):
+  ''' just enough JSON for flat progress events '''
+  if json is not None:
+    return json.dumps(value)
+  if value is None:
+    return 'null'
+  if value is True:
+    return 'true'
+  if value is False:
+    return 'false'
+  if isinstance(value, (int, long)):
+    return str(value)
+  if isinstance(value, float):
+    return repr(value)
+  if isinstance(value, dict):
+    return '{' + ', '.join([_dumps(str(k)) + ': ' + _dumps(v) for (k, v) in value.items()]) + '}'
+  if isinstance(value, (list, tuple)):
+    return '[' + ', '.join([_dumps(v) for v in value]) + ']'
+  out = []
+  for ch in value:
+    if ch == '"' or ch == '\\':
+      out.append('\\' + ch)
+    elif ord(ch) < 0x20 or ord(ch) > 0x7e:
+      out.append('\\u%04x' % ord(ch))
+    else:
+      out.append(ch)
+  return '"' + ''.join(out) + '"'
+
+
+class ScanStats():
+  ''' What a scan did and where the time went. Time is split into walk
+  (listing directories, stat()), parse (reading tags, or waiting for the
+  parser processes), db and art, and separately per scanner phase. '''
+  counters = ['files', 'new', 'changed', 'unchanged', 'deleted', 'failed', 'duplicates', 'bytes_parsed', 'lengths_measured', 'embedded_covers']
+  timers   = ['walk', 'parse', 'db', 'art']
+
+  def __init__(self):
+    self.start  = time.time()
+    self.counts = {}
+    self.times  = {}
+    self.phases = []  # [phase, seconds], in the order they ran
+    self.phase  = None
+    self.phase_start = None
+    for name in self.counters: self.counts[name] = 0
+    for name in self.timers:   self.times[name]  = 0.0
+
+  def count(self, name, n=1):
+    self.counts[name] = self.counts[name] + n
+
+  def add_time(self, name, seconds):
+    self.times[name] = self.times[name] + seconds
+
+  def begin_phase(self, phase):
+    self.end_phase()
+    self.phase = phase
+    self.phase_start = time.time()
+
+  def end_phase(self):
+    if self.phase is not None:
+      self.phases.append([self.phase, time.time() - self.phase_start])
+      self.phase = None
+
+  def phase_time(self, phase):
+    total = 0.0
+    for (name, seconds) in self.phases:
+      if name == phase: total = total + seconds
+    if phase == self.phase:
+      total = total + time.time() - self.phase_start
+    return total
+
+  def summary(self):
+    elapsed = time.time() - self.start
+    files_time = self.phase_time('files')
+    summary = dict(self.counts)
+    summary['elapsed'] = round(elapsed, 3)
+    if files_time > 0:
+      summary['files_per_sec'] = round(self.counts['files'] / files_time, 1)
+    else:
+      summary['files_per_sec'] = None
+    for name in self.timers:
+      summary[name + '_time'] = round(self.times[name], 3)
+    phases = {}
+    for (name, seconds) in self.phases:
+      phases[name] = round(phases.get(name, 0.0) + seconds, 3)
+    summary['phases'] = phases
+    return summary
+
+
+class JsonProgress():
+  ''' one JSON object per line on out. Progress events are held back to
+  one per interval seconds, everything else (status, phase, summary,
+  error) goes out as it happens. '''
+  def __init__(self, out=None, interval=0.5):
+    self.out      = out or sys.stdout
+    self.interval = interval
+    self.last     = 0
+
+  def emit(self, event, **fields):
+    for (k, v) in fields.items():
+      if isinstance(v, str): fields[k] = v.decode('utf-8', 'replace') # file names
+    fields['event'] = event
+    fields['time']  = round(time.time(), 3)
+    self.out.write(_dumps(fields) + '\n')
+    self.out.flush()
+
+  def progress(self, **fields):
+    now = time.time()
+    if now - self.last < self.interval:
+      return
+    self.last = now
+    self.emit('progress', **fields)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+#
+#
+#   Copyright (c) 2007 Jesse Guardiani <jesse@guardiani.us>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License as
+#   published by the Free Software Foundation; either version 2 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+#   General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+#   02111-1307, USA.
+#
+
+''' Scaled copies of cover art, in the sizes the player draws it at:
+'tile' for the atlas (album/artist lists and the grid) and 'zoom' for
+the cover view. They are cached as BMPs under the db dir, named after
+the source path and carrying its mtime, so art that hasn't changed is
+only ever scaled once. JPEGs are decoded at reduced resolution when PIL
+is around (its draft mode lets libjpeg scale by 1/2, 1/4 or 1/8 while
+decoding), everything else goes through pygame. '''
+
+import os
+try:
+  from hashlib import md5
+except ImportError:
+  from md5 import new as md5
+try:
+  import multiprocessing
+except ImportError:
+  multiprocessing = None # python2.5: thumbnails get made in-process
+try:
+  from PIL import Image
+except ImportError:
+  try:
+    import Image
+  except ImportError:
+    Image = None
+import pygame
+
+CACHE_DIR = 'thumbs'
+
+def _tile_size(w, h):
+  ''' what the scanner's Art() always did: stretch to 125x128 unless the
+  image is 125 wide already '''
+  if w == 125: return (w, h)
+  return (125, 128)
+
+def _zoom_size(w, h):
+  ''' what widgets.CoverArt() does on an 800x480 screen '''
+  if w > 530: return (530, 480)
+  if w < 300: return (300, 300 * h / w)
+  return (w, h)
+
+SIZES = {'tile': _tile_size, 'zoom': _zoom_size}
+
+def cache_dir(data_dir):
+  return os.path.join(data_dir, CACHE_DIR)
+
+def _name(dir, src, size):
+  if isinstance(src, unicode): src = src.encode('utf-8')
+  return os.path.join(dir, md5(src).hexdigest() + '-' + size + '.bmp')
+
+def _mtime(fn):
+  try:
+    return int(os.stat(fn).st_mtime)
+  except (OSError, TypeError):
+    return None
+
+def cached(src, size, dir):
+  ''' the cached copy of src at size, None if there isn't one made from
+  the current src '''
+  mtime = _mtime(src)
+  fn = _name(dir, src, size)
+  if mtime is not None and _mtime(fn) == mtime: return fn
+  return None
+
+def _save(image, fn, mtime):
+  tmp = fn[:-4] + '.tmp.bmp' # pygame picks the format from the extension
+  if isinstance(image, pygame.Surface): pygame.image.save(image, tmp)
+  else:                                 image.save(tmp, 'BMP')
+  os.utime(tmp, (mtime, mtime))
+  os.rename(tmp, fn)
+
+def _make_pil(src, mtime, targets):
+  im = Image.open(src)
+  if im.format != 'JPEG': return False
+  (w, h) = im.size
+  sizes = [(SIZES[size](w, h), fn) for (size, fn) in targets]
+  # decode just big enough for the largest size wanted
+  im.draft('RGB', (max([s[0] for (s, fn) in sizes]), max([s[1] for (s, fn) in sizes])))
+  im = im.convert('RGB')
+  for (dims, fn) in sizes:
+    if dims != im.size: _save(im.resize(dims, Image.ANTIALIAS), fn, mtime)
+    else:               _save(im, fn, mtime)
+  return True
+
+def _make_pygame(src, mtime, targets):
+  image = pygame.image.load(src)
+  (w, h) = image.get_size()
+  for (size, fn) in targets:
+    dims = SIZES[size](w, h)
+    if dims == (w, h): out = image
+    elif hasattr(pygame.transform, 'smoothscale') and image.get_bitsize() >= 24:
+      out = pygame.transform.smoothscale(image, dims)
+    else:
+      out = pygame.transform.scale(image, dims)
+    _save(out, fn, mtime)
+
+def make(job):
+  ''' (src, mtime, [(size, file name), ...]): decode src once and write it
+  out at each size. Returns src and whether it worked. Runs in the pool. '''
+  (src, mtime, targets) = job
+  try:
+    if Image is None or not _make_pil(src, mtime, targets):
+      _make_pygame(src, mtime, targets)
+    return src, True
+  except Exception, message: # anything the decoders throw at a bad image
+    print "can't make thumbnails of %s: %s" % (src, message)
+    return src, False
+
+
+class Thumbnailer():
+  ''' Makes the missing thumbnails of a batch of images over a pool of
+  jobs processes, and knows where the cached ones are. '''
+  def __init__(self, dir, jobs=1):
+    self.dir  = dir
+    self.jobs = jobs
+    if not os.path.exists(dir): os.mkdir(dir)
+
+  def get(self, src, size):
+    return cached(src, size, self.dir)
+
+  def make_all(self, sources, sizes=('tile', 'zoom')):
+    ''' make sure every image in sources has up to date thumbnails at
+    sizes, returns how many images had to be scaled '''
+    jobs = []
+    for src in dict.fromkeys(sources).keys():
+      mtime = _mtime(src)
+      if mtime is None: continue
+      targets = []
+      for size in sizes:
+        fn = _name(self.dir, src, size)
+        if _mtime(fn) != mtime: targets.append((size, fn))
+      if targets: jobs.append((src, mtime, targets))
+    if self.jobs <= 1 or multiprocessing is None or len(jobs) < 2:
+      map(make, jobs)
+    else:
+      pool = multiprocessing.Pool(min(self.jobs, len(jobs)))
+      try:
+        pool.map(make, jobs, max(1, len(jobs) / (self.jobs * 4)))
+      finally:
+        pool.close()
+        pool.join()
+    return len(jobs)
@@ -1432,6 +1432,7 @@ class SettingsView(BaseView):
         ,   'Auto Play'
         ,   'Headphone Sense'
         ,   'Sort Albums by Year'
+        ,   'Hide Duplicates'
         ,   'Show Image'
         ]
     if globals.ISMAEMO:
@@ -1481,6 +1482,8 @@ class SettingsView(BaseView):
       return widgets.CheckBoxText(row, manager.get_headphone_sense)
     elif row=='Sort Albums by Year':
       return widgets.CheckBoxText(row, manager.get_sort_albums_by_year)
+    elif row=='Hide Duplicates':
+      return widgets.CheckBoxText(row, manager.get_hide_duplicates)
       
     return widgets.Text(row)
 
@@ -1494,6 +1497,7 @@ class SettingsView(BaseView):
     elif name == 'Auto Play': manager.playlist.set_autoplay(not manager.playlist.get_autoplay())
     elif name == 'Headphone Sense': manager.set_headphone_sense(not manager.get_headphone_sense())
     elif name == 'Sort Albums by Year': manager.set_sort_albums_by_year(not manager.get_sort_albums_by_year())
+    elif name == 'Hide Duplicates': manager.set_hide_duplicates(not manager.get_hide_duplicates())
     elif name == 'Scrollbars':
       manager.set_scrollbar_state(not manager.scrollbar_state)
       # reset scrollbar state in current view
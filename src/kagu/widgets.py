@@ -21,7 +21,7 @@
 
 import pygame, time, gc
 from pygame.locals import *
-import globals
+import globals, thumbnail
 from db      import db      as db
 from theme   import theme   as theme
 from manager import manager as manager
@@ -737,7 +737,7 @@ class CoverArtWidget(BaseWidget):
 
   def calc_image(self):
     im = pygame.Surface((self.theme_rect.width, self.theme_rect.height), 0, theme.surface)
-    im.blit(self.cachefile,self.rect,self.cache_rect)
+    self.cachefile.blit_tile(im,self.rect,self.cache_rect)
 
     reflection=pygame.transform.flip(im, 0, 1)
     reflection.set_alpha(60)
@@ -750,7 +750,7 @@ class CoverArtWidget(BaseWidget):
   def draw(self,surface,point=None):
     if not point: point = self.rect
     if not self.show_reflection:
-      surface.blit(self.cachefile,point,self.cache_rect)
+      self.cachefile.blit_tile(surface,point,self.cache_rect)
     else:
       if not self.calced_im:
         self.calced_im = self.calc_image()
@@ -1877,8 +1877,10 @@ class CoverArt():
 
   def _load_image(self):
     print "art_path: " + self.art_path
+    # the scanner keeps a copy scaled for this view
+    path = thumbnail.cached(self.art_path, 'zoom', thumbnail.cache_dir(db.get_db_dir()))
     try:
-      self.image = pygame.image.load(self.art_path)
+      self.image = pygame.image.load(path or self.art_path)
     except:
       print "exception loading image, defaulting to UNKNOWN"
       self.image = pygame.image.load(globals.UNKNOWNIMAGE)